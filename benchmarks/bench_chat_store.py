@@ -0,0 +1,131 @@
+"""Topic load latency on a synthetic 100k chat database, before and after the
+Chat indexes and SQLite pragmas.
+
+"before" is the original schema (foreign key indexes only) with default
+pragmas, "after" is the current schema and SQLITE_PRAGMAS.
+
+    python -m benchmarks.bench_chat_store
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+from peewee import SqliteDatabase
+
+from src.myllamatui.db_models import (
+    Category,
+    Chat,
+    CLI_Settings,
+    Context,
+    LLM_MODEL,
+    ModelMetadata,
+    SQLITE_PRAGMAS,
+    Topic,
+)
+
+MODELS = [Context, Category, Topic, LLM_MODEL, Chat, CLI_Settings, ModelMetadata]
+CHATS = 100_000
+TOPICS = 500
+CATEGORIES = 25
+LOOKUPS = 200
+ANSWER = "lorem ipsum dolor sit amet " * 40
+
+
+def build_database(path: str) -> None:
+    """Write the synthetic history once, it is shared by both runs"""
+    database = SqliteDatabase(path)
+    with database.bind_ctx(MODELS):
+        database.create_tables(MODELS)
+        Context.create(text="context")
+        LLM_MODEL.create(model="model", size=1, specialization="general", currently_available=True)
+        Category.insert_many([{"text": f"category {i}"} for i in range(CATEGORIES)]).execute()
+        Topic.insert_many(
+            [{"text": f"topic {i}", "category_id": i % CATEGORIES + 1} for i in range(TOPICS)]
+        ).execute()
+
+        # interleave topics in time like real use
+        random.seed(1)
+        start = datetime(2024, 1, 1)
+        rows = [
+            {
+                "question": f"question {i}",
+                "answer": ANSWER,
+                "context_id": 1,
+                "topic_id": random.randint(1, TOPICS),
+                "llm_model_id": 1,
+                "created_at": start + timedelta(minutes=i),
+            }
+            for i in range(CHATS)
+        ]
+        with database.atomic():
+            for offset in range(0, CHATS, 5000):
+                Chat.insert_many(rows[offset : offset + 5000]).execute()
+    database.close()
+
+
+def topic_queries(topic_id: int) -> dict:
+    """The queries run when the tree is built and a topic is opened"""
+    return {
+        "full topic": Chat.select()
+        .where(Chat.topic_id == topic_id)
+        .order_by(Chat.created_at, Chat.id),
+        "latest 50": Chat.select()
+        .where(Chat.topic_id == topic_id)
+        .order_by(Chat.created_at.desc(), Chat.id.desc())
+        .limit(50),
+        "topic count": Chat.select().where(Chat.topic_id == topic_id).count,
+    }
+
+
+def time_topic_loads(database: SqliteDatabase) -> dict:
+    """ms per query for random topics"""
+    timings = {}
+    random.seed(2)
+    with database.bind_ctx(MODELS):
+        for _ in range(LOOKUPS):
+            for name, query in topic_queries(random.randint(1, TOPICS)).items():
+                start = time.perf_counter()
+                query() if callable(query) else list(query.tuples())
+                timings.setdefault(name, []).append(
+                    (time.perf_counter() - start) * 1000
+                )
+    return timings
+
+
+def report(label: str, timings: dict) -> None:
+    for name, times in timings.items():
+        times = sorted(times)
+        print(
+            f"{label:<7} {name:<12} median {statistics.median(times):7.3f} ms   "
+            f"p95 {times[int(len(times) * 0.95)]:7.3f} ms"
+        )
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        print(f"building {CHATS} chats over {TOPICS} topics...")
+        build_database(path)
+
+        before_db = SqliteDatabase(path)
+        with before_db.bind_ctx(MODELS):
+            for index in Chat._meta.indexes:
+                columns = "_".join(index[0])
+                before_db.execute_sql(f"DROP INDEX IF EXISTS chat_{columns}")
+        report("before", time_topic_loads(before_db))
+        before_db.close()
+
+        after_db = SqliteDatabase(path, pragmas=SQLITE_PRAGMAS)
+        with after_db.bind_ctx(MODELS):
+            after_db.create_tables([Chat], safe=True)
+        report("after", time_topic_loads(after_db))
+        after_db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Compare a new httpx.AsyncClient per request with the shared pooled client.
+
+Runs against a local stub server so only the client side overhead is measured.
+
+    python -m benchmarks.bench_http_client
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from src.myllamatui.llm_calls import close_http_client, get_from_llm
+
+REQUESTS = 500
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Answers every GET with a small /api/tags style body and keeps the connection open"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        body = json.dumps({"models": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+async def new_client_per_request(url: str) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        async with httpx.AsyncClient() as client:
+            await client.get(url, timeout=300.0)
+    return time.perf_counter() - start
+
+
+async def shared_client(url: str) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await get_from_llm(url)
+    elapsed = time.perf_counter() - start
+    await close_http_client()
+    return elapsed
+
+
+async def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/tags"
+
+    # warm up
+    await shared_client(url)
+
+    per_request = await new_client_per_request(url)
+    pooled = await shared_client(url)
+    server.shutdown()
+
+    print(f"{REQUESTS} GET requests against {url}")
+    print(f"new client per request: {per_request / REQUESTS * 1000:.3f} ms/request")
+    print(f"shared pooled client:   {pooled / REQUESTS * 1000:.3f} ms/request")
+    print(f"saved per request:      {(per_request - pooled) / REQUESTS * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""Word overlap topic matching at 10k topics, the original scan against LexicalIndex.
+
+Both run over the same in-memory topics, so this is the matching alone.
+The scan also had to load every Topic row for each call, the index is
+built once.
+
+    python -m benchmarks.bench_lexical_match
+"""
+
+import random
+import statistics
+import time
+
+from dataclasses import dataclass
+
+from src.myllamatui.topics_contexts_categories import LexicalIndex
+
+TOPICS = 10_000
+SUMMARIES = 200
+VOCABULARY = 3_000
+
+
+@dataclass
+class Item:
+    id: int
+    text: str
+
+
+def original_scan_match(summary: str, items: list):
+    """check_for_topic_and_category_match before the index"""
+    selected_match = None
+    summarywords = [
+        word
+        for word in summary.split(" ")
+        if word.lower()
+        not in ["no", "yes", "a", "the", "then", "to", "if", "or", "this", "that", "is"]
+    ]
+    match_dict = {}
+    for word in summarywords:
+        for item in items:
+            if word.lower() in item.text.lower():
+                match_dict[item.id] = match_dict.get(item.id, 0) + 1
+    highest = 0
+    for id in match_dict.keys():
+        if match_dict[id] > highest:
+            highest = match_dict[id]
+            if highest / len(summarywords) > 0.4:
+                selected_match = id
+    return selected_match
+
+
+def report(label: str, times: list) -> None:
+    times = sorted(times)
+    print(
+        f"{label:<14} median {statistics.median(times):8.3f} ms   "
+        f"p95 {times[int(len(times) * 0.95)]:8.3f} ms"
+    )
+
+
+def main() -> None:
+    random.seed(1)
+    words = [f"Subject{i}" for i in range(VOCABULARY)]
+    items = [
+        Item(item_id, " ".join(random.choices(words, k=random.randint(1, 4))))
+        for item_id in range(1, TOPICS + 1)
+    ]
+    summaries = [
+        " ".join(random.choices(words, k=random.randint(2, 5)))
+        for _ in range(SUMMARIES)
+    ]
+
+    start = time.perf_counter()
+    index = LexicalIndex(items)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{TOPICS} topics, index built in {build_ms:.1f} ms")
+
+    scan_times, index_times = [], []
+    for summary in summaries:
+        start = time.perf_counter()
+        expected = original_scan_match(summary, items)
+        scan_times.append((time.perf_counter() - start) * 1000)
+
+        # a fresh word cache, so every summary pays for its vocabulary scan
+        index.word_cache.clear()
+        start = time.perf_counter()
+        assert index.match(summary) == expected
+        index_times.append((time.perf_counter() - start) * 1000)
+
+    report("original scan", scan_times)
+    report("LexicalIndex", index_times)
+
+
+if __name__ == "__main__":
+    main()
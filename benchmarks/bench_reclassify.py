@@ -0,0 +1,101 @@
+"""Bulk reclassification throughput for 2k default topic chats at different
+LLM concurrency.
+
+The LLM is replaced by a fixed delay per call, so this measures how well the
+job overlaps calls and how much the grouping and batched writes cost. A real
+Ollama server only runs calls in parallel up to OLLAMA_NUM_PARALLEL.
+
+    python -m benchmarks.bench_reclassify
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import httpx
+
+from peewee import SqliteDatabase
+
+from src.myllamatui.classification import reclassify_default_topic_chats
+from src.myllamatui.db_models import (
+    Category,
+    Chat,
+    ClassificationJob,
+    Context,
+    LLM_MODEL,
+    Topic,
+    TopicSummary,
+)
+from src.myllamatui.topics_contexts_categories import reset_lexical_indexes
+
+MODELS = [Context, Category, Topic, LLM_MODEL, Chat, ClassificationJob, TopicSummary]
+CHATS = 2_000
+LABELS = 50
+LLM_DELAY = 0.05
+
+
+def build_database(database: SqliteDatabase) -> None:
+    database.create_tables(MODELS)
+    Context.create(text="context")
+    LLM_MODEL.create(
+        model="model", size=1, specialization="general", currently_available=True
+    )
+    Category.create(text="default")
+    Topic.create(text="default", category_id=1)
+
+    # sessions of 1-8 chats a few minutes apart, hours between sessions
+    random.seed(1)
+    when = datetime(2024, 1, 1)
+    rows = []
+    while len(rows) < CHATS:
+        for _ in range(random.randint(1, 8)):
+            when += timedelta(minutes=random.randint(1, 10))
+            rows.append(
+                {
+                    "question": f"question {len(rows)}",
+                    "answer": "answer",
+                    "context_id": 1,
+                    "topic_id": 1,
+                    "llm_model_id": 1,
+                    "created_at": when,
+                }
+            )
+        when += timedelta(hours=random.randint(1, 12))
+    with database.atomic():
+        Chat.insert_many(rows[:CHATS]).execute()
+
+
+async def fake_post_to_llm(api_endpoint, data):
+    await asyncio.sleep(LLM_DELAY)
+    label = f"Subject{random.randint(1, LABELS)} Notes"
+    return httpx.Response(200, json={"message": {"content": label}})
+
+
+async def run(concurrency: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        database = SqliteDatabase(os.path.join(directory, "bench.sqlite"))
+        with database.bind_ctx(MODELS):
+            build_database(database)
+            reset_lexical_indexes()
+            with patch("src.myllamatui.chats.post_to_llm", fake_post_to_llm):
+                stats = await reclassify_default_topic_chats(
+                    "http://localhost:11434", "model", concurrency=concurrency
+                )
+        database.close()
+    print(
+        f"concurrency {concurrency}: {stats['chats']} chats in {stats['groups']} "
+        f"groups, {stats['seconds']:6.2f} s, {stats['chats_per_second']:7.1f} chats/s"
+    )
+
+
+def main() -> None:
+    for concurrency in [1, 4, 8]:
+        asyncio.run(run(concurrency))
+
+
+if __name__ == "__main__":
+    main()
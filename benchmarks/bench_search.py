@@ -0,0 +1,134 @@
+"""Chat search latency on a synthetic 100k chat database.
+
+"like scan" is what searching without an index costs, a LIKE over every
+question and answer. "fts5" is search_chats on the chat_fts index, ranked
+and highlighted.
+
+    python -m benchmarks.bench_search
+"""
+
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+from peewee import SqliteDatabase
+
+from src.myllamatui.db_models import (
+    Category,
+    Chat,
+    CLI_Settings,
+    Context,
+    LLM_MODEL,
+    ModelMetadata,
+    SQLITE_PRAGMAS,
+    Topic,
+)
+from src.myllamatui.search import create_chat_search, search_chats
+
+MODELS = [Context, Category, Topic, LLM_MODEL, Chat, CLI_Settings, ModelMetadata]
+CHATS = 100_000
+TOPICS = 500
+VOCABULARY = 20_000
+ANSWER_WORDS = 150
+LOOKUPS = 20
+SEARCHES = {
+    "common word": "word0",
+    "two words": "word10 word250",
+    "prefix": "word123*",
+    "rare word": "word19999",
+}
+
+
+WORDS = [f"word{rank}" for rank in range(VOCABULARY)]
+# zipf's law, like english the top word is ~10% of all text and most words are rare
+CUMULATIVE_WEIGHTS = list(
+    itertools.accumulate(1 / rank for rank in range(1, VOCABULARY + 1))
+)
+
+
+def random_text(words: int) -> str:
+    return " ".join(random.choices(WORDS, cum_weights=CUMULATIVE_WEIGHTS, k=words))
+
+
+def build_database(database: SqliteDatabase) -> None:
+    database.create_tables(MODELS)
+    Context.create(text="context")
+    LLM_MODEL.create(
+        model="model", size=1, specialization="general", currently_available=True
+    )
+    Category.create(text="category")
+    Topic.insert_many(
+        [{"text": f"topic {i}", "category_id": 1} for i in range(TOPICS)]
+    ).execute()
+
+    random.seed(1)
+    start = datetime(2024, 1, 1)
+    rows = [
+        {
+            "question": random_text(12),
+            "answer": random_text(ANSWER_WORDS),
+            "context_id": 1,
+            "topic_id": random.randint(1, TOPICS),
+            "llm_model_id": 1,
+            "created_at": start + timedelta(minutes=i),
+        }
+        for i in range(CHATS)
+    ]
+    with database.atomic():
+        for offset in range(0, CHATS, 5000):
+            Chat.insert_many(rows[offset : offset + 5000]).execute()
+
+
+def like_scan(search_text: str) -> list:
+    query = Chat.select(Chat.id)
+    for word in search_text.rstrip("*").split():
+        query = query.where(
+            Chat.question.contains(word) | Chat.answer.contains(word)
+        )
+    return list(query.limit(50).tuples())
+
+
+def time_searches(search) -> dict:
+    timings = {}
+    for name, search_text in SEARCHES.items():
+        for _ in range(LOOKUPS):
+            start = time.perf_counter()
+            search(search_text)
+            timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: dict) -> None:
+    for name, times in timings.items():
+        times = sorted(times)
+        print(
+            f"{label:<10} {name:<12} median {statistics.median(times):8.3f} ms   "
+            f"p95 {times[int(len(times) * 0.95)]:8.3f} ms"
+        )
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        database = SqliteDatabase(
+            os.path.join(tmp, "bench.db"), pragmas=SQLITE_PRAGMAS
+        )
+        with database.bind_ctx(MODELS):
+            print(f"building {CHATS} chats...")
+            build_database(database)
+
+            start = time.perf_counter()
+            create_chat_search(database)
+            print(f"index backfill {time.perf_counter() - start:.1f} s")
+
+            report("like scan", time_searches(like_scan))
+            report("fts5", time_searches(search_chats))
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
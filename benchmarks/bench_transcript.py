@@ -0,0 +1,96 @@
+"""Open-topic latency for 10/100/1000 chats, mounting every chat versus the
+virtualized ChatTranscript.
+
+Runs the widgets headless in a minimal app.
+
+    python -m benchmarks.bench_transcript
+"""
+
+import asyncio
+import time
+
+from textual.app import App, ComposeResult
+from textual.containers import VerticalScroll
+
+from src.myllamatui.widgets_and_screens.ui_chat_transcript import ChatTranscript
+from src.myllamatui.widgets_and_screens.ui_widgets_messages import ChatEntry
+
+CHAT_COUNTS = [10, 100, 1000]
+# mounting 1000 chats eagerly takes minutes (~270 s here), skip it by default
+EAGER_MAX_CHATS = 100
+ANSWER = "\n\n".join(
+    [
+        "## Heading",
+        "Some *markdown* text with `inline code` and a list:",
+        "- one\n- two\n- three",
+        "```python\ndef answer():\n    return 42\n```",
+    ]
+    * 3
+)
+
+
+def chat_records(count: int) -> list:
+    return [
+        {
+            "date_info": f"model - 2025-01-01 - chat id: {i}",
+            "question": f"Question number {i}?",
+            "answer": ANSWER,
+        }
+        for i in range(count)
+    ]
+
+
+class BenchApp(App):
+    def compose(self) -> ComposeResult:
+        yield VerticalScroll(id="eager")
+        yield ChatTranscript(id="virtual")
+
+
+async def open_topic_eager(app: App, pilot, records: list) -> float:
+    container = app.query_one("#eager")
+    start = time.perf_counter()
+    await container.remove_children()
+    await container.mount_all([ChatEntry(**record) for record in records])
+    container.scroll_end(animate=False)
+    await pilot.pause()
+    elapsed = time.perf_counter() - start
+    await container.remove_children()
+    return elapsed
+
+
+async def open_topic_virtual(app: App, pilot, records: list) -> float:
+    transcript = app.query_one("#virtual")
+    start = time.perf_counter()
+    await transcript.load_chats(records)
+    await pilot.pause()
+    elapsed = time.perf_counter() - start
+    mounted = len(app.query(ChatEntry))
+    await transcript.remove_children()
+    return elapsed, mounted
+
+
+async def main() -> None:
+    app = BenchApp()
+    async with app.run_test(size=(120, 40)) as pilot:
+        app.query_one("#virtual").display = False
+        for count in CHAT_COUNTS:
+            records = chat_records(count)
+            if count <= EAGER_MAX_CHATS:
+                eager = f"{await open_topic_eager(app, pilot, records) * 1000:9.1f} ms"
+            else:
+                eager = f"{'skipped':>12}"
+
+            app.query_one("#eager").display = False
+            app.query_one("#virtual").display = True
+            virtual, mounted = await open_topic_virtual(app, pilot, records)
+            app.query_one("#virtual").display = False
+            app.query_one("#eager").display = True
+
+            print(
+                f"{count:>5} chats   mount all: {eager}   "
+                f"virtualized: {virtual * 1000:8.1f} ms ({mounted} chats mounted)"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
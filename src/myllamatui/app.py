@@ -1,22 +1,26 @@
 import logging
 import os
+import time
+
+from collections import deque
+
+import httpx
 
 from datetime import datetime
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 
 from peewee import *
 
 from textual import on
 from textual.app import App, ComposeResult
-from textual.containers import Grid, VerticalScroll
+from textual.worker import Worker, WorkerCancelled, WorkerFailed, WorkerState
+from textual.containers import Grid
 from textual.widgets import (
     Button,
     Footer,
     Header,
     Input,
-    Label,
-    Markdown,
     Select,
     Tree,
 )
@@ -24,7 +28,6 @@ from textual.widgets import (
 from src.myllamatui.db_models import (
     Context,
     Topic,
-    Category,
     LLM_MODEL,
     Chat,
     CLI_Settings,
@@ -32,29 +35,78 @@ from src.myllamatui.db_models import (
 from src.myllamatui.init_files import set_database_path
 from src.myllamatui.setup_utils import (
     create_db,
+    migrate_db,
     populate_llm_models,
     initialize_db_defaults,
 )
 from src.myllamatui.chats import (
-    chat_with_llm_UI,
-    create_and_apply_chat_topic_ui,
+    CHAT_PAGE_SIZE,
+    RESUME_TURNS,
+    chat_page_cursor,
+    chat_stats_label,
+    evaluation_messages,
+    load_chat_page,
+    load_chats_by_id,
+    load_chats_since,
     resume_previous_chats_ui,
     save_chat,
+    stats_label,
+    stream_chat_with_llm_UI,
 )
 from src.myllamatui.import_export_files import (
     open_files_and_add_to_question,
 )
-from src.myllamatui.llm_models import model_choice_setup
-from src.myllamatui.topics_contexts_categories import context_choice_setup
+from src.myllamatui.context_window import context_budget, context_usage_label
+from src.myllamatui.classification import (
+    DEFAULT_TOPIC_ID,
+    enqueue_classification,
+    next_classification_job,
+    reclassify_default_topic_chats,
+    run_classification_job,
+)
+from src.myllamatui.embeddings import index_chats, select_embedding_model
+from src.myllamatui.llm_calls import close_http_client
+from src.myllamatui.search import create_chat_search
+from src.myllamatui.llm_models import (
+    clear_model_name_cache,
+    ensure_model_metadata,
+    model_choice_setup,
+    model_name_for_id,
+    model_names_by_id,
+)
+from src.myllamatui.summaries import (
+    drop_messages,
+    load_topic_summary,
+    needs_summary,
+    older_turns,
+    save_topic_summary,
+    summarize_turns,
+)
+from src.myllamatui.topics_contexts_categories import (
+    context_choice_setup,
+    context_with_summary,
+    load_categories,
+    load_category_topics,
+)
 from src.myllamatui.widgets_and_screens.ui_widgets_messages import (
+    ChatEntry,
+    ChatSearchSelected,
+    ChatsCompared,
     QuestionAsk,
     FileSelected,
+    OlderChatsRequested,
     SettingsChanged,
     SupportNotifyRequest,
 )
+from src.myllamatui.widgets_and_screens.ui_chat_transcript import ChatTranscript
 from src.myllamatui.widgets_and_screens.ui_file_screen import FilePathScreen
 from src.myllamatui.widgets_and_screens.ui_settings_screen import SettingsScreen
-from src.myllamatui.widgets_and_screens.ui_modal_screens import QuitScreen
+from src.myllamatui.widgets_and_screens.ui_search_screen import ChatSearchScreen
+from src.myllamatui.widgets_and_screens.ui_modal_screens import KeepPartialAnswerScreen
+from src.myllamatui.widgets_and_screens.ui_compare_screen import (
+    CompareModelsPicker,
+    CompareScreen,
+)
 
 # CONSTANT PROMPTS
 from src.myllamatui.prompts import (
@@ -72,6 +124,16 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+# minimum seconds between re-renders of a streaming answer
+STREAM_RENDER_INTERVAL = 0.15
+# workers nothing waits on, their failures are logged rather than closing the app
+BACKGROUND_WORKER_GROUPS = {
+    "classification",
+    "reclassify",
+    "summaries",
+    "embeddings",
+}
+
 
 class MyLlamaTUI(App):
     """A Textual app to manage ollama chats and models."""
@@ -80,6 +142,11 @@ class MyLlamaTUI(App):
 
     BINDINGS = [
         ("s", "save", "Update Chat Topic"),
+        ("ctrl+f", "search", "Search Chats"),
+        ("ctrl+r", "reclassify", "Sort Untitled Chats"),
+        ("ctrl+t", "toggle_summaries", "Summarize Long Chats"),
+        ("ctrl+o", "compare", "Compare Models"),
+        ("escape", "cancel_answer", "Cancel Answer"),
         ("q", "quit", "Quit"),
     ]
 
@@ -99,6 +166,15 @@ class MyLlamaTUI(App):
         self.followup_model_choice_name = ""
         self.topic_id = 1
         self.chats_loaded = False
+        # topic open in the chat window and the cursor for its next older page
+        self.open_topic_id = None
+        self.chat_page_cursor = None
+
+        # tree nodes by db id so the tree can be updated in place
+        self.tree_category_nodes = {}
+        self.current_chat_node = None
+        # {category_id: {topic_id: (text, chat count)}} for categories opened
+        self.tree_topic_cache = {}
 
         # Files
         self.file_path = ""
@@ -106,12 +182,25 @@ class MyLlamaTUI(App):
         # chats
         self.LLM_MESSAGES = []
         self.previous_messages = []
+        # running summary of turns no longer sent, when summaries are on
+        self.summarize_long_chats = False
+        self.conversation_summary = ""
+        self.summary_worker = None
         self.chat_object_list = []
         self.current_session_chat_object_list = []
+        # questions waiting to be answered, (question, file path) in the order asked
+        self.question_queue = deque()
+        self.question_worker = None
+        # the answer being streamed, so a cancelled one can be kept or discarded
+        self.partial_chat = None
 
         # display
         self.model_date_display_info = ""
 
+        # background topic classification
+        self.classification_worker = None
+        self.reclassify_worker = None
+
         # settings window
         self.settings_edit_selector = ""
         self.context_switcher_file_or_export = ""
@@ -145,7 +234,9 @@ class MyLlamaTUI(App):
                 prompt="Verificatin Model:",
                 id="VerificationModelSelect_topbar",
             )
-            yield VerticalScroll(id="CurrentChat_MainChatWindow")
+            yield ChatTranscript(id="CurrentChat_MainChatWindow")
+            # only shown while a verification model is selected
+            yield ChatTranscript(id="VerificationPane")
             yield Tree("Previous Chats", id="ChatHistoryDisplay_sidebar")
             yield QuestionAsk(id="QuestionAsk_bottombar")
             yield Button("Add File", id="filepathbutton", variant="primary")
@@ -156,43 +247,38 @@ class MyLlamaTUI(App):
     #### Widget Helper Defs ####
     #############################
 
-    def add_wdg_to_scroll(
+    def build_chat_record(
         self,
         question: str,
         answer: str,
         model_name: str,
         previouschatdate: str,
         chat_id: str,
-        chatcontainer,
-    ) -> None:
-        """Create and mount widgets for chat"""
+        stats: str = "",
+    ) -> Dict[str, str]:
+        """Create the text shown for a chat, stats are shown after the date"""
 
-        # mount date and model info
+        # date and model info
         if previouschatdate is not None:
             qdate = previouschatdate
         else:
             qdate = "Today"
 
         model_date_display_info = f"{str(model_name)} - {qdate} - chat id: {chat_id}"
+        if stats:
+            model_date_display_info += f" - {stats}"
 
-        # mount to chat container
-        if question != EVALUATION_QUESTION:
-            question_container = Markdown(question, classes="cssquestion")
-
-        else:
-            question_container = Markdown("Evaluation:", classes="cssquestion")
+        if question == EVALUATION_QUESTION:
+            question = "Evaluation:"
 
         if model_date_display_info != self.model_date_display_info:
-            self.model_date_display_info = (
-                f"{str(model_name)} - {qdate} - chat id: {chat_id}"
-            )
-
-        chatcontainer.mount(Label(self.model_date_display_info, classes="cssdate"))
-        chatcontainer.mount(question_container)
+            self.model_date_display_info = model_date_display_info
 
-        #### mount answer ####
-        answer_container = Markdown(answer, classes="cssanswer")
-        chatcontainer.mount(answer_container)
+        return {
+            "date_info": self.model_date_display_info,
+            "question": question,
+            "answer": answer,
+        }
 
     def action_remove_chat(self) -> None:
         """Clear chats."""
@@ -201,41 +287,78 @@ class MyLlamaTUI(App):
         mounted_labels.remove()
         mounted_markdowns.remove()
 
-    def populate_tree_topic(self) -> Dict:
-        """create a dict of {topic object : [list of chats under topic]}"""
-        previous_chats = {}
-        topics = Topic.select()
-        for topic in topics:
-            if topic.text != "default":
-                chat_under_topic = Chat.select().where(Chat.topic_id == topic.id)
-                previous_chats[topic] = chat_under_topic
-        return previous_chats
+    def topic_tree_label(self, topic_text: str, chat_count: int) -> str:
+        return f"{topic_text} ({chat_count})"
 
     def update_tree(self) -> None:
-        """Update tree with selections from the DB"""
+        """Update the tree's categories from the DB, changing only nodes that differ.
+
+        Topics are loaded when a category is first expanded.
+        """
 
         tree = self.query_one(Tree)
-        tree = self.query_one(Tree)
-        tree.clear()
-        previous_chats = tree.root.expand()
+        categories = load_categories()
 
-        categories = Category.select()
-        tree_dict = {}
+        # first load, setup the fixed nodes. Categories are added above them.
+        if self.current_chat_node is None:
+            tree.root.expand()
+            self.current_chat_node = tree.root.add("Current Chat")
+            tree.root.add("New Chat")
 
-        ##### keep this works
         # setup categories (level 1)
-        for category_name in categories:
-            if str(category_name.text) != "default":
-                tree_dict[str(category_name.id)] = previous_chats.add(
-                    str(category_name.text), allow_expand=True
+        for category_id in list(self.tree_category_nodes.keys()):
+            if category_id not in categories:
+                self.tree_category_nodes.pop(category_id).remove()
+                self.tree_topic_cache.pop(category_id, None)
+
+        for category_id, category_text in categories.items():
+            category_node = self.tree_category_nodes.get(category_id)
+            if category_node is None:
+                self.tree_category_nodes[category_id] = tree.root.add(
+                    str(category_text),
+                    data={"category_id": category_id},
+                    before=self.current_chat_node,
+                    allow_expand=True,
                 )
-        tree.root.add("Current Chat")
-        tree.root.add("New Chat")
+            elif str(category_node.label) != str(category_text):
+                category_node.set_label(str(category_text))
+
+    def load_category_node(self, category_node) -> None:
+        """Add a category's topics (level 2) from the cache, or the DB if not cached"""
+
+        category_id = category_node.data["category_id"]
+        if category_id not in self.tree_topic_cache:
+            self.tree_topic_cache[category_id] = load_category_topics(category_id)
+
+        category_node.remove_children()
+        for topic_id, (topic_text, chat_count) in self.tree_topic_cache[
+            category_id
+        ].items():
+            category_node.add_leaf(
+                self.topic_tree_label(topic_text, chat_count),
+                data={"topic_id": topic_id, "category_id": category_id},
+            )
 
-        # topic_list is a list of Topic objects
-        topic_list = self.populate_tree_topic()
-        for single_topic in topic_list:
-            tree_dict[str(single_topic.category_id)].add(str(single_topic.text))
+    def invalidate_tree_categories(self, category_ids: List) -> None:
+        """Drop cached topics for categories, reloading any that are open"""
+
+        for category_id in category_ids:
+            self.tree_topic_cache.pop(category_id, None)
+            category_node = self.tree_category_nodes.get(category_id)
+            if category_node is None:
+                continue
+            if category_node.is_expanded:
+                self.load_category_node(category_node)
+            else:
+                category_node.remove_children()
+
+    def on_tree_node_expanded(self, event: Tree.NodeExpanded) -> None:
+        node_data = event.node.data or {}
+        if (
+            "category_id" in node_data
+            and node_data["category_id"] not in self.tree_topic_cache
+        ):
+            self.load_category_node(event.node)
 
     ### this is the main wrapper for the chat ####
     async def chat_record_display(
@@ -247,9 +370,16 @@ class MyLlamaTUI(App):
         model_name: str,
         model_id: str,
         file_path: str,
+        container_id: str = "#CurrentChat_MainChatWindow",
+        track_partial: bool = True,
     ) -> None:
-        """Wraps chat call, saving to db, and displaying"""
+        """Wraps chat call, saving to db, and displaying.
+
+        track_partial keeps the answer in self.partial_chat while it streams, so
+        it can be kept or discarded if the request is cancelled.
+        """
         # chat
+        started = time.monotonic()
 
         # send submitted quesiton to llm
         submitted_question = question
@@ -259,43 +389,132 @@ class MyLlamaTUI(App):
                 "Adding Files to Question. This might take a second",
                 severity="information",
             )
-            submitted_question = open_files_and_add_to_question(
-                question, self.file_path
-            )
-            question = question + f"{self.file_path}"
+            submitted_question = open_files_and_add_to_question(question, file_path)
+            question = question + f"{file_path}"
 
         logging.debug(submitted_question)
 
-        answer, self.LLM_MESSAGES = await chat_with_llm_UI(
+        # display the question straight away and stream the answer into it
+        chatcontainer = self.query_one(container_id)
+        chat_entry = ChatEntry(
+            **self.build_chat_record(question, "", model_name, None, "")
+        )
+        chat_entry.streaming = True
+        await chatcontainer.add_entry(chat_entry)
+        partial_chat = {
+            "chat_entry": chat_entry,
+            "question": question,
+            "answer": "",
+            "messages": messages,
+            "model_name": model_name,
+            "model_id": model_id,
+            "stats": {},
+        }
+        if track_partial:
+            self.partial_chat = partial_chat
+
+        # only re-render once the previous render is done and the interval has passed
+        answer = ""
+        render = None
+        last_render = 0.0
+        async for answer in stream_chat_with_llm_UI(
             url,
             submitted_question,
             context,
             messages,
             model_name,
+            token_budget=context_budget(model_name),
+            stats=partial_chat["stats"],
+        ):
+            partial_chat["answer"] = answer
+            now = time.monotonic()
+            if (render is None or render.is_done) and (
+                now - last_render >= STREAM_RENDER_INTERVAL
+            ):
+                render = chat_entry.update_answer(answer)
+                last_render = now
+                chatcontainer.scroll_end(animate=False)
+        if track_partial:
+            self.partial_chat = None
+        await chat_entry.update_answer(answer)
+        chat_entry.streaming = False
+        self.update_context_usage()
+        seconds = time.monotonic() - started
+        logging.info(f"{model_name} answered in {seconds:.2f}s")
+        # Ollama reports its own total in the final chunk
+        partial_chat["stats"].setdefault("total_seconds", seconds)
+        await self.finish_chat_record(
+            chat_entry, question, answer, model_name, model_id, partial_chat["stats"]
         )
 
+    async def finish_chat_record(
+        self,
+        chat_entry: ChatEntry,
+        question: str,
+        answer: str,
+        model_name: str,
+        model_id: str,
+        stats: Optional[Dict] = None,
+    ) -> None:
+        """Save a finished answer, or remove it if the evaluation found no changes"""
+
         if ACURATE_RESPONSE not in answer:
             # record
             # send question to db - with path only if needed
             chat_object_id = save_chat(
-                question, answer, self.context_choice_id, self.topic_id, model_id
+                question,
+                answer,
+                self.context_choice_id,
+                self.topic_id,
+                model_id,
+                stats=stats,
             )
 
             # add to list for topic updates later
             self.chat_object_list.append(chat_object_id)
             self.current_session_chat_object_list.append(chat_object_id)
+            self.start_chat_embedding()
 
             # display
-            chatcontainer = self.query_one("#CurrentChat_MainChatWindow")
+            date_info = f"{str(model_name)} - Today - chat id: {str(chat_object_id.id)}"
+            if stats:
+                date_info += f" - {stats_label(stats)}"
+            chat_entry.update_date_info(date_info)
+        else:
+            await chat_entry.parent.remove()
 
-            self.add_wdg_to_scroll(
-                question,
+    async def resolve_partial_answer(self) -> None:
+        """Keep or discard the answer of a cancelled or failed request"""
+
+        partial = self.partial_chat
+        self.partial_chat = None
+        if partial is None:
+            return
+        chat_entry = partial["chat_entry"]
+        chat_entry.streaming = False
+        answer = partial["answer"]
+
+        keep = answer != "" and await self.push_screen_wait(
+            KeepPartialAnswerScreen(answer)
+        )
+        if keep:
+            partial["messages"].append({"role": "assistant", "content": answer})
+            await chat_entry.update_answer(answer)
+            await self.finish_chat_record(
+                chat_entry,
+                partial["question"],
                 answer,
-                model_name,
-                None,
-                str(chat_object_id.id),
-                chatcontainer,
+                partial["model_name"],
+                partial["model_id"],
+                partial["stats"],
             )
+        else:
+            # the question went out without an answer, take it back out
+            messages = partial["messages"]
+            if messages and messages[-1].get("role") == "user":
+                messages.pop()
+            await chat_entry.parent.remove()
+        self.update_context_usage()
 
     #################################
     ##### ACTIONS | Main Window #####
@@ -314,144 +533,344 @@ class MyLlamaTUI(App):
         """Get Selection from Model select box."""
         self.model_choice_id = str(event.value)
         logging.debug("Primary Model: {}".format(self.model_choice_id))
-        model_obj = LLM_MODEL.get_by_id(self.model_choice_id)
-        self.model_choice_name = model_obj.model
+        self.model_choice_name = model_name_for_id(self.model_choice_id)
         logging.debug("Primary Model name: {}".format(self.model_choice_name))
+        self.update_context_usage()
+        self.start_model_metadata()
+
+    def start_model_metadata(self) -> None:
+        """Fetch the primary model's details in the background"""
+
+        if self.model_choice_name is not None:
+            self.run_worker(
+                self.load_model_metadata(self.model_choice_name),
+                group="metadata",
+                exclusive=True,
+                exit_on_error=False,
+            )
+
+    async def load_model_metadata(self, model_name: str) -> None:
+        """Fetch the model's context window if it isn't cached yet"""
+        try:
+            await ensure_model_metadata(self.url, model_name)
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"Unable to load details of {model_name}: {e!r}")
+            return
+        self.update_context_usage()
+
+    def update_context_usage(self) -> None:
+        """Show how much of the model's context the conversation uses"""
+        self.sub_title = context_usage_label(self.LLM_MESSAGES, self.model_choice_name)
 
     @on(Select.Changed, "#VerificationModelSelect_topbar")
     def select_verification_model_changed(self, event: Select.Changed) -> None:
         """Get Selection from Model select box."""
         self.followup_model_choice_id = str(event.value)
         logging.debug("Follow upModel: {}".format(self.followup_model_choice_id))
-        model_obj = LLM_MODEL.get_by_id(self.followup_model_choice_id)
-        self.followup_model_choice_name = model_obj.model
+        self.followup_model_choice_name = model_name_for_id(
+            self.followup_model_choice_id
+        )
         logging.debug("Folloup Model name: {}".format(self.followup_model_choice_name))
-        if int(event.value) > 0:
+        verifying = self.followup_model_choice_name is not None
+        self.query_one(Grid).set_class(verifying, "verifying")
+        if verifying:
             self.notify(
-                "Please Note: This will make the 'Thinking' phase take at least twice as long!",
-                severity="warning",
+                "Answers will be checked by the verification model in the right pane.",
+                severity="information",
             )
 
     # submit button
     @on(Input.Submitted, "#question_text")
     @on(Button.Pressed, "#SubmitQuestion")
     async def on_input_changed(self, event: Button.Pressed) -> None:
-        """Manage Submit Question Button and input."""
+        """Queue the question, it is asked once the ones before it are answered."""
 
         logging.debug("Question asked")
 
         # setup question
         input = self.query_one("#question_text")
         question = input.value
+        logging.debug("questions: {}".format(question))
 
-        # clean up file path as the data will already be in messages
-        model_list = [llm_model.model for llm_model in LLM_MODEL.select()]
+        # files go with the question they were added for, and only that one
+        self.question_queue.append((question, self.file_path))
+        self.file_path = ""
+        input.clear()
 
-        # setup loading graphic
-        self.query_one("#SubmitQuestion").loading = True
-        input.loading = True
+        worker = self.question_worker
+        if worker is None or worker.is_finished:
+            # setup loading graphic, the input stays free for follow up questions
+            self.query_one("#SubmitQuestion").loading = True
+            self.question_worker = self.run_worker(
+                self.answer_questions(), group="questions"
+            )
+        else:
+            self.notify(
+                f"Question queued, {len(self.question_queue)} waiting.",
+                severity="information",
+            )
 
-        logging.debug("saving chats")
+    async def answer_questions(self) -> None:
+        """Ask queued questions one at a time in the order they were asked.
 
-        # call LLM
-        logging.debug("questions: {}".format(question))
+        Each answer is its own worker so it can be cancelled without losing the
+        questions after it.
+        """
+
+        while self.question_queue:
+            question, file_path = self.question_queue.popleft()
+            answer_worker = self.run_worker(
+                self.answer_question(question, file_path),
+                group="answer",
+                exit_on_error=False,
+            )
+            try:
+                await answer_worker.wait()
+            except WorkerCancelled:
+                await self.resolve_partial_answer()
+            except WorkerFailed as e:
+                logging.error(f"Unable to answer {question!r}: {e.error!r}")
+                self.notify(f"Unable to get an answer: {e.error}", severity="error")
+                await self.resolve_partial_answer()
+
+        # clean up after chat is complete
+        self.done_loading()
+        self.start_summary()
+
+    async def answer_question(self, question: str, file_path: str) -> None:
+        model_list = list(model_names_by_id().values())
 
+        # call LLM
         await self.chat_record_display(
             self.url,
             question,
-            self.context_choice_text,
+            context_with_summary(self.context_choice_text, self.conversation_summary),
             self.LLM_MESSAGES,
             self.model_choice_name,
             self.model_choice_id,
-            self.file_path,
+            file_path,
         )
 
-        # reset files to ensure that they isn't added repeatdly
-        self.file_path = ""
         if (
             self.chats_loaded == False
             and str(self.followup_model_choice_name) in model_list
         ):
-            # this should be a call with a return
             logging.info(
                 f"{self.followup_model_choice_id} set as followup. Evaluating update."
             )
-            # note I'm saving chat with original context
+            # runs alongside the next question on a copy of the conversation as it
+            # is now, which also keeps the main conversation's prefix stable
+            self.run_worker(
+                self.verify_answer(
+                    evaluation_messages(self.LLM_MESSAGES, EVALUTATE_CONTEXT)
+                ),
+                group="verification",
+                exit_on_error=False,
+            )
+        self.chats_loaded = False
+
+    async def verify_answer(self, messages: list) -> None:
+        """Ask the verification model to check the latest answer, in its own pane"""
+
+        # note I'm saving chat with original context.
+        try:
             await self.chat_record_display(
                 self.url,
                 EVALUATION_QUESTION,
                 EVALUTATE_CONTEXT,
-                self.LLM_MESSAGES,
+                messages,
                 self.followup_model_choice_name,
                 self.followup_model_choice_id,
-                self.file_path,
+                "",
+                container_id="#VerificationPane",
+                track_partial=False,
             )
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"Verification failed: {e!r}")
+            self.notify(f"Verification failed: {e}", severity="error")
 
-        # clean up after chat is complete
-        self.done_loading()
-        input.clear()
-        self.chats_loaded = False
+    def action_cancel_answer(self) -> None:
+        """Stop the answer being streamed, the next queued question goes next"""
 
-    def view_previous_chats(self, previous_chats: list) -> None:
-        """loads previous chats"""
+        if self.partial_chat is not None:
+            self.workers.cancel_group(self, "answer")
 
-        chatcontainer = self.query_one("#CurrentChat_MainChatWindow")
-
-        for item in chatcontainer.children:
-            item.remove()
-        previous_chat_date = ""
+    def chat_records_for_display(self, previous_chats: list) -> List[Dict[str, str]]:
+        chat_records = []
         for chat in previous_chats:
             chatdate = str(chat.created_at).split()
             previous_chat_date = chatdate[0]
 
-            # get model id
-            llm_model = LLM_MODEL.get_by_id(chat.llm_model_id)
-
-            self.add_wdg_to_scroll(
-                chat.question,
-                chat.answer,
-                llm_model.model,
-                previous_chat_date,
-                str(chat.id),
-                chatcontainer,
+            # model row is loaded with the chat
+            if chat.llm_model_id is not None:
+                model_name = chat.llm_model_id.model
+            else:
+                model_name = "Unknown model"
+
+            chat_records.append(
+                self.build_chat_record(
+                    chat.question,
+                    chat.answer,
+                    model_name,
+                    previous_chat_date,
+                    str(chat.id),
+                    chat_stats_label(chat),
+                )
             )
+        return chat_records
 
+    async def view_previous_chats(
+        self, previous_chats: list, found_chat_id: Optional[int] = None
+    ) -> None:
+        """loads previous chats, scrolled to found_chat_id if given"""
+
+        found_index = None
+        for index, chat in enumerate(previous_chats):
+            if chat.id == found_chat_id:
+                found_index = index
+        chatcontainer = self.query_one("#CurrentChat_MainChatWindow")
+        await chatcontainer.load_chats(
+            self.chat_records_for_display(previous_chats),
+            has_older=self.chat_page_cursor is not None,
+            found_index=found_index,
+        )
+
+        # only the latest turns are sent back to the llm
+        previous_chats = list(previous_chats)
+        previous_topic_id = self.topic_id
         reformatted_previous_chats, self.topic_id = resume_previous_chats_ui(
-            previous_chats
+            previous_chats[-RESUME_TURNS:]
         )
 
         # finally update on going session lists
         self.LLM_MESSAGES = self.LLM_MESSAGES + reformatted_previous_chats
-        self.chat_object_list = list(previous_chats)
+        self.chat_object_list = previous_chats
+        # a summary only belongs to the topic it was written for
+        if str(self.topic_id) != str(previous_topic_id):
+            self.conversation_summary = ""
+        topic_summary = load_topic_summary(int(self.topic_id))
+        if topic_summary is not None:
+            self.conversation_summary = topic_summary.summary
+        self.update_context_usage()
+
+    async def on_older_chats_requested(self, message: OlderChatsRequested) -> None:
+        """Load the page of chats before the oldest one shown"""
+
+        if self.chat_page_cursor is None:
+            return
+        older_chats = load_chat_page(self.open_topic_id, before=self.chat_page_cursor)
+        self.chat_page_cursor = chat_page_cursor(older_chats)
+
+        await self.query_one("#CurrentChat_MainChatWindow").prepend_chats(
+            self.chat_records_for_display(older_chats),
+            has_older=self.chat_page_cursor is not None,
+        )
+        self.chat_object_list = older_chats + self.chat_object_list
 
     async def on_tree_node_selected(self, event: Tree) -> None:
         """Load Old Chats in tree. If new just, save existing and clear."""
 
         logging.debug(f"Tree label, id, and choice selected: {event.node.label}")
         selected_subject = str(event.node.label)
+        node_data = event.node.data or {}
         previous_chats = []
-        if selected_subject == "New Chat":
+        self.open_topic_id = None
+        self.chat_page_cursor = None
+        if "topic_id" in node_data:
+            self.open_topic_id = node_data["topic_id"]
+            previous_chats = load_chat_page(self.open_topic_id)
+            self.chat_page_cursor = chat_page_cursor(previous_chats)
+            self.chats_loaded = True
+        elif selected_subject == "New Chat":
             logging.debug("New Chat Selected")
             topic = Topic.get_by_id(1)
             save_list = Chat.select().where(Chat.topic_id == topic.id)
             for chat in save_list:
                 logging.debug(f"new chat{chat} id {chat.topic_id}")
             self.topic_id = 1
+            self.conversation_summary = ""
             await self.action_save()
             # reset to default topic id
         elif selected_subject == "Current Chat":
-            for id in self.current_session_chat_object_list:
-                chat_obj = Chat.get_by_id(id)
-                previous_chats.append(chat_obj)
-                self.chats_loaded = False
-        elif selected_subject in [topic.text for topic in Topic.select()]:
-            topic = Topic.get(Topic.text == selected_subject)
-            previous_chats = Chat.select().where(Chat.topic_id == topic.id)
-            self.chats_loaded = True
+            previous_chats = load_chats_by_id(
+                [chat.id for chat in self.current_session_chat_object_list]
+            )
+            self.chats_loaded = False
         else:
             logging.debug("Category Selected")
 
-        self.view_previous_chats(previous_chats)
+        await self.view_previous_chats(previous_chats)
+
+    async def on_chat_search_selected(self, message: ChatSearchSelected) -> None:
+        """Open the topic of a chat found by search at its latest chats, scrolled
+        back to the chat that was found"""
+
+        chat = Chat.get_or_none(Chat.id == message.chat_id)
+        if chat is None:
+            return
+        self.open_topic_id = chat.topic_id_id
+        previous_chats = load_chats_since(
+            self.open_topic_id, (chat.created_at, chat.id)
+        )
+        self.chat_page_cursor = chat_page_cursor(
+            previous_chats, limit=max(len(previous_chats), CHAT_PAGE_SIZE)
+        )
+        self.chats_loaded = True
+        await self.view_previous_chats(previous_chats, found_chat_id=chat.id)
+
+    def action_search(self) -> None:
+        self.push_screen(ChatSearchScreen(self.url))
+
+    def action_compare(self) -> None:
+        self.push_screen(CompareModelsPicker(self.model_choice_id), self.open_compare)
+
+    def open_compare(self, model_ids: List[int]) -> None:
+        if not model_ids:
+            return
+        self.push_screen(
+            CompareScreen(
+                self.url,
+                model_ids,
+                self.context_choice_id,
+                context_with_summary(
+                    self.context_choice_text, self.conversation_summary
+                ),
+                self.topic_id,
+                self.LLM_MESSAGES,
+            )
+        )
+
+    def on_chats_compared(self, message: ChatsCompared) -> None:
+        """Compared chats are classified and embedded with the session's chats"""
+
+        if not message.chat_ids:
+            return
+        self.chat_object_list.extend(load_chats_by_id(message.chat_ids))
+        self.start_chat_embedding()
+        self.update_tree()
+
+    def start_chat_embedding(self) -> None:
+        """Embed new chats in the background if there is an embedding model"""
+
+        model_name = select_embedding_model()
+        if model_name is None:
+            return
+        # a newer run picks up everything the cancelled one had left
+        self.run_worker(
+            self.embed_chats(model_name),
+            group="embeddings",
+            exclusive=True,
+            exit_on_error=False,
+        )
+
+    async def embed_chats(self, model_name: str) -> None:
+        try:
+            indexed = await index_chats(self.url, model_name)
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"Unable to embed chats with {model_name}: {e!r}")
+            return
+        if indexed:
+            logging.info(f"Embedded {indexed} chats with {model_name}")
 
     @on(Button.Pressed, "#settings")
     def add_settings_screen_to_stack(self, event: Button.Pressed) -> None:
@@ -488,10 +907,9 @@ class MyLlamaTUI(App):
         if message.context_changed != "":
             self.query_one("#ContextDisplay_topbar").set_options(context_choice_setup())
 
-        if message.topic_changed != "" or message.category_changed != "":
-            self.query_one("#ChatHistoryDisplay_sidebar").clear
-
         if message.model_changed != "":
+            clear_model_name_cache()
+            self.start_chat_embedding()
             self.query_one("#ModelDisplay_topbar").set_options(model_choice_setup())
             self.query_one("#VerificationModelSelect_topbar").set_options(
                 model_choice_setup()
@@ -500,6 +918,15 @@ class MyLlamaTUI(App):
         if message.url_changed != "":
             self.url = message.url_changed
 
+        if message.topic_changed != "" or message.category_changed != "":
+            self.invalidate_tree_categories(
+                [
+                    int(category_id)
+                    for category_id in message.changed_category_ids.split(",")
+                    if category_id != ""
+                ]
+            )
+
         self.update_tree()
 
     # note this isn't currently in use. Leaving for now as it could be useful
@@ -511,43 +938,141 @@ class MyLlamaTUI(App):
         self.query_one("#SubmitQuestion").loading = False
         self.query_one("#question_text").loading = False
 
-    async def add_topic_to_chat(self) -> None:
-        """Save a summary of the chats and quit."""
-        self.notify(
-            "Updating Chat Topics. This will take a few seconds.",
-            severity="information",
+    def on_worker_state_changed(self, event: Worker.StateChanged) -> None:
+        """Log a failed background worker, the app carries on without it"""
+
+        worker = event.worker
+        if (
+            event.state == WorkerState.ERROR
+            and worker.group in BACKGROUND_WORKER_GROUPS
+        ):
+            logging.error(f"Background {worker.group} failed: {worker.error!r}")
+            self.notify(
+                f"Background {worker.group} failed: {worker.error}", severity="error"
+            )
+
+    def start_classification(self) -> None:
+        """Work through queued classification jobs in the background"""
+
+        worker = self.classification_worker
+        if worker is None or worker.is_finished:
+            self.classification_worker = self.run_worker(
+                self.classify_queued_chats(),
+                group="classification",
+                exit_on_error=False,
+            )
+
+    async def classify_queued_chats(self) -> None:
+        """Run jobs until the queue is empty, updating the tree after each"""
+
+        while (job := next_classification_job()) is not None:
+            category_id = await run_classification_job(
+                self.url, job, embedding_model=select_embedding_model()
+            )
+            if category_id is None:
+                # failed, it is retried on the next save or launch
+                if next_classification_job() == job:
+                    break
+                continue
+            self.invalidate_tree_categories([category_id])
+            self.update_tree()
+            self.notify("Chat topics updated.", severity="information")
+
+    def action_reclassify(self) -> None:
+        """Classify every chat still under the default topic in the background"""
+
+        worker = self.reclassify_worker
+        if worker is not None and not worker.is_finished:
+            self.notify("Already sorting chats.", severity="warning")
+            return
+        self.notify("Sorting untitled chats into topics.", severity="information")
+        self.reclassify_worker = self.run_worker(
+            self.reclassify_chats(), group="reclassify", exit_on_error=False
         )
-        unparsed_chats = Chat.select().where(Chat.topic_id == 1)
-        topic_id = await create_and_apply_chat_topic_ui(
+
+    async def reclassify_chats(self) -> None:
+        stats = await reclassify_default_topic_chats(
             self.url,
-            self.LLM_MESSAGES,
             self.model_choice_name,
+            embedding_model=select_embedding_model(),
+        )
+        # categories of the new topics aren't known here, rebuild the whole tree
+        self.invalidate_tree_categories(list(self.tree_category_nodes))
+        self.update_tree()
+        self.notify(
+            f"Sorted {stats['chats']} chats in {stats['seconds']:.0f}s "
+            f"({stats['chats_per_second']:.1f} chats/s), "
+            f"{stats['failed_groups']} groups failed.",
+            severity="information",
         )
-        for current_chat in unparsed_chats:
-            current_chat.update_chat_topic_from_summary(topic_id)
 
-    async def action_save(self) -> None:
-        """Save a summary of the chats and quit."""
-        unparsed_chats = Chat.select().where(Chat.topic_id == 1)
-        if len(unparsed_chats) > 0 and self.topic_id == 1:
-            logging.debug("saving chats")
-            self.push_screen(
-                QuitScreen("Updating Chat Topics. This will take a few seconds.")
+    def action_toggle_summaries(self) -> None:
+        self.summarize_long_chats = not self.summarize_long_chats
+        state = "on" if self.summarize_long_chats else "off"
+        self.notify(f"Summarizing long chats is {state}.", severity="information")
+        self.start_summary()
+
+    def start_summary(self) -> None:
+        """Summarize older turns in the background once the conversation is long"""
+
+        if not self.summarize_long_chats:
+            return
+        worker = self.summary_worker
+        if worker is not None and not worker.is_finished:
+            return
+        if needs_summary(self.LLM_MESSAGES, context_budget(self.model_choice_name)):
+            self.summary_worker = self.run_worker(
+                self.summarize_conversation(), group="summaries", exit_on_error=False
+            )
+
+    async def summarize_conversation(self) -> None:
+        turns = older_turns(self.LLM_MESSAGES)
+        if not turns:
+            return
+        try:
+            summary = await summarize_turns(
+                self.url, turns, self.model_choice_name, self.conversation_summary
             )
-            await self.add_topic_to_chat()
-            self.pop_screen()
-            self.chat_object_list = []
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"Unable to summarize the conversation: {e!r}")
+            return
+        if not summary:
+            return
+        drop_messages(self.LLM_MESSAGES, turns)
+        self.conversation_summary = summary
+        # new chats have no topic of their own until they are classified
+        if int(self.topic_id) != DEFAULT_TOPIC_ID:
+            save_topic_summary(int(self.topic_id), summary)
+        self.update_context_usage()
+
+    async def action_save(self) -> None:
+        """Queue the new chats for a topic and start a new chat straight away."""
+        if self.topic_id == 1:
+            job = enqueue_classification(self.LLM_MESSAGES, self.model_choice_name)
+            if job is not None:
+                logging.debug("saving chats")
+                self.notify(
+                    "Chats saved. Topics will be updated in the background.",
+                    severity="information",
+                )
+                self.chat_object_list = []
+                self.start_classification()
 
     async def action_quit(self) -> None:
-        """Save a summary of the chats and quit."""
+        """Queue any new chats for a topic and quit, the queue resumes on next launch."""
 
         await self.action_save()
+        await close_http_client()
         self.app.exit()
 
     async def on_load(self) -> None:
         """First time Database and inits setup here"""
-        if not os.path.exists(set_database_path()):
-            create_db()
+        first_run = not os.path.exists(set_database_path())
+        # safe to run on existing databases, adds any tables they are missing
+        create_db()
+        migrate_db()
+        create_chat_search()
+        if first_run:
             await populate_llm_models()
             initialize_db_defaults()
 
@@ -564,3 +1089,10 @@ class MyLlamaTUI(App):
         self.context_choice_id = context.id
         self.context_choice_text = str(context.text) + DO_NOT_MAKEUP
         self.update_tree()
+        # the saved model's context window, for trimming and the subtitle
+        self.update_context_usage()
+        self.start_model_metadata()
+        # catch up on chats saved before an embedding model was pulled or changed
+        self.start_chat_embedding()
+        # finish classification jobs left when the app last quit
+        self.start_classification()
@@ -3,23 +3,36 @@ import logging
 import os
 import re
 import statistics
+import time
+
+import httpx
 
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import AsyncIterator, List, Dict, Tuple, Optional
+
+from peewee import JOIN, Tuple as RowValue
+from playhouse.shortcuts import model_to_dict
 
 from src.myllamatui.db_models import (
     Chat,
+    ChatStats,
     Category,
     Topic,
     Context,
     CLI_Settings,
     LLM_MODEL,
+    TopicSummary,
 )
+from src.myllamatui.context_window import trim_to_budget
+from src.myllamatui.embeddings import LABEL_MATCH_THRESHOLD, match_label_by_embedding
 from src.myllamatui.topics_contexts_categories import (
     check_for_topic_and_category_match,
+    context_with_summary,
     create_context_dict,
     generate_current_topic_summary,
     generate_category_summary,
+    lexical_index,
+    update_lexical_index,
 )
 from src.myllamatui.llm_calls import (
     generate_endpoint,
@@ -27,34 +40,90 @@ from src.myllamatui.llm_calls import (
     generate_input_dict,
     post_to_llm,
     parse_response,
+    parse_stream_chunk,
+    parse_stream_stats,
+    stream_to_llm,
 )
 
+# chats loaded per page when a topic is opened or scrolled back through
+CHAT_PAGE_SIZE = 50
+# most recent chats used to rebuild the messages when a topic is resumed
+RESUME_TURNS = 10
+# latest chats whose text is used to pick the topics offered in the summary prompt
+SHORTLIST_TURNS = 5
+
 
 def save_chat(
-    question: str, answer: str, context_id: str, topic_id: str, model_id: str
+    question: str,
+    answer: str,
+    context_id: str,
+    topic_id: str,
+    model_id: str,
+    stats: Optional[Dict] = None,
 ) -> Chat:
-    """Save the current chat to the DB"""
-    chat_id = Chat.create(
-        question=question,
-        answer=answer,
-        context_id=context_id,
-        topic_id=topic_id,
-        llm_model_id=model_id,
-    )
+    """Save the current chat to the DB and count it against the model.
+
+    stats, as filled in by stream_chat_with_llm_UI, are saved as its ChatStats.
+    """
+    with Chat._meta.database.atomic():
+        chat_id = Chat.create(
+            question=question,
+            answer=answer,
+            context_id=context_id,
+            topic_id=topic_id,
+            llm_model_id=model_id,
+        )
+        if stats:
+            ChatStats.create(
+                chat_id=chat_id,
+                **{
+                    key: value
+                    for key, value in stats.items()
+                    if key in ChatStats._meta.fields
+                },
+            )
+        LLM_MODEL.update(usage_count=LLM_MODEL.usage_count + 1).where(
+            LLM_MODEL.id == model_id
+        ).execute()
     logging.debug("record saved as {0}".format(chat_id))
     return chat_id
 
 
+def apply_system_prompt(MESSAGES: List, context_text: str) -> List:
+    """Make context_text the only system message, at the start of MESSAGES.
+
+    Ollama reuses its cache for the longest prefix a request shares with the
+    previous one, so the history is only ever added to after this message.
+    """
+
+    MESSAGES[:] = [create_context_dict(context_text)] + [
+        message for message in MESSAGES if message.get("role") != "system"
+    ]
+    return MESSAGES
+
+
+def evaluation_messages(MESSAGES: List, context_text: str) -> List:
+    """A copy of the conversation under the evaluation context, so the evaluation
+    turns never enter the main history"""
+
+    return apply_system_prompt(list(MESSAGES), context_text)
+
+
 async def chat_with_llm_UI(
-    url: str, question: str, context_text: str, MESSAGES: List, model_name: str
+    url: str,
+    question: str,
+    context_text: str,
+    MESSAGES: List,
+    model_name: str,
+    token_budget: Optional[int] = None,
+    stats: Optional[Dict] = None,
 ) -> Tuple[str, List]:
     """take question, context, messages, modelname and file parse for api call and return answer and messages"""
 
-    context_dict = create_context_dict(context_text)
-    user_input_dict = generate_input_dict(question)
-
-    MESSAGES.append(context_dict)
-    MESSAGES.append(user_input_dict)
+    apply_system_prompt(MESSAGES, context_text)
+    MESSAGES.append(generate_input_dict(question))
+    if token_budget is not None:
+        trim_to_budget(MESSAGES, token_budget)
 
     api_endpoint = generate_endpoint(url, "chat")
     data = generate_data_for_chat(MESSAGES, model_name)
@@ -63,6 +132,8 @@ async def chat_with_llm_UI(
     response_json = response.json()
 
     answer_key, answer = parse_response(response_json)
+    if stats is not None:
+        stats.update(parse_stream_stats(response_json))
 
     # append answer to messages
     MESSAGES.append(response_json[answer_key])
@@ -71,6 +142,142 @@ async def chat_with_llm_UI(
     return answer, MESSAGES
 
 
+def select_chats_with_related():
+    """Chat query that loads each chat's model, context, topic and stats in the
+    same query. The stats are chat.chat_stats, None for chats without any."""
+
+    return (
+        Chat.select(Chat, LLM_MODEL, Context, Topic, ChatStats)
+        .join_from(Chat, LLM_MODEL, JOIN.LEFT_OUTER)
+        .join_from(Chat, Context, JOIN.LEFT_OUTER)
+        .join_from(Chat, Topic, JOIN.LEFT_OUTER)
+        .join_from(Chat, ChatStats, JOIN.LEFT_OUTER, attr="chat_stats")
+    )
+
+
+def stats_label(stats: Optional[Dict]) -> str:
+    """Speed and size of an answer, shown beside its date"""
+
+    if not stats:
+        return ""
+    parts = []
+    if stats.get("first_token_seconds") is not None:
+        parts.append(f"first token {stats['first_token_seconds']:.1f}s")
+    if stats.get("tokens_per_second"):
+        parts.append(f"{stats['tokens_per_second']:.1f} tokens/s")
+    if stats.get("completion_tokens"):
+        parts.append(
+            f"{stats.get('prompt_tokens') or 0} prompt / "
+            f"{stats['completion_tokens']} answer tokens"
+        )
+    if stats.get("total_seconds"):
+        parts.append(f"{stats['total_seconds']:.1f}s total")
+    return ", ".join(parts)
+
+
+def chat_stats_label(chat: Chat) -> str:
+    """stats_label for a chat loaded by select_chats_with_related"""
+
+    chat_stats = getattr(chat, "chat_stats", None)
+    if chat_stats is None:
+        return ""
+    return stats_label(model_to_dict(chat_stats, recurse=False))
+
+
+def load_chats_by_id(chat_ids: List[int]) -> List[Chat]:
+    """Chats with their related rows, in date order"""
+
+    return list(
+        select_chats_with_related()
+        .where(Chat.id.in_(chat_ids))
+        .order_by(Chat.created_at, Chat.id)
+    )
+
+
+def load_chat_page(
+    topic_id: int,
+    before: Optional[Tuple[datetime, int]] = None,
+    limit: int = CHAT_PAGE_SIZE,
+) -> List[Chat]:
+    """A page of a topic's chats in date order, ending just before the
+    (created_at, id) cursor, or with the latest chat if there is no cursor."""
+
+    query = select_chats_with_related().where(Chat.topic_id == topic_id)
+    if before is not None:
+        position = RowValue(Chat.created_at, Chat.id)
+        cursor = RowValue(before[0], before[1])
+        query = query.where(position < cursor)
+    page = list(query.order_by(Chat.created_at.desc(), Chat.id.desc()).limit(limit))
+    page.reverse()
+    return page
+
+
+def load_chats_since(
+    topic_id: int, since: Tuple[datetime, int], limit: int = CHAT_PAGE_SIZE
+) -> List[Chat]:
+    """A topic's latest chats in date order, going back far enough to include
+    the (created_at, id) position, and at least a page of them."""
+
+    position = RowValue(Chat.created_at, Chat.id)
+    newer = (
+        Chat.select()
+        .where((Chat.topic_id == topic_id) & (position >= RowValue(*since)))
+        .count()
+    )
+    return load_chat_page(topic_id, limit=max(limit, newer))
+
+
+def chat_page_cursor(page: List[Chat], limit: int = CHAT_PAGE_SIZE) -> Optional[Tuple]:
+    """Cursor for the page before this one, None once the first chat is loaded."""
+
+    if len(page) < limit:
+        return None
+    return (page[0].created_at, page[0].id)
+
+
+async def stream_chat_with_llm_UI(
+    url: str,
+    question: str,
+    context_text: str,
+    MESSAGES: List,
+    model_name: str,
+    token_budget: Optional[int] = None,
+    stats: Optional[Dict] = None,
+) -> AsyncIterator[str]:
+    """Stream the answer from the llm, yielding the answer text so far after each chunk.
+
+    The completed answer is appended to MESSAGES once the stream is done. The
+    oldest turns are dropped first if MESSAGES is over token_budget. A stats
+    dict is filled with the time to the first token and the final chunk's
+    token counts and speed.
+    """
+
+    apply_system_prompt(MESSAGES, context_text)
+    MESSAGES.append(generate_input_dict(question))
+    if token_budget is not None:
+        trim_to_budget(MESSAGES, token_budget)
+
+    api_endpoint = generate_endpoint(url, "chat")
+    data = generate_data_for_chat(MESSAGES, model_name, stream=True)
+
+    answer = ""
+    started = time.monotonic()
+    async for chunk in stream_to_llm(api_endpoint, data):
+        content, done = parse_stream_chunk(chunk)
+        if stats is not None and content and "first_token_seconds" not in stats:
+            stats["first_token_seconds"] = time.monotonic() - started
+        answer += content
+        yield answer
+        if done:
+            if stats is not None:
+                stats.update(parse_stream_stats(chunk))
+            break
+
+    # append answer to messages
+    MESSAGES.append({"role": "assistant", "content": answer})
+    logging.debug("Answer: {0}".format(answer))
+
+
 async def create_content_summary(url: str, MESSAGES: list, model_name: str) -> str:
     # setup vars
     api_endpoint = generate_endpoint(url, "chat")
@@ -81,8 +288,29 @@ async def create_content_summary(url: str, MESSAGES: list, model_name: str) -> s
     return topic_summary
 
 
+def conversation_text(MESSAGES: List, turns: int = SHORTLIST_TURNS) -> str:
+    """Text of the latest questions and answers, used to shortlist topics"""
+
+    # a turn starts at its question, count them back from the end
+    start = 0
+    questions = 0
+    for position in range(len(MESSAGES) - 1, -1, -1):
+        message = MESSAGES[position]
+        if isinstance(message, dict) and message.get("role") == "user":
+            questions += 1
+            if questions == turns:
+                start = position
+                break
+
+    return " ".join(
+        message.get("content", "") if isinstance(message, dict) else str(message)
+        for message in MESSAGES[start:]
+        if not isinstance(message, dict) or message.get("role") != "system"
+    )
+
+
 async def generate_chat_topic(url: str, MESSAGES: List, model_name: str) -> str:
-    summary_context = generate_current_topic_summary()
+    summary_context = generate_current_topic_summary(conversation_text(MESSAGES))
     MESSAGES.append(summary_context)
 
     # generate a topic summary
@@ -103,43 +331,90 @@ async def generate_topic_catgory(url: str, topic_summary: str, model_name: str)
         return category_summary
 
 
+async def match_summary_to_items(
+    url: str,
+    summary: str,
+    model,
+    embedding_model: Optional[str] = None,
+    threshold: float = LABEL_MATCH_THRESHOLD,
+) -> Optional[int]:
+    """Match a summary to a Topic or Category by meaning if there is an embedding
+    model, falling back to word overlap without one or if the call fails."""
+
+    if embedding_model is not None:
+        try:
+            return await match_label_by_embedding(
+                url, embedding_model, summary, model.select(), threshold
+            )
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"Embedding match failed, using word overlap: {e!r}")
+    return check_for_topic_and_category_match(summary, lexical_index(model))
+
+
 async def create_and_apply_chat_topic_ui(
-    url: str, MESSAGES: List, model_name: str
+    url: str,
+    MESSAGES: List,
+    model_name: str,
+    embedding_model: Optional[str] = None,
+    match_threshold: float = LABEL_MATCH_THRESHOLD,
 ) -> None:
     """Generate and update topic for the current chats"""
 
     # create summary
     topic_summary = await generate_chat_topic(url, MESSAGES, model_name)
     # check against exisitng topics
-    topic_id = check_for_topic_and_category_match(topic_summary, Topic.select())
+    topic_id = await match_summary_to_items(
+        url, topic_summary, Topic, embedding_model, match_threshold
+    )
 
 
     if topic_id is None:
         # You have created a new topic, now evaluate the category for this new topic anc create if needed
         
         # fist check topic summary to see if it obviously fits into a category
-        category_id_num = check_for_topic_and_category_match(topic_summary, Category.select())
+        category_id_num = await match_summary_to_items(
+            url, topic_summary, Category, embedding_model, match_threshold
+        )
         
         # if not generate a category
         if category_id_num is None:        
             category_summary = await generate_topic_catgory(url, topic_summary, model_name)    
             
             # check for a match again for good measure
-            category_id_num = check_for_topic_and_category_match(
-                category_summary, Category.select()
+            category_id_num = await match_summary_to_items(
+                url,
+                category_summary,
+                Category,
+                embedding_model,
+                match_threshold,
             )
             # if no match, create new category
             if category_id_num is None:
-                category_id_num = Category.create(text=category_summary)
+                # get_or_create, another classification running alongside this
+                # one may have just made the same category
+                category_id_num, created = Category.get_or_create(
+                    text=category_summary
+                )
+                if created:
+                    update_lexical_index(category_id_num)
         
         # finally create new topic with new or exiting category id
-        topic_id = Topic.create(text=topic_summary, category_id=category_id_num)
+        topic_id, created = Topic.get_or_create(
+            text=topic_summary, defaults={"category_id": category_id_num}
+        )
+        if created:
+            update_lexical_index(topic_id)
 
     return topic_id
 
 
-def resume_previous_chats_ui(selected_chats: List) -> List:
-    """Load Q and A from the DB onto the screen and setup abillity to continue the conversation."""
+def resume_previous_chats_ui(
+    selected_chats: List, with_summary: bool = True
+) -> List:
+    """Load Q and A from the DB onto the screen and setup abillity to continue the conversation.
+
+    with_summary sends the topic's summary in place of the chats it covers.
+    """
 
     topic_id_list = []
     context_id_list = []
@@ -147,17 +422,31 @@ def resume_previous_chats_ui(selected_chats: List) -> List:
     context_id = 1
     topic_id = 1
     for chat in selected_chats:
-        topic_id_list.append(chat.topic_id)
-        context_id_list.append(chat.context_id)
-        MESSAGES.append(generate_input_dict(chat.question))
-        MESSAGES.append({"role": "assistant", "content": chat.answer})
+        # raw ids, so joined or not no related rows are fetched per chat
+        topic_id_list.append(chat.topic_id_id)
+        context_id_list.append(chat.context_id_id)
 
     if len(context_id_list) > 0:
         context_id = statistics.mode(context_id_list)
         topic_id = statistics.mode(topic_id_list)
 
+        topic_summary = None
+        if with_summary:
+            topic_summary = TopicSummary.get_or_none(TopicSummary.topic_id == topic_id)
+        summary, last_summarized_id = "", 0
+        if topic_summary is not None:
+            summary = topic_summary.summary
+            last_summarized_id = topic_summary.last_chat_id
+        for chat in selected_chats:
+            if chat.id <= last_summarized_id:
+                continue
+            MESSAGES.append(generate_input_dict(chat.question))
+            MESSAGES.append({"role": "assistant", "content": chat.answer})
+
         context_obj = Context.get_by_id(context_id)
-        context_dict = create_context_dict(context_obj.text)
+        context_dict = create_context_dict(
+            context_with_summary(context_obj.text, summary)
+        )
 
         MESSAGES = [context_dict] + MESSAGES
     return MESSAGES, str(topic_id)
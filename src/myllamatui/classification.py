@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import time
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+from src.myllamatui.chats import (
+    RESUME_TURNS,
+    create_and_apply_chat_topic_ui,
+    resume_previous_chats_ui,
+)
+from src.myllamatui.db_models import Chat, ClassificationJob, Topic
+
+# default topic new chats are saved under until they are classified
+DEFAULT_TOPIC_ID = 1
+# a job that keeps failing is given up on after this many tries
+MAX_JOB_ATTEMPTS = 3
+# chats further apart than this are treated as separate conversations
+SESSION_GAP = timedelta(minutes=30)
+# longest run of chats summarized together, keeps the prompt small
+RECLASSIFY_GROUP_SIZE = RESUME_TURNS
+# groups being summarized by the LLM at once
+RECLASSIFY_CONCURRENCY = 4
+# classified chats written per transaction
+RECLASSIFY_COMMIT_SIZE = 100
+
+
+def queued_chat_ids() -> set:
+    """Ids of chats already in a job that hasn't finished"""
+
+    chat_ids = set()
+    for job in ClassificationJob.select(ClassificationJob.chat_ids).where(
+        ClassificationJob.status.in_(["pending", "running"])
+    ):
+        chat_ids.update(json.loads(job.chat_ids))
+    return chat_ids
+
+
+def enqueue_classification(
+    messages: List[Dict], model_name: str
+) -> Optional[ClassificationJob]:
+    """Queue the default topic chats that aren't queued yet, with the messages
+    to summarize. Returns None if there is nothing to classify."""
+
+    already_queued = queued_chat_ids()
+    chat_ids = [
+        chat_id
+        for (chat_id,) in Chat.select(Chat.id)
+        .where(Chat.topic_id == DEFAULT_TOPIC_ID)
+        .tuples()
+        if chat_id not in already_queued
+    ]
+    if not chat_ids or not messages:
+        return None
+
+    job = ClassificationJob.create(
+        chat_ids=json.dumps(chat_ids),
+        messages=json.dumps(messages),
+        model=model_name,
+    )
+    logging.debug(f"Queued classification job {job.id} for chats {chat_ids}")
+    return job
+
+
+def next_classification_job() -> Optional[ClassificationJob]:
+    """Oldest unfinished job. A running one was interrupted by the app quitting."""
+
+    return (
+        ClassificationJob.select()
+        .where(ClassificationJob.status.in_(["pending", "running"]))
+        .order_by(ClassificationJob.id)
+        .first()
+    )
+
+
+def finish_job(job: ClassificationJob, status: str, **fields) -> None:
+    ClassificationJob.update(
+        status=status, updated_at=datetime.now(), **fields
+    ).where(ClassificationJob.id == job.id).execute()
+
+
+async def run_classification_job(
+    url: str, job: ClassificationJob, embedding_model: Optional[str] = None
+) -> Optional[int]:
+    """Classify a job's chats. Returns the category id of the topic they were
+    given, None if the job failed."""
+
+    finish_job(job, "running", attempts=job.attempts + 1)
+    try:
+        topic = await create_and_apply_chat_topic_ui(
+            url,
+            json.loads(job.messages),
+            job.model,
+            embedding_model=embedding_model,
+        )
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        logging.error(f"Classification job {job.id} failed: {e!r}")
+        status = "failed" if job.attempts + 1 >= MAX_JOB_ATTEMPTS else "pending"
+        finish_job(job, status, error=repr(e))
+        return None
+
+    topic = Topic.get_by_id(getattr(topic, "id", topic))
+    with Chat._meta.database.atomic():
+        # chats moved to a topic by hand in the meantime are left alone
+        Chat.update(topic_id=topic.id).where(
+            Chat.id.in_(json.loads(job.chat_ids))
+            & (Chat.topic_id == DEFAULT_TOPIC_ID)
+        ).execute()
+        finish_job(job, "done", topic_id=topic.id)
+    return topic.category_id_id
+
+
+def group_default_topic_chats(
+    gap: timedelta = SESSION_GAP, group_size: int = RECLASSIFY_GROUP_SIZE
+) -> List[List[Chat]]:
+    """Default topic chats that aren't queued, split into conversations.
+
+    A new group starts after a gap in time, on a change of context or once a
+    group is group_size chats long.
+    """
+
+    already_queued = queued_chat_ids()
+    groups = []
+    previous = None
+    for chat in (
+        Chat.select(
+            Chat.id, Chat.question, Chat.answer, Chat.context_id, Chat.created_at
+        )
+        .where(Chat.topic_id == DEFAULT_TOPIC_ID)
+        .order_by(Chat.created_at, Chat.id)
+    ):
+        if chat.id in already_queued:
+            continue
+        if (
+            previous is None
+            or chat.created_at - previous.created_at > gap
+            or chat.context_id_id != previous.context_id_id
+            or len(groups[-1]) >= group_size
+        ):
+            groups.append([])
+        groups[-1].append(chat)
+        previous = chat
+    return groups
+
+
+def apply_topics(topic_chat_ids: Dict[int, List[int]]) -> None:
+    """Move chats to their new topics in one transaction, skipping any moved by
+    hand since they were read"""
+
+    with Chat._meta.database.atomic():
+        for topic_id, chat_ids in topic_chat_ids.items():
+            Chat.update(topic_id=topic_id).where(
+                Chat.id.in_(chat_ids) & (Chat.topic_id == DEFAULT_TOPIC_ID)
+            ).execute()
+
+
+async def reclassify_default_topic_chats(
+    url: str,
+    model_name: str,
+    embedding_model: Optional[str] = None,
+    concurrency: int = RECLASSIFY_CONCURRENCY,
+    commit_size: int = RECLASSIFY_COMMIT_SIZE,
+) -> Dict[str, float]:
+    """Classify every chat left under the default topic, a group at a time with
+    at most concurrency LLM calls running. Returns counts and chats per second."""
+
+    start = time.perf_counter()
+    groups = group_default_topic_chats()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def classify(group: List[Chat]):
+        # default topic chats never have a summary
+        messages, _ = resume_previous_chats_ui(group, with_summary=False)
+        async with semaphore:
+            topic = await create_and_apply_chat_topic_ui(
+                url, messages, model_name, embedding_model=embedding_model
+            )
+        return group, getattr(topic, "id", topic)
+
+    classified = failed = 0
+    pending: Dict[int, List[int]] = {}
+    pending_count = 0
+    for task in asyncio.as_completed([classify(group) for group in groups]):
+        try:
+            group, topic_id = await task
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"Unable to classify a group of chats: {e!r}")
+            failed += 1
+            continue
+        pending.setdefault(topic_id, []).extend(chat.id for chat in group)
+        pending_count += len(group)
+        classified += len(group)
+        if pending_count >= commit_size:
+            apply_topics(pending)
+            pending, pending_count = {}, 0
+    if pending:
+        apply_topics(pending)
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "groups": len(groups),
+        "failed_groups": failed,
+        "chats": classified,
+        "seconds": seconds,
+        "chats_per_second": classified / seconds if seconds else 0.0,
+    }
+    logging.info(
+        f"Reclassified {classified} chats in {len(groups)} groups, "
+        f"{stats['chats_per_second']:.1f} chats/s"
+    )
+    return stats
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+from src.myllamatui.chats import stats_label, stream_chat_with_llm_UI
+from src.myllamatui.context_window import context_budget
+
+
+async def compare_models(
+    url: str,
+    question: str,
+    context_text: str,
+    conversations: Dict[str, List],
+    on_update: Callable[[str, str], None],
+) -> Dict[str, Tuple[str, Dict]]:
+    """Stream the same question to every model at once.
+
+    conversations holds each model's own messages, the answers are added to
+    them. on_update is called with the model name and answer so far after each
+    chunk. Returns {model name: (answer, stats)}, stats has an error for a
+    model whose request failed.
+    """
+
+    async def ask(model_name: str) -> Tuple[str, str, Dict]:
+        messages = conversations[model_name]
+        stats: Dict = {}
+        answer = ""
+        try:
+            async for answer in stream_chat_with_llm_UI(
+                url,
+                question,
+                context_text,
+                messages,
+                model_name,
+                token_budget=context_budget(model_name),
+                stats=stats,
+            ):
+                on_update(model_name, answer)
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"{model_name} failed to answer: {e!r}")
+            # status errors add a line pointing at the HTTP docs
+            stats["error"] = str(e).split("\n")[0] or repr(e)
+            # the question went out without an answer
+            if messages and messages[-1].get("role") == "user":
+                messages.pop()
+        return model_name, answer, stats
+
+    results = await asyncio.gather(*(ask(model_name) for model_name in conversations))
+    return {model_name: (answer, stats) for model_name, answer, stats in results}
+
+
+def speed_label(stats: Dict) -> str:
+    """Time to first token and generation speed, for display"""
+
+    if "error" in stats:
+        return f"failed: {stats['error']}"
+    return stats_label(stats)
@@ -0,0 +1,81 @@
+import logging
+
+from typing import Dict, List
+
+from src.myllamatui.llm_models import cached_model_metadata
+
+# context Ollama runs a model with when its modelfile doesn't set num_ctx
+DEFAULT_NUM_CTX = 2048
+# share of the window the conversation may use, the rest is left for the answer
+CONTEXT_BUDGET_RATIO = 0.75
+# once over budget, trim down to this share of the budget. Trimming changes the
+# start of the conversation and so Ollama's cached prefix, doing it in larger
+# steps means it happens every few turns instead of every turn.
+TRIM_TARGET_RATIO = 0.6
+# rough characters per token for English text and code
+CHARACTERS_PER_TOKEN = 4
+# role and template tokens added to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, close enough to budget with and far cheaper than a
+    tokenizer call"""
+
+    return -(-len(text) // CHARACTERS_PER_TOKEN)
+
+
+def estimate_message_tokens(MESSAGES: List[Dict]) -> int:
+    return sum(
+        estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+        for message in MESSAGES
+    )
+
+
+def model_context_window(model_name: str) -> int:
+    """Tokens the model runs with, from its cached /api/show details"""
+
+    metadata = cached_model_metadata(model_name)
+    if metadata is None:
+        return DEFAULT_NUM_CTX
+    window = metadata.num_ctx or DEFAULT_NUM_CTX
+    # a num_ctx above what the model was trained on isn't used
+    if metadata.context_length:
+        window = min(window, metadata.context_length)
+    return window
+
+
+def context_budget(model_name: str, ratio: float = CONTEXT_BUDGET_RATIO) -> int:
+    return int(model_context_window(model_name) * ratio)
+
+
+def trim_to_budget(
+    MESSAGES: List[Dict], budget: int, target_ratio: float = TRIM_TARGET_RATIO
+) -> int:
+    """Drop the oldest turns once MESSAGES is over budget, down to target_ratio
+    of it. The system prompt and latest message are always kept. Returns the
+    number of messages dropped."""
+
+    used = estimate_message_tokens(MESSAGES)
+    if used <= budget:
+        return 0
+
+    start = 1 if MESSAGES and MESSAGES[0].get("role") == "system" else 0
+    target = int(budget * target_ratio)
+    end = start
+    # whole turns only, a reply without its question confuses the model
+    while end < len(MESSAGES) - 1 and used > target:
+        used -= estimate_message_tokens([MESSAGES[end]])
+        end += 1
+        while end < len(MESSAGES) - 1 and MESSAGES[end].get("role") != "user":
+            used -= estimate_message_tokens([MESSAGES[end]])
+            end += 1
+
+    del MESSAGES[start:end]
+    logging.debug(f"Trimmed {end - start} messages, about {used} tokens remain")
+    return end - start
+
+
+def context_usage_label(MESSAGES: List[Dict], model_name: str) -> str:
+    window = model_context_window(model_name)
+    return f"Context {estimate_message_tokens(MESSAGES):,} / {window:,} tokens"
@@ -6,7 +6,17 @@ from src.myllamatui.init_files import set_database_path
 
 MYLLAMACLI_DB = set_database_path()
 
-SQLITE_DB = SqliteDatabase(MYLLAMACLI_DB)
+# applied on every connection, so existing databases pick them up too.
+# WAL lets the tree and topic reads run while a chat is being written.
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -32000,  # KiB, ~32MB
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "memory",
+}
+
+SQLITE_DB = SqliteDatabase(MYLLAMACLI_DB, pragmas=SQLITE_PRAGMAS)
 
 
 class BaseModel(Model):
@@ -38,6 +48,23 @@ class LLM_MODEL(BaseModel):
     specialization = TextField()
     modified_at = DateTimeField(default=datetime.now)
     currently_available = BooleanField()
+    # chats saved with this model, kept up to date by save_chat
+    usage_count = IntegerField(default=0)
+
+
+class ModelMetadata(BaseModel):
+    """/api/show details for a model, cached per digest"""
+
+    digest = CharField(unique=True)
+    model = CharField()
+    capabilities = TextField()
+    specialization = TextField()
+    context_length = IntegerField(null=True)
+    num_ctx = IntegerField(null=True)
+    family = CharField(null=True)
+    parameter_size = CharField(null=True)
+    quantization_level = CharField(null=True)
+    updated_at = DateTimeField(default=datetime.now)
 
 
 class Chat(BaseModel):
@@ -48,6 +75,15 @@ class Chat(BaseModel):
     llm_model_id = ForeignKeyField(LLM_MODEL, backref="llmmodels")
     created_at = DateTimeField(default=datetime.now)
 
+    class Meta:
+        indexes = (
+            # loading a topic's chats in order
+            (("topic_id", "created_at", "id"), False),
+            # usage per model
+            (("llm_model_id", "created_at"), False),
+            (("created_at",), False),
+        )
+
     def update_chat_topic_from_summary(self, topic_id_int: int) -> int:
         """Update topic id for a chat"""
         self.topic_id = topic_id_int
@@ -55,6 +91,58 @@ class Chat(BaseModel):
         return self.topic_id
 
 
+class ChatEmbedding(BaseModel):
+    """Unit length float32 embedding of a chat's question and answer"""
+
+    chat_id = ForeignKeyField(Chat, backref="embeddings", unique=True)
+    # the embedding model that made the vector, chats are re-embedded when it changes
+    model = CharField(index=True)
+    dimensions = IntegerField()
+    vector = BlobField()
+    created_at = DateTimeField(default=datetime.now)
+
+
+class ChatStats(BaseModel):
+    """Ollama's timings and token counts for the answer of a chat"""
+
+    chat_id = ForeignKeyField(Chat, backref="stats", unique=True)
+    prompt_tokens = IntegerField(null=True)
+    completion_tokens = IntegerField(null=True)
+    tokens_per_second = FloatField(null=True)
+    # seconds from sending the question to the first streamed token
+    first_token_seconds = FloatField(null=True)
+    load_seconds = FloatField(null=True)
+    prompt_seconds = FloatField(null=True)
+    eval_seconds = FloatField(null=True)
+    total_seconds = FloatField(null=True)
+
+
+class ClassificationJob(BaseModel):
+    """Chats waiting to be given a topic, worked through in the background"""
+
+    # json list of Chat ids and the json messages to summarize
+    chat_ids = TextField()
+    messages = TextField()
+    model = CharField()
+    # pending, running, done or failed. running jobs found at launch were interrupted.
+    status = CharField(default="pending", index=True)
+    attempts = IntegerField(default=0)
+    error = TextField(null=True)
+    topic_id = ForeignKeyField(Topic, backref="classification_jobs", null=True)
+    created_at = DateTimeField(default=datetime.now)
+    updated_at = DateTimeField(default=datetime.now)
+
+
+class TopicSummary(BaseModel):
+    """Running summary of a topic's older chats, sent in place of them"""
+
+    topic_id = ForeignKeyField(Topic, backref="summaries", unique=True)
+    summary = TextField()
+    # the newest chat the summary covers, later chats are sent in full
+    last_chat_id = IntegerField()
+    updated_at = DateTimeField(default=datetime.now)
+
+
 class CLI_Settings(BaseModel):
     url = CharField()
     llm_model_id = ForeignKeyField(LLM_MODEL, backref="llmmodels")
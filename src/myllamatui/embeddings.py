@@ -0,0 +1,253 @@
+import logging
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from peewee import JOIN
+
+from src.myllamatui.db_models import Chat, ChatEmbedding, LLM_MODEL, Topic
+from src.myllamatui.llm_calls import (
+    generate_data_for_embed,
+    generate_endpoint,
+    post_to_llm,
+)
+
+
+# chats sent to /api/embed per call
+EMBED_BATCH_SIZE = 32
+# characters of a chat that are embedded, most embedding models only read ~2k tokens
+EMBED_TEXT_LIMIT = 6000
+SIMILAR_CHAT_LIMIT = 20
+# cosine similarity a summary needs to reuse an existing topic or category.
+# Short labels from the same subject score ~0.7+ with common embedding models.
+LABEL_MATCH_THRESHOLD = 0.7
+
+
+def chat_embedding_text(question: str, answer: str) -> str:
+    return f"{question}\n\n{answer}"[:EMBED_TEXT_LIMIT]
+
+
+def select_embedding_model() -> Optional[str]:
+    """The first available embedding model, None if none have been pulled"""
+
+    model = (
+        LLM_MODEL.select(LLM_MODEL.model)
+        .where(
+            (LLM_MODEL.specialization == "embedding")
+            & (LLM_MODEL.currently_available == True)
+        )
+        .order_by(LLM_MODEL.id)
+        .first()
+    )
+    return model.model if model is not None else None
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so a dot product is the cosine similarity"""
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+async def embed_texts(url: str, model_name: str, texts: List[str]) -> np.ndarray:
+    """Unit length float32 embeddings for texts, one row per text"""
+
+    apiendpoint = generate_endpoint(url, "embed")
+    data = generate_data_for_embed(texts, model_name)
+    response = await post_to_llm(apiendpoint, data)
+    response.raise_for_status()
+    vectors = np.asarray(response.json()["embeddings"], dtype=np.float32)
+    return normalize_rows(vectors)
+
+
+def chats_to_embed(model_name: str, limit: int = EMBED_BATCH_SIZE) -> List[Chat]:
+    """Chats with no embedding, or one from a different embedding model"""
+
+    return list(
+        Chat.select(Chat.id, Chat.question, Chat.answer)
+        .join(ChatEmbedding, JOIN.LEFT_OUTER)
+        .where(ChatEmbedding.id.is_null() | (ChatEmbedding.model != model_name))
+        .order_by(Chat.id)
+        .limit(limit)
+    )
+
+
+def save_embeddings(chat_ids: List[int], model_name: str, vectors: np.ndarray) -> None:
+    rows = [
+        {
+            "chat_id": chat_id,
+            "model": model_name,
+            "dimensions": vector.shape[0],
+            "vector": vector.astype(np.float32).tobytes(),
+        }
+        for chat_id, vector in zip(chat_ids, vectors)
+    ]
+    with ChatEmbedding._meta.database.atomic():
+        # replaces the row made by a previous embedding model
+        ChatEmbedding.insert_many(rows).on_conflict_replace().execute()
+
+
+async def index_chats(
+    url: str, model_name: str, batch_size: int = EMBED_BATCH_SIZE
+) -> int:
+    """Embed every chat that needs it, in batches. Returns the number embedded."""
+
+    indexed = 0
+    while True:
+        chats = chats_to_embed(model_name, batch_size)
+        if not chats:
+            break
+        vectors = await embed_texts(
+            url,
+            model_name,
+            [chat_embedding_text(chat.question, chat.answer) for chat in chats],
+        )
+        save_embeddings([chat.id for chat in chats], model_name, vectors)
+        indexed += len(chats)
+        logging.debug(f"Embedded {indexed} chats with {model_name}")
+    return indexed
+
+
+class ChatVectorIndex:
+    """In memory matrix of one embedding model's chat vectors.
+
+    Loaded from ChatEmbedding once, then refresh() only reads rows added since.
+    """
+
+    def __init__(self, model_name: str) -> None:
+        self.model_name = model_name
+        self.chat_ids = np.empty(0, dtype=np.int64)
+        self.matrix: Optional[np.ndarray] = None
+        self.last_row_id = 0
+
+    def refresh(self) -> None:
+        rows = list(
+            ChatEmbedding.select(
+                ChatEmbedding.id, ChatEmbedding.chat_id, ChatEmbedding.vector
+            )
+            .where(
+                (ChatEmbedding.model == self.model_name)
+                & (ChatEmbedding.id > self.last_row_id)
+            )
+            .order_by(ChatEmbedding.id)
+            .tuples()
+        )
+        if not rows:
+            return
+
+        new_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        new_vectors = np.vstack(
+            [np.frombuffer(row[2], dtype=np.float32) for row in rows]
+        )
+        if self.matrix is None:
+            self.chat_ids, self.matrix = new_ids, new_vectors
+        else:
+            # a replaced row is added again with a new row id, drop the old copy
+            keep = ~np.isin(self.chat_ids, new_ids)
+            self.chat_ids = np.concatenate([self.chat_ids[keep], new_ids])
+            self.matrix = np.vstack([self.matrix[keep], new_vectors])
+        self.last_row_id = rows[-1][0]
+
+    def nearest(
+        self, query_vector: np.ndarray, limit: int = SIMILAR_CHAT_LIMIT
+    ) -> List[Tuple[int, float]]:
+        """(chat id, cosine similarity) of the closest chats, closest first"""
+
+        self.refresh()
+        if self.matrix is None:
+            return []
+        scores = self.matrix @ query_vector
+        limit = min(limit, scores.shape[0])
+        # partial sort, only the top rows are ordered
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.chat_ids[row]), float(scores[row])) for row in top]
+
+
+# one index per embedding model, kept for the life of the app
+VECTOR_INDEXES: Dict[str, ChatVectorIndex] = {}
+
+
+def vector_index(model_name: str) -> ChatVectorIndex:
+    if model_name not in VECTOR_INDEXES:
+        VECTOR_INDEXES[model_name] = ChatVectorIndex(model_name)
+    return VECTOR_INDEXES[model_name]
+
+
+async def find_similar_chats(
+    url: str, text: str, model_name: str, limit: int = SIMILAR_CHAT_LIMIT
+) -> List[Tuple[int, float]]:
+    """Chats closest in meaning to text"""
+
+    query_vector = (await embed_texts(url, model_name, [text]))[0]
+    return vector_index(model_name).nearest(query_vector, limit)
+
+
+async def semantic_search_chats(
+    url: str, text: str, model_name: str, limit: int = SIMILAR_CHAT_LIMIT
+) -> List[Dict[str, str]]:
+    """find_similar_chats as search results, in the same shape as search_chats"""
+
+    similar = await find_similar_chats(url, text, model_name, limit)
+    chats = {
+        chat.id: chat
+        for chat in Chat.select(Chat, Topic)
+        .join(Topic, JOIN.LEFT_OUTER)
+        .where(Chat.id.in_([chat_id for chat_id, _ in similar]))
+    }
+    results = []
+    for chat_id, score in similar:
+        chat = chats.get(chat_id)
+        if chat is None:
+            continue
+        topic_text = chat.topic_id.text if chat.topic_id is not None else ""
+        results.append(
+            {
+                "chat_id": chat_id,
+                "topic_id": chat.topic_id_id,
+                "topic": f"{topic_text} (similarity {score:.2f})",
+                "created_at": str(chat.created_at).split()[0],
+                "question": chat.question,
+                "answer": chat.answer,
+            }
+        )
+    return results
+
+
+# {(embedding model, table): {row id: (text, vector)}}, only new or edited labels
+# are sent to the server
+LABEL_EMBEDDINGS: Dict[Tuple[str, str], Dict[int, Tuple[str, np.ndarray]]] = {}
+
+
+async def match_label_by_embedding(
+    url: str,
+    model_name: str,
+    text: str,
+    items: list,
+    threshold: float = LABEL_MATCH_THRESHOLD,
+) -> Optional[int]:
+    """Id of the topic or category whose text is closest in meaning to text,
+    None if nothing reaches the threshold"""
+
+    items = list(items)
+    if not items:
+        return None
+
+    cache = LABEL_EMBEDDINGS.setdefault((model_name, type(items[0]).__name__), {})
+    missing = [item for item in items if cache.get(item.id, ("",))[0] != item.text]
+
+    # the text and any uncached labels go in one call
+    vectors = await embed_texts(
+        url, model_name, [text] + [item.text for item in missing]
+    )
+    for item, vector in zip(missing, vectors[1:]):
+        cache[item.id] = (item.text, vector)
+
+    scores = np.vstack([cache[item.id][1] for item in items]) @ vectors[0]
+    best = int(np.argmax(scores))
+    logging.debug(f"Closest label {items[best].text!r} scored {scores[best]:.2f}")
+    if scores[best] < threshold:
+        return None
+    return items[best].id
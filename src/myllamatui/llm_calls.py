@@ -1,8 +1,41 @@
 import asyncio
+import json
 import logging
 import httpx
 
-from typing import Dict, Any
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+# one pooled client is shared by every Ollama call so connections are kept alive
+# between chat turns, summaries and model calls. The app closes it on quit.
+HTTP_LIMITS = httpx.Limits(
+    max_connections=10, max_keepalive_connections=5, keepalive_expiry=120.0
+)
+HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+class OllamaError(httpx.HTTPError):
+    """An error Ollama sent back in place of an answer"""
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use"""
+    global HTTP_CLIENT
+
+    if HTTP_CLIENT is None or HTTP_CLIENT.is_closed:
+        HTTP_CLIENT = httpx.AsyncClient(
+            limits=HTTP_LIMITS, timeout=httpx.Timeout(300.0, connect=10.0)
+        )
+    return HTTP_CLIENT
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its connection pool"""
+    global HTTP_CLIENT
+
+    if HTTP_CLIENT is not None:
+        await HTTP_CLIENT.aclose()
+        HTTP_CLIENT = None
 
 
 def generate_endpoint(url: str, action: str) -> str:
@@ -15,15 +48,18 @@ def generate_endpoint(url: str, action: str) -> str:
         "generate": "generate",
         "delete": "delete",
         "chat": "chat",
+        "embed": "embed",
     }
     fullurl = url + "/api/" + action_dict[action]
     return fullurl
 
 
-def generate_data_for_chat(MESSAGES: list, model: str) -> Dict[str, Any]:
+def generate_data_for_chat(
+    MESSAGES: list, model: str, stream: bool = False
+) -> Dict[str, Any]:
     """generate dict data for chat questions"""
 
-    return {"model": model, "stream": False, "messages": MESSAGES}
+    return {"model": model, "stream": stream, "messages": MESSAGES}
 
 
 # this is geared toward 1 offs not chats. Not using currently, but leaving for future
@@ -37,6 +73,12 @@ def generate_data_for_prompt(prompt_input: str, model: str) -> Dict[str, Any]:
     }
 
 
+def generate_data_for_embed(inputs: List[str], model: str) -> Dict[str, Any]:
+    """generate dict data for embedding a batch of texts"""
+
+    return {"model": model, "input": inputs}
+
+
 def generate_data_for_model_pull(model: str) -> Dict:
     """generate dict data for model calls"""
 
@@ -63,6 +105,41 @@ def parse_response(response_json: Dict) -> tuple[str, str]:
     return chat_key, answer
 
 
+def parse_stream_chunk(chunk_json: Dict) -> tuple[str, bool]:
+    """parse one streamed json chunk into its text and whether it is the last one.
+
+    Raises OllamaError for an error chunk.
+    """
+    if "error" in chunk_json.keys():
+        logging.error("Stream failed: {0}".format(chunk_json["error"]))
+        raise OllamaError(chunk_json["error"])
+    if "message" in chunk_json.keys():
+        content = chunk_json["message"].get("content", "")
+    else:
+        content = chunk_json.get("response", "")
+    return content, chunk_json.get("done", False)
+
+
+def parse_stream_stats(chunk_json: Dict) -> Dict[str, Any]:
+    """Token counts and speeds from the last streamed chunk. Ollama reports the
+    durations in nanoseconds."""
+
+    eval_count = chunk_json.get("eval_count")
+    eval_duration = chunk_json.get("eval_duration")
+    tokens_per_second = None
+    if eval_count and eval_duration:
+        tokens_per_second = eval_count / (eval_duration / 1e9)
+    return {
+        "prompt_tokens": chunk_json.get("prompt_eval_count"),
+        "completion_tokens": eval_count,
+        "tokens_per_second": tokens_per_second,
+        "load_seconds": chunk_json.get("load_duration", 0) / 1e9,
+        "prompt_seconds": chunk_json.get("prompt_eval_duration", 0) / 1e9,
+        "eval_seconds": (eval_duration or 0) / 1e9,
+        "total_seconds": chunk_json.get("total_duration", 0) / 1e9,
+    }
+
+
 async def post_to_llm(API_ENDPOINT: str, data: dict) -> httpx.Response:
     """post call"""
 
@@ -71,17 +148,17 @@ async def post_to_llm(API_ENDPOINT: str, data: dict) -> httpx.Response:
 
     logging.debug(f"Posting to API_ENDPOINT")
 
-    async with httpx.AsyncClient() as client:
+    client = get_http_client()
 
-        # uped this to 7 min.
-        response = await client.post(API_ENDPOINT, json=data, timeout=900.0)
+    # uped this to 7 min.
+    response = await client.post(API_ENDPOINT, json=data, timeout=900.0)
 
-        if response.status_code != 200:
-            logging.error("Call failed")
+    if response.status_code != 200:
+        logging.error("Call failed")
 
-        logging.debug(response)
+    logging.debug(response)
 
-        return response
+    return response
 
 
 async def get_from_llm(API_ENDPOINT: str) -> httpx.Response:
@@ -89,16 +166,16 @@ async def get_from_llm(API_ENDPOINT: str) -> httpx.Response:
 
     logging.debug(API_ENDPOINT)
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(API_ENDPOINT, timeout=300.0)
+    client = get_http_client()
+    response = await client.get(API_ENDPOINT, timeout=300.0)
 
-        if response.status_code != 200:
-            logging.error("Call failed")
+    if response.status_code != 200:
+        logging.error("Call failed")
 
-        logging.debug("Call made, generating response")
-        logging.debug(response)
+    logging.debug("Call made, generating response")
+    logging.debug(response)
 
-        return response
+    return response
 
 
 async def delete_llm_call(API_ENDPOINT: str, data: dict) -> httpx.Response:
@@ -106,15 +183,37 @@ async def delete_llm_call(API_ENDPOINT: str, data: dict) -> httpx.Response:
     logging.debug(API_ENDPOINT)
     logging.debug(data)
 
-    async with httpx.AsyncClient() as client:
-        response = await client.request(
-            method="DELETE", url=API_ENDPOINT, json=data, timeout=300.0
-        )
+    client = get_http_client()
+    response = await client.request(
+        method="DELETE", url=API_ENDPOINT, json=data, timeout=300.0
+    )
 
-        if response.status_code != 200:
-            logging.error("Call failed")
+    if response.status_code != 200:
+        logging.error("Call failed")
+
+    logging.debug("Call made, generating response")
+    logging.debug(response)
 
-        logging.debug("Call made, generating response")
-        logging.debug(response)
+    return response
+
+
+async def stream_to_llm(API_ENDPOINT: str, data: dict) -> AsyncIterator[Dict]:
+    """streaming post call, yields each NDJSON chunk as it arrives.
+
+    Raises httpx.HTTPStatusError if Ollama replies with an error status.
+    """
+
+    logging.debug(API_ENDPOINT)
+    logging.debug(data)
+
+    client = get_http_client()
+    async with client.stream("POST", API_ENDPOINT, json=data, timeout=900.0) as response:
+
+        if response.status_code != 200:
+            await response.aread()
+            logging.error("Call failed: {0}".format(response.text))
+            response.raise_for_status()
 
-        return response
+        async for line in response.aiter_lines():
+            if line.strip():
+                yield json.loads(line)
@@ -1,16 +1,24 @@
+import asyncio
 import logging
 import json
 
 from typing import Dict, Iterator, List, Optional, Tuple
 
 from src.myllamatui.llm_calls import (
+    OllamaError,
     generate_endpoint,
     generate_data_for_model_pull,
     post_to_llm,
     get_from_llm,
     delete_llm_call,
 )
-from src.myllamatui.db_models import LLM_MODEL, Chat
+from src.myllamatui.db_models import LLM_MODEL, Chat, ModelMetadata
+
+# max /api/show probes in flight at once
+CAPABILITY_PROBE_LIMIT = 4
+
+# {model id: model name}, filled on first use and cleared when models change
+MODEL_NAME_CACHE: Dict[int, str] = {}
 
 
 # pulling and parsing return from Ollama
@@ -50,21 +58,110 @@ async def delete_llm_model(url: str, model: str) -> str:
     return delete_text
 
 
-async def pull_and_parse_model_capabilities(url: str, model_name: str) -> Optional[str]:
-    """Pull model info and return capability."""
+def parse_capabilities(capabilities_list: List[str]) -> str:
+    """Reduce an /api/show capabilities list to a single specialization."""
 
     capability = "general"
-
-    model_info = await post_action_to_model_manager(url, model_name, "model_info")
-    model_info_json = model_info.json()
-    capabilities_list = model_info_json.get("capabilities", [capability])
-
     for specialization in capabilities_list:
         if specialization not in ["completion", "general", "tools", "insert"]:
             capability = specialization
     return capability
 
 
+def parse_model_info(model_info_json: Dict) -> Dict:
+    """Pull the details we keep out of an /api/show reply."""
+
+    details = model_info_json.get("details", {})
+    capabilities_list = model_info_json.get("capabilities", ["general"])
+
+    # model_info keys are prefixed with the architecture, eg llama.context_length
+    context_length = None
+    for key, value in model_info_json.get("model_info", {}).items():
+        if key.endswith(".context_length"):
+            context_length = int(value)
+
+    # num_ctx is only present if the modelfile sets it
+    num_ctx = None
+    for line in model_info_json.get("parameters", "").splitlines():
+        parameter = line.split()
+        if len(parameter) == 2 and parameter[0] == "num_ctx":
+            num_ctx = int(parameter[1])
+
+    return {
+        "capabilities": capabilities_list,
+        "specialization": parse_capabilities(capabilities_list),
+        "context_length": context_length,
+        "num_ctx": num_ctx,
+        "family": details.get("family"),
+        "parameter_size": details.get("parameter_size"),
+        "quantization_level": details.get("quantization_level"),
+    }
+
+
+async def pull_and_parse_model_capabilities(url: str, model_name: str) -> Optional[str]:
+    """Pull model info and return capability."""
+
+    model_info = await post_action_to_model_manager(url, model_name, "model_info")
+    return parse_model_info(model_info.json())["specialization"]
+
+
+async def get_model_metadata(url: str, model_name: str, digest: str) -> ModelMetadata:
+    """Return /api/show details for a model, only calling the server for a new digest.
+
+    An error reply raises rather than being cached, so it is tried again later.
+    """
+
+    cached = ModelMetadata.get_or_none(ModelMetadata.digest == digest)
+    if cached is not None:
+        return cached
+
+    model_info = await post_action_to_model_manager(url, model_name, "model_info")
+    model_info.raise_for_status()
+    model_info_json = model_info.json()
+    if "error" in model_info_json:
+        raise OllamaError(model_info_json["error"])
+    info = parse_model_info(model_info_json)
+
+    # a new digest for the same name means the model was re-pulled. Two tags can
+    # share a digest and be probed together, so replace rather than fail.
+    ModelMetadata.delete().where(
+        (ModelMetadata.model == model_name) & (ModelMetadata.digest != digest)
+    ).execute()
+    ModelMetadata.insert(
+        digest=digest,
+        model=model_name,
+        capabilities=json.dumps(info["capabilities"]),
+        specialization=info["specialization"],
+        context_length=info["context_length"],
+        num_ctx=info["num_ctx"],
+        family=info["family"],
+        parameter_size=info["parameter_size"],
+        quantization_level=info["quantization_level"],
+    ).on_conflict_replace().execute()
+    return ModelMetadata.get(ModelMetadata.digest == digest)
+
+
+def cached_model_metadata(model_name: str) -> Optional[ModelMetadata]:
+    """Return the cached /api/show details for a model name, if any."""
+
+    return ModelMetadata.get_or_none(ModelMetadata.model == model_name)
+
+
+async def ensure_model_metadata(url: str, model_name: str) -> Optional[ModelMetadata]:
+    """Cached /api/show details for a model name, fetching them under the
+    digest Ollama lists it with if they aren't cached yet."""
+
+    cached = cached_model_metadata(model_name)
+    if cached is not None:
+        return cached
+
+    raw_model_list = await get_raw_model_list(url)
+    for model in raw_model_list["models"]:
+        if model["model"] == model_name and "digest" in model:
+            return await get_model_metadata(url, model_name, model["digest"])
+    return None
+
+
 def parse_model_name_for_skill(model_name: str) -> Optional[str]:
     """check model name for capability."""
 
@@ -76,19 +173,66 @@ def parse_model_name_for_skill(model_name: str) -> Optional[str]:
     return capability
 
 
-async def get_model_capabilities(url: str, model_name: str) -> str:
+async def get_model_capabilities(
+    url: str, model_name: str, digest: Optional[str] = None
+) -> str:
     """Parse name or pull info to determine capability."""
 
     # if the name tells us what it is, just use that otherwise kick out general
     capability = parse_model_name_for_skill(model_name)
-    # else do a call and set from the results
-    if not capability:
+    # with a digest the details are cached for every model, the context window is
+    # read from them too, else do a call and set from the results
+    if digest:
+        metadata = await get_model_metadata(url, model_name, digest)
+        capability = capability or metadata.specialization
+    elif not capability:
         capability = await pull_and_parse_model_capabilities(url, model_name)
     return capability
 
 
+async def get_capabilities_for_models(
+    url: str,
+    model_names: List[str],
+    limit: int = CAPABILITY_PROBE_LIMIT,
+    digests: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """Probe capabilities for several models concurrently, at most limit at a time.
+
+    A failed probe is logged for that model and it falls back to general.
+    Models with a digest in digests use the cached /api/show details.
+    """
+
+    semaphore = asyncio.Semaphore(limit)
+    digests = digests or {}
+
+    async def probe(model_name: str) -> str:
+        async with semaphore:
+            return await get_model_capabilities(
+                url, model_name, digests.get(model_name)
+            )
+
+    results = await asyncio.gather(
+        *(probe(model_name) for model_name in model_names), return_exceptions=True
+    )
+
+    capabilities = {}
+    for model_name, result in zip(model_names, results):
+        if isinstance(result, Exception):
+            logging.error(
+                "Capability probe for {0} failed: {1!r}".format(model_name, result)
+            )
+            capabilities[model_name] = "general"
+        else:
+            capabilities[model_name] = result
+    return capabilities
+
+
 # checking db against Ollama
-def add_model_if_not_present(ollama_list: List, stored_llm_models: List) -> None:
+def add_model_if_not_present(
+    ollama_list: List,
+    stored_llm_models: List,
+    capabilities: Optional[Dict[str, str]] = None,
+) -> None:
     """checking db against Ollama models and add if missing"""
     db_list = [llm_models.model for llm_models in stored_llm_models]
 
@@ -102,7 +246,9 @@ def add_model_if_not_present(ollama_list: List, stored_llm_models: List) -> None
         else:
             LLM_MODEL.get_or_create(
                 model=existing_model["model"],
-                specialization="General",
+                specialization=(capabilities or {}).get(
+                    existing_model["model"], "General"
+                ),
                 size=existing_model["size"],
                 currently_available=True,
             )
@@ -126,6 +272,29 @@ def align_db_and_ollama(raw_model_list: List, stored_llm_models: List) -> None:
     logging.debug("Update Complete.\n")
 
 
+def model_names_by_id() -> Dict[int, str]:
+    """All model names by id, from the cache or one query."""
+
+    if not MODEL_NAME_CACHE:
+        MODEL_NAME_CACHE.update(
+            {
+                model_id: model_name
+                for model_id, model_name in LLM_MODEL.select(
+                    LLM_MODEL.id, LLM_MODEL.model
+                ).tuples()
+            }
+        )
+    return MODEL_NAME_CACHE
+
+
+def model_name_for_id(model_id) -> Optional[str]:
+    return model_names_by_id().get(int(model_id))
+
+
+def clear_model_name_cache() -> None:
+    MODEL_NAME_CACHE.clear()
+
+
 # used for UI setup
 def model_choice_setup() -> Iterator[Tuple[str, str]]:
     return iter(
@@ -26,3 +26,7 @@ CREATE_NEW_CATEGORY = "Create a new generalized category of no more than 2 words
 CATEGORY_ASSESS = "is 25% or higher, output only the item in the list, otherwise output the summary you just created."
 # contexts
 EVALUTATE_CONTEXT = "You are a helpful professional, evaluating for accuracy and editing a response if necessary."
+# rolling summaries of long conversations
+SUMMARIZE_CONTEXT = "You are a careful note taker who keeps a running summary of a conversation."
+SUMMARIZE_CONVERSATION = "Update the summary with the conversation above. Keep facts, decisions, names, code identifiers and open questions, drop pleasantries. Use no more than 200 words and output only the summary."
+CONVERSATION_SUMMARY = "Summary of the earlier conversation: "
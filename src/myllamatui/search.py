@@ -0,0 +1,152 @@
+import logging
+import re
+
+from typing import Dict, List
+
+from src.myllamatui.db_models import Chat, SQLITE_DB
+
+
+# markers wrapped around matched terms in search results, swapped for styling by the UI
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+SEARCH_RESULT_LIMIT = 50
+# tokens either side of a match shown in a result snippet
+SNIPPET_TOKENS = 16
+# bm25 column weights, a match in the question counts for more than one in the answer
+QUESTION_WEIGHT = 2.0
+ANSWER_WEIGHT = 1.0
+
+# external content table, the text lives once in chat and the index points at it
+CREATE_CHAT_FTS = """
+CREATE VIRTUAL TABLE chat_fts USING fts5(
+    question,
+    answer,
+    content='chat',
+    content_rowid='id',
+    tokenize='porter unicode61'
+)
+"""
+
+# keep the index in step with every insert, update and delete on chat
+CHAT_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_fts_insert AFTER INSERT ON chat BEGIN
+        INSERT INTO chat_fts(rowid, question, answer)
+        VALUES (new.id, new.question, new.answer);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_fts_delete AFTER DELETE ON chat BEGIN
+        INSERT INTO chat_fts(chat_fts, rowid, question, answer)
+        VALUES ('delete', old.id, old.question, old.answer);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_fts_update AFTER UPDATE OF question, answer ON chat BEGIN
+        INSERT INTO chat_fts(chat_fts, rowid, question, answer)
+        VALUES ('delete', old.id, old.question, old.answer);
+        INSERT INTO chat_fts(rowid, question, answer)
+        VALUES (new.id, new.question, new.answer);
+    END
+    """,
+]
+
+# ranking every match of a common word is slow, only the newest matches are ranked
+SEARCH_CANDIDATE_LIMIT = 2000
+
+# rank the newest candidates, then only highlight the rows that are shown
+SEARCH_CHATS = f"""
+WITH candidates AS MATERIALIZED (
+    SELECT rowid, rank
+    FROM chat_fts
+    WHERE chat_fts MATCH ?
+    ORDER BY rowid DESC
+    LIMIT {SEARCH_CANDIDATE_LIMIT}
+),
+ranked AS (
+    SELECT rowid, rank FROM candidates ORDER BY rank LIMIT ?
+)
+SELECT
+    chat.id,
+    chat.topic_id,
+    topic.text,
+    chat.created_at,
+    highlight(chat_fts, 0, ?, ?),
+    snippet(chat_fts, 1, ?, ?, '…', {SNIPPET_TOKENS})
+FROM ranked
+JOIN chat_fts ON chat_fts.rowid = ranked.rowid
+JOIN chat ON chat.id = ranked.rowid
+LEFT OUTER JOIN topic ON topic.id = chat.topic_id
+WHERE chat_fts MATCH ?
+ORDER BY ranked.rank
+"""
+
+
+def create_chat_search(sqlite_database=SQLITE_DB) -> None:
+    """Create the full-text index and its triggers, indexing existing chats the first time"""
+
+    with sqlite_database.atomic():
+        if "chat_fts" not in sqlite_database.get_tables():
+            logging.info("Creating chat search index")
+            sqlite_database.execute_sql(CREATE_CHAT_FTS)
+            sqlite_database.execute_sql(
+                "INSERT INTO chat_fts(chat_fts, rank) VALUES ('rank', ?)",
+                (f"bm25({QUESTION_WEIGHT}, {ANSWER_WEIGHT})",),
+            )
+            # backfill from the chats already saved
+            sqlite_database.execute_sql(
+                "INSERT INTO chat_fts(chat_fts) VALUES ('rebuild')"
+            )
+        for trigger in CHAT_FTS_TRIGGERS:
+            sqlite_database.execute_sql(trigger)
+
+
+def build_match_query(search_text: str) -> str:
+    """Turn typed text into an FTS5 query that matches chats containing every word.
+
+    Words are quoted so punctuation and FTS5 keywords are searched for literally.
+    A trailing * makes the last word match as a prefix. That is opt in as prefix
+    queries can't stop early and get slow for words that appear in most chats.
+    """
+
+    words = re.findall(r"\w+", search_text)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    if re.search(r"\w\*$", search_text.rstrip()):
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_chats(
+    search_text: str, limit: int = SEARCH_RESULT_LIMIT
+) -> List[Dict[str, str]]:
+    """Chats matching search_text, best match first, with matches marked"""
+
+    match_query = build_match_query(search_text)
+    if match_query == "":
+        return []
+
+    cursor = Chat._meta.database.execute_sql(
+        SEARCH_CHATS,
+        (
+            match_query,
+            limit,
+            HIGHLIGHT_START,
+            HIGHLIGHT_END,
+            HIGHLIGHT_START,
+            HIGHLIGHT_END,
+            match_query,
+        ),
+    )
+    return [
+        {
+            "chat_id": chat_id,
+            "topic_id": topic_id,
+            "topic": topic_text or "",
+            "created_at": str(created_at).split()[0],
+            "question": question,
+            "answer": answer,
+        }
+        for chat_id, topic_id, topic_text, created_at, question, answer in cursor
+    ]
@@ -1,8 +1,13 @@
 import asyncio
 import logging
 
+import httpx
+
 from typing import Dict, List
 
+from peewee import fn
+from playhouse.migrate import SqliteMigrator, migrate
+
 from src.myllamatui.db_models import (
     Category,
     Chat,
@@ -10,9 +15,14 @@ from src.myllamatui.db_models import (
     Topic,
     LLM_MODEL,
     CLI_Settings,
+    ModelMetadata,
+    ChatEmbedding,
+    ChatStats,
+    ClassificationJob,
+    TopicSummary,
     SQLITE_DB,
 )
-from src.myllamatui.llm_models import get_raw_model_list, get_model_capabilities
+from src.myllamatui.llm_models import get_raw_model_list, get_capabilities_for_models
 from src.myllamatui.widgets_and_screens.ui_widgets_messages import SupportNotifyRequest
 
 
@@ -63,11 +73,44 @@ def initialize_db_defaults() -> None:
 def create_db(sqlite_database=SQLITE_DB) -> None:
     sqlite_database.connect()
     sqlite_database.create_tables(
-        [Context, Category, Topic, Chat, LLM_MODEL, CLI_Settings], safe=True
+        [
+            Context,
+            Category,
+            Topic,
+            Chat,
+            LLM_MODEL,
+            CLI_Settings,
+            ModelMetadata,
+            ChatEmbedding,
+            ChatStats,
+            ClassificationJob,
+            TopicSummary,
+        ],
+        safe=True,
     )
     sqlite_database.close()
 
 
+def migrate_db(sqlite_database=SQLITE_DB) -> None:
+    """Add columns introduced since the database was created"""
+
+    table_name = LLM_MODEL._meta.table_name
+    columns = [column.name for column in sqlite_database.get_columns(table_name)]
+    if "usage_count" not in columns:
+        logging.info("Adding usage_count to llm_model")
+        with sqlite_database.atomic():
+            migrate(
+                SqliteMigrator(sqlite_database).add_column(
+                    table_name, "usage_count", LLM_MODEL.usage_count
+                )
+            )
+            # backfill from the chats already saved
+            chat_count = Chat.select(fn.COUNT(Chat.id)).where(
+                Chat.llm_model_id == LLM_MODEL.id
+            )
+            LLM_MODEL.update(usage_count=chat_count).execute()
+
+
 def create_temp_fake_model() -> None:
     logging.info("No Models Found. Creating a fake model. Please pull a model.")
     SupportNotifyRequest(
@@ -79,20 +122,34 @@ def create_temp_fake_model() -> None:
     )
 
 
-async def populate_llm_models() -> None:
+async def populate_llm_models(url: str = CLI_DEFAULTS["url"]) -> None:
     try:
-        model_list = await get_raw_model_list(CLI_DEFAULTS["url"])
-        if len(model_list["models"]) == 0:
-            create_temp_fake_model()
-        else:
-            for model in model_list["models"]:
-                LLM_MODEL.create(
-                    model=model["model"],
-                    specialization=await get_model_capabilities(
-                        url, str(model["model"])
-                    ),
-                    size=model["size"],
-                    currently_available=True,
-                )
-    except:
+        model_list = await get_raw_model_list(url)
+        models = model_list["models"]
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        logging.error("Unable to list models from {0}: {1!r}".format(url, e))
         create_temp_fake_model()
+        return
+
+    if len(models) == 0:
+        create_temp_fake_model()
+        return
+
+    # probe every model first, then write the rows together
+    capabilities = await get_capabilities_for_models(
+        url,
+        [str(model["model"]) for model in models],
+        digests={
+            str(model["model"]): model["digest"]
+            for model in models
+            if "digest" in model
+        },
+    )
+    with LLM_MODEL._meta.database.atomic():
+        for model in models:
+            LLM_MODEL.create(
+                model=model["model"],
+                specialization=capabilities[str(model["model"])],
+                size=model["size"],
+                currently_available=True,
+            )
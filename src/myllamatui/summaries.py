@@ -0,0 +1,101 @@
+import logging
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.myllamatui.chats import create_content_summary
+from src.myllamatui.context_window import estimate_message_tokens
+from src.myllamatui.db_models import Chat, TopicSummary
+from src.myllamatui.llm_calls import generate_input_dict
+from src.myllamatui.prompts import (
+    CONVERSATION_SUMMARY,
+    SUMMARIZE_CONTEXT,
+    SUMMARIZE_CONVERSATION,
+)
+from src.myllamatui.topics_contexts_categories import create_context_dict
+
+# share of the token budget the conversation reaches before older turns are
+# summarized, below the trim target so summaries happen before any trimming
+SUMMARY_THRESHOLD_RATIO = 0.5
+# latest turns always sent in full
+KEEP_RECENT_TURNS = 4
+
+
+def needs_summary(
+    MESSAGES: List[Dict], budget: int, ratio: float = SUMMARY_THRESHOLD_RATIO
+) -> bool:
+    return estimate_message_tokens(MESSAGES) > budget * ratio
+
+
+def older_turns(MESSAGES: List[Dict], keep_turns: int = KEEP_RECENT_TURNS) -> List:
+    """Messages before the latest keep_turns questions, without the system prompt"""
+
+    user_positions = [
+        position
+        for position, message in enumerate(MESSAGES)
+        if message.get("role") == "user"
+    ]
+    if len(user_positions) <= keep_turns:
+        return []
+    keep_from = user_positions[-keep_turns] if keep_turns else len(MESSAGES)
+    return [
+        message for message in MESSAGES[:keep_from] if message.get("role") != "system"
+    ]
+
+
+async def summarize_turns(
+    url: str, turns: List[Dict], model_name: str, previous_summary: str = ""
+) -> str:
+    """Fold turns into the previous summary"""
+
+    transcript = "\n".join(
+        f"{message['role']}: {message.get('content', '')}" for message in turns
+    )
+    if previous_summary:
+        transcript = f"{CONVERSATION_SUMMARY}{previous_summary}\n\n{transcript}"
+    summary = await create_content_summary(
+        url,
+        [
+            create_context_dict(SUMMARIZE_CONTEXT),
+            generate_input_dict(f"{transcript}\n\n{SUMMARIZE_CONVERSATION}"),
+        ],
+        model_name,
+    )
+    return summary.strip()
+
+
+def drop_messages(MESSAGES: List[Dict], summarized: List[Dict]) -> None:
+    """Remove the summarized messages, by identity, as turns may have been
+    added or trimmed while the summary was written"""
+
+    summarized_ids = {id(message) for message in summarized}
+    MESSAGES[:] = [message for message in MESSAGES if id(message) not in summarized_ids]
+
+
+def load_topic_summary(topic_id: int) -> Optional[TopicSummary]:
+    return TopicSummary.get_or_none(TopicSummary.topic_id == topic_id)
+
+
+def save_topic_summary(
+    topic_id: int, summary: str, keep_turns: int = KEEP_RECENT_TURNS
+) -> Optional[TopicSummary]:
+    """Store the summary against the topic, covering all but its latest
+    keep_turns chats. None if the topic has no chats that old."""
+
+    last_chat = (
+        Chat.select(Chat.id)
+        .where(Chat.topic_id == topic_id)
+        .order_by(Chat.id.desc())
+        .offset(keep_turns)
+        .first()
+    )
+    if last_chat is None:
+        return None
+    TopicSummary.insert(
+        topic_id=topic_id,
+        summary=summary,
+        last_chat_id=last_chat.id,
+        updated_at=datetime.now(),
+    ).on_conflict_replace().execute()
+    logging.debug(f"Saved summary of topic {topic_id} up to chat {last_chat.id}")
+    return load_topic_summary(topic_id)
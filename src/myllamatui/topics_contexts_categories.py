@@ -1,27 +1,77 @@
+import heapq
 import logging
+import math
+import re
 
-from typing import Dict, Iterator, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from src.myllamatui.db_models import Topic, Category, Context
+from peewee import JOIN, fn
+
+from src.myllamatui.db_models import Chat, Topic, Category, Context
 from src.myllamatui.prompts import (
     ADD_OR_APPLY_TOPIC_TO_CHAT,
     ASSESS_SUMMARY_1,
     ASSESS_SUMMARY_2,
     ASSESS_SUMMARY_3,
     CREATE_NEW_CATEGORY,
-    CATEGORY_ASSESS
+    CATEGORY_ASSESS,
+    CONVERSATION_SUMMARY,
 )
 
 
+# most topics or categories offered to the llm in a classification prompt
+PROMPT_SHORTLIST_SIZE = 20
+
+
 def create_context_dict(context_text: str) -> Dict[str, str]:
     """generate context json for upload"""
 
     return {"role": "system", "content": context_text}
 
 
-def generate_current_topic_summary() -> List[Dict[str, str]]:
+def context_with_summary(context_text: str, summary: str) -> str:
+    """Context followed by the summary of the turns no longer sent"""
+
+    if not summary:
+        return context_text
+    return f"{context_text}\n\n{CONVERSATION_SUMMARY}{summary}"
+
+
+def shortlist_items(
+    items: Iterable, text: str, limit: int = PROMPT_SHORTLIST_SIZE
+) -> list:
+    """The topics or categories sharing the most words with text, at most limit.
+
+    Keeps prompts a bounded size as topics grow. With limit or fewer items all
+    are returned in their original order.
+    """
+
+    items = list(items)
+    if len(items) <= limit:
+        return items
+
+    words = set(re.findall(r"\w+", text.lower()))
+
+    def similarity(position_and_item):
+        position, item = position_and_item
+        item_words = set(re.findall(r"\w+", str(item.text).lower()))
+        # cosine of the two word sets, without the constant text length.
+        # Ties go to newer items.
+        return len(words & item_words) / math.sqrt(len(item_words) or 1), position
+
+    return [
+        item for _, item in heapq.nlargest(limit, enumerate(items), key=similarity)
+    ]
+
+
+def generate_current_topic_summary(
+    conversation_text: str = "",
+) -> List[Dict[str, str]]:
     """generate message and add to list of messages for topic summary calls"""
-    topic_list = [single_topic.text for single_topic in Topic.select()]
+    topic_list = [
+        single_topic.text
+        for single_topic in shortlist_items(Topic.select(), conversation_text)
+    ]
     return {
         "role": "user",
         "content": ADD_OR_APPLY_TOPIC_TO_CHAT
@@ -34,8 +84,11 @@ def generate_current_topic_summary() -> List[Dict[str, str]]:
 def generate_category_summary(topic_summary) -> List[Dict[str, str]]:
     """generate message and add to list of messages for topic summary calls"""
 
-    # get topics list
-    category_list = [str(single_category.text) for single_category in Category.select()]
+    # get the categories closest to the topic
+    category_list = [
+        str(single_category.text)
+        for single_category in shortlist_items(Category.select(), topic_summary)
+    ]
 
     topic_summary_text = "This is my topic: " + topic_summary
     category_instructions = (
@@ -61,44 +114,165 @@ def generate_category_summary(topic_summary) -> List[Dict[str, str]]:
 #    return {"role": "user", "content": compliation_prompt}
 
 
-def check_for_topic_and_category_match(summary: str, items: list) -> Optional[int]:
-    """compare llm generated summary to existing summaries and return mach id or None"""
-    selected_match = None
-    words = summary.split(" ")
+# words that say nothing about a summary's subject
+SUMMARY_STOP_WORDS = {
+    "no", "yes", "a", "the", "then", "to", "if", "or", "this", "that", "is"
+}
+# share of a summary's words that must be found in a topic or category to reuse it
+LEXICAL_MATCH_RATIO = 0.4
 
-    # filter for non-essential words
-    summarywords = [
-        word
-        for word in words
-        if word.lower()
-        not in ["no", "yes", "a", "the", "then", "to", "if", "or", "this", "that", "is"]
-    ]
 
-    # loop through remaining words and find matches in existing topics.
-    # create a dict withthe {topic_id:num of matches}
-    match_dict = {}
-    for i in range(len(summarywords)):
-        word = summarywords[i]
+class LexicalIndex:
+    """Inverted index of topic or category text, token -> ids of the items using it.
+
+    Matching keeps the substring rule of the original scan, a summary word
+    matches an item if it appears anywhere in the item's text. Item text is
+    split on spaces like summaries are, so that is the same as the word
+    appearing in one of the item's tokens. Only the distinct tokens are
+    scanned for that, not every item, and results are kept per word until
+    the index changes.
+    """
+
+    def __init__(self, items: Iterable = ()) -> None:
+        self.postings: Dict[str, Set[int]] = {}
+        self.item_tokens: Dict[int, Set[str]] = {}
+        # order items were added, breaks ties like the original scan did
+        self.positions: Dict[int, int] = {}
+        self.word_cache: Dict[str, Set[int]] = {}
         for item in items:
-            if word.lower() in item.text.lower():
-                match = item.id  # topic_id
-                if match in match_dict.keys():
-                    match_dict[match] += 1
-                else:
-                    match_dict[match] = 1
-
-    # find the highest match in the dict from above
-    # if above 40% of the essential words match an exisiting topic, use it
-    highest = 0
-    for id in match_dict.keys():
-        if match_dict[id] > highest:
-            highest = match_dict[id]
-            if highest / len(summarywords) > 0.4:
-                selected_match = id
-    return selected_match
+            self.add(item.id, item.text)
+
+    def add(self, item_id: int, text: str) -> None:
+        """Add an item, or replace its text if it is already indexed"""
+
+        self.remove(item_id, keep_position=True)
+        tokens = {token for token in str(text).lower().split(" ") if token}
+        self.item_tokens[item_id] = tokens
+        self.positions.setdefault(item_id, len(self.positions))
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(item_id)
+        self.word_cache.clear()
+
+    def remove(self, item_id: int, keep_position: bool = False) -> None:
+        for token in self.item_tokens.pop(item_id, ()):
+            self.postings[token].discard(item_id)
+            if not self.postings[token]:
+                del self.postings[token]
+        if not keep_position:
+            self.positions.pop(item_id, None)
+        self.word_cache.clear()
+
+    def ids_for_word(self, word: str) -> Set[int]:
+        """Ids of items whose text contains word"""
+
+        if word not in self.word_cache:
+            if word == "":
+                # an empty word is in every text
+                ids = set(self.item_tokens)
+            else:
+                ids = set()
+                for token, token_ids in self.postings.items():
+                    if word in token:
+                        ids |= token_ids
+            self.word_cache[word] = ids
+        return self.word_cache[word]
+
+    def match(self, summary: str) -> Optional[int]:
+        """Id of the item containing the most summary words, if that is over
+        LEXICAL_MATCH_RATIO of them. Ties go to the item matched by the
+        earliest word, then the earliest added."""
+
+        summarywords = [
+            word.lower()
+            for word in summary.split(" ")
+            if word.lower() not in SUMMARY_STOP_WORDS
+        ]
+
+        counts: Dict[int, int] = {}
+        first_word: Dict[int, int] = {}
+        for word_number, word in enumerate(summarywords):
+            for item_id in self.ids_for_word(word):
+                counts[item_id] = counts.get(item_id, 0) + 1
+                first_word.setdefault(item_id, word_number)
+
+        if not counts:
+            return None
+        best = min(
+            counts,
+            key=lambda item_id: (
+                -counts[item_id],
+                first_word[item_id],
+                self.positions[item_id],
+            ),
+        )
+        if counts[best] / len(summarywords) > LEXICAL_MATCH_RATIO:
+            return best
+        return None
+
+
+# built from the database on first use, then kept up to date as items change
+LEXICAL_INDEXES: Dict[type, LexicalIndex] = {}
+
+
+def lexical_index(model) -> LexicalIndex:
+    """The LexicalIndex for Topic or Category"""
+
+    if model not in LEXICAL_INDEXES:
+        LEXICAL_INDEXES[model] = LexicalIndex(model.select())
+    return LEXICAL_INDEXES[model]
+
+
+def update_lexical_index(item) -> None:
+    """Add a created or edited Topic or Category to its index, if it is built"""
+
+    index = LEXICAL_INDEXES.get(type(item))
+    if index is not None:
+        index.add(item.id, item.text)
+
+
+def reset_lexical_indexes() -> None:
+    LEXICAL_INDEXES.clear()
+
+
+def check_for_topic_and_category_match(summary: str, items) -> Optional[int]:
+    """compare llm generated summary to existing summaries and return mach id or None
+
+    items is a LexicalIndex, or any topics or categories to index for this call.
+    """
+
+    if not isinstance(items, LexicalIndex):
+        items = LexicalIndex(items)
+    return items.match(summary)
 
 
 # defs for returing items to ui sepcifically
+def load_categories() -> Dict[int, str]:
+    """Non default categories for the top level of the tree"""
+    return {
+        category_id: category_text
+        for category_id, category_text in Category.select(Category.id, Category.text)
+        .where(Category.text != "default")
+        .order_by(Category.id)
+        .tuples()
+    }
+
+
+def load_category_topics(category_id: int) -> Dict[int, Tuple[str, int]]:
+    """Topics and their chat counts for a single category, in one query.
+
+    Returns {topic_id: (topic_text, chat_count)}
+    """
+    rows = (
+        Topic.select(Topic.id, Topic.text, fn.COUNT(Chat.id))
+        .join(Chat, JOIN.LEFT_OUTER, on=(Chat.topic_id == Topic.id))
+        .where((Topic.category_id == category_id) & (Topic.text != "default"))
+        .group_by(Topic.id)
+        .order_by(Topic.id)
+        .tuples()
+    )
+    return {topic_id: (topic_text, chat_count) for topic_id, topic_text, chat_count in rows}
+
+
 def context_choice_setup() -> Iterator[Tuple[str, str]]:
     return iter((str(context.text), str(context.id)) for context in Context.select())
 
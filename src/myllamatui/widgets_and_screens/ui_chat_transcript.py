@@ -0,0 +1,196 @@
+import logging
+import math
+
+from typing import Dict, List, Optional
+
+from textual.containers import VerticalScroll
+from textual.widget import Widget
+
+from src.myllamatui.widgets_and_screens.ui_widgets_messages import (
+    ChatEntry,
+    OlderChatsRequested,
+)
+
+
+# rows above and below the viewport that are kept mounted as real chats
+OVERSCAN_ROWS = 40
+# width used for height estimates before the transcript has been laid out
+DEFAULT_ESTIMATE_WIDTH = 80
+# rows the date label, borders and padding add around the question and answer
+CHAT_CHROME_ROWS = 8
+
+
+def estimate_chat_height(chat_record: Dict[str, str], width: int) -> int:
+    """Rough rendered height of a chat, used until it has been mounted and measured."""
+
+    width = max(width, 10)
+    rows = CHAT_CHROME_ROWS
+    for text in (chat_record["question"], chat_record["answer"]):
+        for line in text.splitlines() or [""]:
+            rows += max(1, math.ceil(len(line) / width))
+    return rows
+
+
+class ChatSlot(Widget):
+    """Holds one chat in the transcript.
+
+    Off screen it is an empty placeholder with the chat's estimated (or last
+    measured) height. Near the viewport it mounts a ChatEntry.
+    """
+
+    DEFAULT_CSS = """
+    ChatSlot {
+        height: auto;
+    }
+
+    ChatSlot.found {
+        border-left: thick $accent;
+    }
+    """
+
+    def __init__(self, chat_record: Dict[str, str], height: int) -> None:
+        super().__init__()
+        self.chat_record = chat_record
+        self.entry: Optional[ChatEntry] = None
+        self.styles.height = height
+
+    def materialize(self) -> None:
+        if self.entry is None:
+            self.entry = ChatEntry(**self.chat_record)
+            self.styles.height = "auto"
+            self.mount(self.entry)
+
+    def placeholder(self) -> None:
+        if self.entry is not None and not self.entry.streaming:
+            self.chat_record = self.entry.chat_record()
+            self.styles.height = max(self.size.height, 1)
+            self.entry.remove()
+            self.entry = None
+
+
+class ChatTranscript(VerticalScroll):
+    """Scrolling chat window that only mounts the chats near the viewport."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._window_update_pending = False
+        # keep the latest chat in view while estimates are replaced by real heights
+        self._stick_to_end = False
+        # set by the app when the loaded chats don't start at the topic's first chat
+        self.has_older = False
+        self._older_requested = False
+
+    @property
+    def slots(self) -> List[ChatSlot]:
+        return [child for child in self.children if isinstance(child, ChatSlot)]
+
+    def build_slots(self, chat_records: List[Dict[str, str]]) -> List[ChatSlot]:
+        width = self.content_size.width or DEFAULT_ESTIMATE_WIDTH
+        return [
+            ChatSlot(chat_record, estimate_chat_height(chat_record, width))
+            for chat_record in chat_records
+        ]
+
+    async def load_chats(
+        self,
+        chat_records: List[Dict[str, str]],
+        has_older: bool = False,
+        found_index: Optional[int] = None,
+    ) -> None:
+        """Replace the transcript with placeholders for chat_records, showing the
+        latest, or the chat at found_index marked as found."""
+
+        await self.remove_children()
+        slots = self.build_slots(chat_records)
+        await self.mount_all(slots)
+        self.has_older = has_older
+        self._older_requested = False
+        if found_index is None:
+            self._stick_to_end = True
+            self.scroll_end(animate=False, immediate=True)
+        else:
+            slots[found_index].add_class("found")
+            self.call_after_refresh(self.scroll_to_found, slots[found_index])
+        self.schedule_window_update()
+
+    async def prepend_chats(
+        self, chat_records: List[Dict[str, str]], has_older: bool
+    ) -> None:
+        """Add older chats above the current ones without moving the view."""
+
+        slots = self.build_slots(chat_records)
+        current_slots = self.slots
+        if current_slots:
+            await self.mount_all(slots, before=current_slots[0])
+        else:
+            await self.mount_all(slots)
+        added_rows = sum(slot.styles.height.value for slot in slots)
+        self.scroll_to(y=self.scroll_y + added_rows, animate=False, immediate=True)
+
+        self.has_older = has_older
+        self._older_requested = False
+        self.schedule_window_update()
+
+    async def add_entry(self, chat_entry: ChatEntry) -> None:
+        """Append a mounted chat at the bottom, used for new chats."""
+
+        slot = ChatSlot(chat_entry.chat_record(), 1)
+        slot.entry = chat_entry
+        slot.styles.height = "auto"
+        await self.mount(slot)
+        await slot.mount(chat_entry)
+        self.scroll_end(animate=False)
+
+    def schedule_window_update(self) -> None:
+        """Update which chats are mounted once the current layout is done."""
+
+        if not self._window_update_pending:
+            self._window_update_pending = True
+            self.call_after_refresh(self.update_window)
+
+    def update_window(self) -> None:
+        """Mount the chats near the viewport and turn the rest into placeholders."""
+
+        self._window_update_pending = False
+        top = self.scroll_y - OVERSCAN_ROWS
+        bottom = self.scroll_y + self.size.height + OVERSCAN_ROWS
+
+        mounted = 0
+        for slot in self.slots:
+            region = slot.virtual_region
+            if region.y + region.height >= top and region.y <= bottom:
+                slot.materialize()
+                mounted += 1
+            else:
+                slot.placeholder()
+        logging.debug(f"Transcript window: {mounted} chats mounted")
+
+        if self._stick_to_end:
+            self._stick_to_end = False
+            self.call_after_refresh(self.scroll_to_latest)
+
+        # within a screen of the top, ask for the previous page
+        elif (
+            self.has_older
+            and not self._older_requested
+            and self.scroll_y < self.size.height
+        ):
+            self._older_requested = True
+            self.post_message(OlderChatsRequested())
+
+    def scroll_to_found(self, slot: ChatSlot) -> None:
+        self.scroll_to_widget(slot, animate=False, top=True, immediate=True)
+        self.schedule_window_update()
+
+    def scroll_to_latest(self) -> None:
+        self.scroll_end(animate=False, immediate=True)
+        # a short page may not scroll at all, check for older chats regardless
+        self.schedule_window_update()
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        if round(old_value) != round(new_value):
+            self.schedule_window_update()
+
+    def on_resize(self) -> None:
+        self.schedule_window_update()
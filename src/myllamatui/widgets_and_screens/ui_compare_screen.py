@@ -0,0 +1,230 @@
+import logging
+import time
+
+from typing import Dict, List
+
+from textual import on
+from textual.app import ComposeResult
+from textual.containers import Horizontal, Vertical, VerticalScroll
+from textual.screen import ModalScreen, Screen
+from textual.widgets import Button, Footer, Input, Label, SelectionList
+from textual.worker import Worker, WorkerState
+
+from src.myllamatui.chats import save_chat
+from src.myllamatui.compare import compare_models, speed_label
+from src.myllamatui.db_models import LLM_MODEL
+from src.myllamatui.widgets_and_screens.ui_widgets_messages import (
+    ChatEntry,
+    ChatsCompared,
+)
+
+# minimum seconds between re-renders of a column's streaming answer
+COMPARE_RENDER_INTERVAL = 0.15
+
+
+class CompareModelsPicker(ModalScreen[List[int]]):
+    """Choose the models to compare. Dismisses with their ids, empty if cancelled."""
+
+    CSS = """
+    CompareModelsPicker {
+        align: center middle;
+    }
+
+    #compare_picker_container {
+        width: 60;
+        height: auto;
+        max-height: 80%;
+        border: round $primary;
+        background: $surface;
+        padding: 1;
+    }
+    """
+
+    BINDINGS = [("escape", "cancel_compare", "Cancel")]
+
+    def __init__(self, selected_model_id: str) -> None:
+        super().__init__()
+        self.selected_model_id = str(selected_model_id)
+
+    def compose(self) -> ComposeResult:
+        models = LLM_MODEL.select().where(
+            (LLM_MODEL.currently_available == True)
+            & (LLM_MODEL.specialization != "embedding")
+        )
+        with Vertical(id="compare_picker_container"):
+            yield Label("Choose the models to answer side by side")
+            yield SelectionList[int](
+                *[
+                    (model.model, model.id, str(model.id) == self.selected_model_id)
+                    for model in models
+                ],
+                id="compare_models",
+            )
+            with Horizontal():
+                yield Button("Compare", id="start_compare", variant="primary")
+                yield Button("Cancel", id="cancel_compare")
+
+    @on(Button.Pressed, "#start_compare")
+    def start_compare(self, event: Button.Pressed) -> None:
+        selected = self.query_one("#compare_models", SelectionList).selected
+        if len(selected) < 2:
+            self.notify("Choose at least two models to compare.", severity="warning")
+            return
+        self.dismiss(selected)
+
+    @on(Button.Pressed, "#cancel_compare")
+    def cancel_compare_button(self, event: Button.Pressed) -> None:
+        self.dismiss([])
+
+    def action_cancel_compare(self) -> None:
+        self.dismiss([])
+
+
+class CompareScreen(Screen):
+    """Asks several models the same questions at once, one column per model.
+
+    Each model continues its own copy of the current conversation and every
+    answer is saved as a chat.
+    """
+
+    CSS = """
+    #compare_columns {
+        height: 1fr;
+    }
+
+    .compare_column {
+        width: 1fr;
+        padding: 0 1;
+        border: round $primary;
+        background: rgb(2, 1, 21);
+    }
+
+    #compare_question {
+        dock: bottom;
+    }
+    """
+
+    BINDINGS = [("escape", "close_compare", "Close Compare")]
+
+    def __init__(
+        self,
+        url: str,
+        model_ids: List[int],
+        context_id: str,
+        context_text: str,
+        topic_id: str,
+        messages: List,
+    ) -> None:
+        super().__init__()
+        self.url = url
+        self.context_id = context_id
+        self.context_text = context_text
+        self.topic_id = topic_id
+        # {model name: model id}, in the order the models were listed
+        self.models: Dict[str, int] = {
+            model.model: model.id
+            for model in LLM_MODEL.select()
+            .where(LLM_MODEL.id.in_(model_ids))
+            .order_by(LLM_MODEL.id)
+        }
+        self.conversations = {model_name: list(messages) for model_name in self.models}
+        self.chat_ids: List[int] = []
+        # {model name: ChatEntry} of the question being answered, streaming
+        # until its answer is saved
+        self.entries: Dict[str, ChatEntry] = {}
+
+    def compose(self) -> ComposeResult:
+        with Horizontal(id="compare_columns"):
+            for position, model_name in enumerate(self.models):
+                with VerticalScroll(
+                    id=f"compare_column_{position}", classes="compare_column"
+                ):
+                    yield Label(model_name, classes="cssdate")
+        yield Input(
+            placeholder="Ask every model the same question", id="compare_question"
+        )
+        yield Footer()
+
+    @on(Input.Submitted, "#compare_question")
+    def ask_models(self, event: Input.Submitted) -> None:
+        question = event.value.strip()
+        if question == "":
+            return
+        event.input.clear()
+        event.input.disabled = True
+        self.run_worker(self.compare(question), group="compare", exit_on_error=False)
+
+    async def compare(self, question: str) -> None:
+        entries = self.entries = {}
+        for position, model_name in enumerate(self.models):
+            entry = ChatEntry(f"{model_name} - answering", question, "")
+            entry.streaming = True
+            column = self.query_one(f"#compare_column_{position}")
+            await column.mount(entry)
+            column.scroll_end(animate=False)
+            entries[model_name] = entry
+
+        # each column only re-renders once its previous render is done
+        renders = {}
+        last_render = {}
+
+        def on_update(model_name: str, answer: str) -> None:
+            now = time.monotonic()
+            render = renders.get(model_name)
+            if (render is None or render.is_done) and (
+                now - last_render.get(model_name, 0.0) >= COMPARE_RENDER_INTERVAL
+            ):
+                renders[model_name] = entries[model_name].update_answer(answer)
+                last_render[model_name] = now
+
+        results = await compare_models(
+            self.url, question, self.context_text, self.conversations, on_update
+        )
+
+        for model_name, (answer, stats) in results.items():
+            entry = entries[model_name]
+            await entry.update_answer(answer)
+            date_info = f"{model_name} - {speed_label(stats)}"
+            if "error" not in stats:
+                chat = save_chat(
+                    question,
+                    answer,
+                    self.context_id,
+                    self.topic_id,
+                    self.models[model_name],
+                    stats=stats,
+                )
+                self.chat_ids.append(chat.id)
+                date_info = (
+                    f"{model_name} - Today - chat id: {chat.id} - {speed_label(stats)}"
+                )
+            logging.info(f"Compare {date_info}")
+            entry.update_date_info(date_info)
+            entry.streaming = False
+
+        self.enable_question()
+
+    def enable_question(self) -> None:
+        question_input = self.query_one("#compare_question", Input)
+        question_input.disabled = False
+        question_input.focus()
+
+    def on_worker_state_changed(self, event: Worker.StateChanged) -> None:
+        """Show an unexpected failure in the columns still answering"""
+
+        if event.worker.group != "compare" or event.state != WorkerState.ERROR:
+            return
+        error = event.worker.error
+        logging.error(f"Compare failed: {error!r}")
+        self.notify(f"Compare failed: {error}", severity="error")
+        for model_name, entry in self.entries.items():
+            if entry.streaming:
+                entry.streaming = False
+                entry.update_date_info(
+                    f"{model_name} - {speed_label({'error': str(error)})}"
+                )
+        self.enable_question()
+
+    def action_close_compare(self) -> None:
+        self.app.post_message(ChatsCompared(self.chat_ids))
+        self.app.pop_screen()
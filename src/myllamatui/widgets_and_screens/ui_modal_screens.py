@@ -4,8 +4,9 @@ from peewee import *
 
 from textual import on
 from textual.app import ComposeResult
+from textual.containers import Horizontal, Vertical
 from textual.screen import ModalScreen
-from textual.widgets import Label, Select
+from textual.widgets import Button, Label, Select
 
 
 # Modal screens
@@ -24,3 +25,50 @@ class QuitScreen(ModalScreen):
 
     def compose(self) -> ComposeResult:
         yield Label(self.qs_message, id="qa_savingmessage", classes="ModelIteration")
+
+
+class KeepPartialAnswerScreen(ModalScreen[bool]):
+    """Asks whether a cancelled answer is kept. Dismisses with True to keep it."""
+
+    CSS = """
+    KeepPartialAnswerScreen {
+        align: center middle;
+    }
+
+    #partial_answer_container {
+        width: 60;
+        height: auto;
+        border: round $primary;
+        background: $surface;
+        padding: 1;
+    }
+    """
+
+    BINDINGS = [("escape", "discard", "Discard Answer")]
+
+    # characters of the partial answer shown
+    PREVIEW_LENGTH = 200
+
+    def __init__(self, partial_answer: str) -> None:
+        super().__init__()
+        self.partial_answer = partial_answer
+
+    def compose(self) -> ComposeResult:
+        preview = self.partial_answer[-self.PREVIEW_LENGTH :] or "(no answer yet)"
+        with Vertical(id="partial_answer_container"):
+            yield Label("Answer cancelled. Keep what was written so far?")
+            yield Label(preview, classes="cssanswer")
+            with Horizontal():
+                yield Button("Keep", id="keep_partial", variant="primary")
+                yield Button("Discard", id="discard_partial", variant="error")
+
+    @on(Button.Pressed, "#keep_partial")
+    def keep(self, event: Button.Pressed) -> None:
+        self.dismiss(True)
+
+    @on(Button.Pressed, "#discard_partial")
+    def discard(self, event: Button.Pressed) -> None:
+        self.dismiss(False)
+
+    def action_discard(self) -> None:
+        self.dismiss(False)
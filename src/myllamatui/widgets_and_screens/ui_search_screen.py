@@ -0,0 +1,137 @@
+import logging
+import re
+
+import httpx
+
+from rich.text import Text
+
+from textual import on
+from textual.app import ComposeResult
+from textual.containers import Vertical
+from textual.screen import ModalScreen
+from textual.widgets import Button, Checkbox, Input, Label, OptionList
+from textual.widgets.option_list import Option
+
+from src.myllamatui.embeddings import select_embedding_model, semantic_search_chats
+from src.myllamatui.search import HIGHLIGHT_END, HIGHLIGHT_START, search_chats
+from src.myllamatui.widgets_and_screens.ui_widgets_messages import ChatSearchSelected
+
+
+def highlighted_text(marked_text: str, style: str = "bold reverse") -> Text:
+    """Rich text for a search result, with the marked matches styled"""
+
+    text = Text()
+    highlight = False
+    for part in marked_text.replace(HIGHLIGHT_END, HIGHLIGHT_START).split(
+        HIGHLIGHT_START
+    ):
+        # one line per field keeps the result list compact
+        text.append(re.sub(r"\s+", " ", part), style=style if highlight else "")
+        highlight = not highlight
+    return text
+
+
+class ChatSearchScreen(ModalScreen):
+    """Search box over all saved chats. Choosing a result opens its topic."""
+
+    CSS = """
+    ChatSearchScreen {
+        align: center middle;
+    }
+
+    #search_container {
+        width: 80%;
+        height: 80%;
+        border: round $primary;
+        background: $surface;
+        padding: 1;
+    }
+
+    #search_results {
+        height: 1fr;
+    }
+    """
+
+    BINDINGS = [("escape", "close_search", "Close Search")]
+
+    # cells of an answer shown in a result
+    RESULT_ANSWER_WIDTH = 300
+
+    def __init__(self, url: str) -> None:
+        super().__init__()
+        self.url = url
+
+    def compose(self) -> ComposeResult:
+        with Vertical(id="search_container"):
+            yield Label("Search previous chats")
+            yield Input(
+                placeholder="Search for words in questions and answers, end with * for a prefix",
+                id="search_input",
+            )
+            yield Checkbox(
+                "Search by meaning (uses the embedding model, press enter to search)",
+                id="semantic_search",
+            )
+            yield OptionList(id="search_results")
+            yield Button("Close Search", id="CloseSearch", variant="primary")
+
+    def result_option(self, result: dict) -> Option:
+        chat_info = (
+            f"{result['topic']} - {result['created_at']} - chat id: {result['chat_id']}"
+        )
+        answer = highlighted_text(result["answer"])
+        answer.truncate(self.RESULT_ANSWER_WIDTH, overflow="ellipsis")
+        prompt = Text.assemble(
+            (chat_info + "\n", "dim"),
+            highlighted_text(result["question"]),
+            "\n",
+            answer,
+        )
+        return Option(prompt, id=str(result["chat_id"]))
+
+    def show_results(self, results: list) -> None:
+        option_list = self.query_one("#search_results")
+        option_list.clear_options()
+        option_list.add_options([self.result_option(result) for result in results])
+
+    @on(Input.Changed, "#search_input")
+    def update_results(self, event: Input.Changed) -> None:
+        # searching by meaning calls the server, so it waits for enter
+        if self.query_one("#semantic_search").value:
+            return
+        results = search_chats(event.value)
+        logging.debug(f"Search '{event.value}': {len(results)} results")
+        self.show_results(results)
+
+    @on(Input.Submitted, "#search_input")
+    async def focus_results(self, event: Input.Submitted) -> None:
+        if self.query_one("#semantic_search").value and event.value.strip():
+            model_name = select_embedding_model()
+            if model_name is None:
+                self.notify("Pull an embedding model to search by meaning.")
+                return
+            try:
+                results = await semantic_search_chats(self.url, event.value, model_name)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                logging.error(f"Semantic search failed: {e!r}")
+                self.notify("Search by meaning failed.", severity="error")
+                return
+            self.show_results(results)
+
+        option_list = self.query_one("#search_results")
+        if option_list.option_count:
+            option_list.focus()
+            option_list.highlighted = 0
+
+    @on(OptionList.OptionSelected, "#search_results")
+    def open_result(self, event: OptionList.OptionSelected) -> None:
+        # the app opens the chat, this screen is gone by the time it is handled
+        self.app.post_message(ChatSearchSelected(int(event.option.id)))
+        self.dismiss()
+
+    @on(Button.Pressed, "#CloseSearch")
+    def close_search_button(self, event: Button.Pressed) -> None:
+        self.dismiss()
+
+    def action_close_search(self) -> None:
+        self.dismiss()
@@ -29,10 +29,12 @@ from src.myllamatui.topics_contexts_categories import (
     context_choice_setup,
     topics_choice_setup,
     category_choice_setup,
+    update_lexical_index,
 )
 from src.myllamatui.llm_models import (
     post_action_to_model_manager,
     get_model_capabilities,
+    get_capabilities_for_models,
     get_raw_model_list,
     add_model_if_not_present,
     align_db_and_ollama,
@@ -57,6 +59,8 @@ class SettingsScreen(Screen):
             "context_changed": "",
             "url_changed": "",
         }
+        # categories whose topics or chat counts need reloading in the tree
+        self.changed_category_ids = set()
         self.url = url
 
     def compose(self) -> ComposeResult:
@@ -188,7 +192,6 @@ class SettingsScreen(Screen):
                 yield Label(f"To Delete: No Selection", id="model_to_delete_label")
                 yield Button("Delete Model", id="DeleteModel", variant="warning")
 
-    # I don't like this. It needs updating.
     def models_datatable(self) -> DataTable:
         all_models = LLM_MODEL.select()
         table = DataTable(id="models_data_table")
@@ -205,7 +208,6 @@ class SettingsScreen(Screen):
         count = 0
         for model in all_models:
             logging.debug(model.id)
-            model_usage = Chat.select().where(Chat.llm_model_id == model.id).count()
             download_date = str(model.modified_at).split(" ")[0]
             logging.debug(download_date)
             table.add_row(
@@ -214,7 +216,7 @@ class SettingsScreen(Screen):
                 str(model.specialization),
                 str(model.size),
                 str(download_date),
-                int(model_usage),
+                int(model.usage_count),
                 key=f"R{str(count)}",
             )
             count += 1
@@ -277,10 +279,13 @@ class SettingsScreen(Screen):
         category_id = category_select.value
         if category_id != Select.BLANK:
             logging.debug("New Topic created: {0}".format(new_topic))
-            Topic.create(text=str(new_topic), category_id=category_id)
+            update_lexical_index(
+                Topic.create(text=str(new_topic), category_id=category_id)
+            )
             # this isn't updating. Cannot figure out why
             self.notify("Topic Added. Click Close Settings to return to Chat.")
             self.dbmodels["topic_changed"] = "True"
+            self.changed_category_ids.add(str(category_id))
         else:
             self.notify(
                 "Unable to create topic. Please select a category.", severity="warning"
@@ -292,6 +297,7 @@ class SettingsScreen(Screen):
         topic_id = self.query_one("#TopicEditChoose")
         logging.debug(topic_id.value)
         topic_to_change = Topic.get_by_id(topic_id.value)
+        self.changed_category_ids.add(str(topic_to_change.category_id_id))
         input = self.query_one("#NewOrEditTopicInput")
         topic_text = input.value
         if topic_text != "":
@@ -304,6 +310,8 @@ class SettingsScreen(Screen):
         if int(category_id) > 0 or category_id != Select.BLANK:
             topic_to_change.category_id = category_id
         topic_to_change.save()
+        update_lexical_index(topic_to_change)
+        self.changed_category_ids.add(str(topic_to_change.category_id_id))
         input.clear()
         self.notify("Topic Updated. Click Close Settings to return to Chat.")
         self.dbmodels["topic_changed"] = "True"
@@ -317,8 +325,10 @@ class SettingsScreen(Screen):
 
         if topic_id != Select.BLANK and int(chat_id) <= len(Chat.select()):
             chat_to_update = Chat.get_by_id(chat_id)
+            self.changed_category_ids.add(str(chat_to_update.topic_id.category_id_id))
             chat_to_update.topic_id = topic_id
             chat_to_update.save()
+            self.changed_category_ids.add(str(Topic.get_by_id(topic_id).category_id_id))
             # this isn't updating. Cannot figure out why
             self.notify("Chat Topic updated. Click Close Settings to return to Chat.")
             self.dbmodels["topic_changed"] = "True"
@@ -331,7 +341,7 @@ class SettingsScreen(Screen):
         input = self.query_one("#NewOrEditCategoryInput")
         new_category = input.value
         logging.debug("New Category created: {0}".format(new_category))
-        Category.create(text=str(new_category))
+        update_lexical_index(Category.create(text=str(new_category)))
         # this isn't updating. Cannot figure out why
         self.notify("Topic Added. Click Close Settings to return to Chat.")
         self.dbmodels["category_changed"] = "True"
@@ -349,6 +359,8 @@ class SettingsScreen(Screen):
         )
         category_to_change.text = category_text
         category_to_change.save()
+        update_lexical_index(category_to_change)
+        self.changed_category_ids.add(str(category_to_change.id))
         input.clear()
         self.notify("Category Updated. Click Close Settings to return to Chat.")
         self.dbmodels["category_changed"] = "True"
@@ -390,14 +402,28 @@ class SettingsScreen(Screen):
                 new_model = model_list["models"][0]
                 to_replace.model = new_model["model"]
                 to_replace.specialization = await get_model_capabilities(
-                    self.url, str(new_model["model"])
+                    self.url, str(new_model["model"]), new_model.get("digest")
                 )
                 to_replace.size = new_model["size"]
                 to_replace.currently_available = True
                 to_replace.save()
 
-            # update database
-            add_model_if_not_present(model_list, stored_llm_models)
+            # update database, probing any models the db doesn't know yet
+            stored_names = [sm.model for sm in stored_llm_models]
+            capabilities = await get_capabilities_for_models(
+                self.url,
+                [
+                    str(ollama_model["model"])
+                    for ollama_model in model_list["models"]
+                    if ollama_model["model"] not in stored_names
+                ],
+                digests={
+                    str(ollama_model["model"]): ollama_model["digest"]
+                    for ollama_model in model_list["models"]
+                    if "digest" in ollama_model
+                },
+            )
+            add_model_if_not_present(model_list, stored_llm_models, capabilities)
             align_db_and_ollama(model_list, stored_llm_models)
 
             #### check data table and change availablity to true.
@@ -509,6 +535,7 @@ class SettingsScreen(Screen):
                 self.dbmodels["topic_changed"],
                 self.dbmodels["model_changed"],
                 self.dbmodels["url_changed"],
+                ",".join(sorted(self.changed_category_ids)),
             )
         )
         self.dismiss()
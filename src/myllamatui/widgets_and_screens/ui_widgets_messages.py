@@ -1,13 +1,14 @@
 import logging
 
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, List
 
 from textual import on
 from textual.app import ComposeResult
-from textual.containers import HorizontalGroup
+from textual.await_complete import AwaitComplete
+from textual.containers import HorizontalGroup, VerticalGroup
 from textual.message import Message
-from textual.widgets import Button, Input, DirectoryTree
+from textual.widgets import Button, Input, DirectoryTree, Label, Markdown
 
 
 # message classes
@@ -25,6 +26,7 @@ class SettingsChanged(Message):
         topic_changed: str,
         model_changed: str,
         url_changed: str,
+        changed_category_ids: str = "",
     ) -> None:
         super().__init__()
         self.context_changed = context_changed
@@ -32,6 +34,28 @@ class SettingsChanged(Message):
         self.topic_changed = topic_changed
         self.model_changed = model_changed
         self.url_changed = url_changed
+        # comma separated ids of categories whose topics or chat counts changed
+        self.changed_category_ids = changed_category_ids
+
+
+class OlderChatsRequested(Message):
+    """The transcript was scrolled to the top and has older chats to load."""
+
+
+class ChatSearchSelected(Message):
+    """A chat was chosen from the search results."""
+
+    def __init__(self, chat_id: int) -> None:
+        super().__init__()
+        self.chat_id = chat_id
+
+
+class ChatsCompared(Message):
+    """Chats saved by the compare screen, one per model and question."""
+
+    def __init__(self, chat_ids: List[int]) -> None:
+        super().__init__()
+        self.chat_ids = chat_ids
 
 
 # this is currently unused. Leaving for now as it could be useful
@@ -75,3 +99,38 @@ class QuestionAsk(HorizontalGroup):
             id="question_text",
             classes="cssquestion_text",
         )
+
+
+class ChatEntry(VerticalGroup):
+    """Date label, question and answer for a single chat."""
+
+    def __init__(self, date_info: str, question: str, answer: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.date_info = date_info
+        self.question = question
+        self.answer = answer
+        # a streaming entry is never swapped out for a placeholder
+        self.streaming = False
+        self.date_label = Label(date_info, classes="cssdate")
+        self.question_markdown = Markdown(question, classes="cssquestion")
+        self.answer_markdown = Markdown(answer, classes="cssanswer")
+
+    def compose(self) -> ComposeResult:
+        yield self.date_label
+        yield self.question_markdown
+        yield self.answer_markdown
+
+    def chat_record(self) -> dict:
+        return {
+            "date_info": self.date_info,
+            "question": self.question,
+            "answer": self.answer,
+        }
+
+    def update_answer(self, answer: str) -> AwaitComplete:
+        self.answer = answer
+        return self.answer_markdown.update(answer)
+
+    def update_date_info(self, date_info: str) -> None:
+        self.date_info = date_info
+        self.date_label.update(date_info)
@@ -1,13 +1,17 @@
 import pytest
 import datetime
+import json
 
 import httpx
 
-from unittest.mock import AsyncMock, patch
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
 from pathlib import Path
 
 from peewee import *
 
+from src.myllamatui.topics_contexts_categories import reset_lexical_indexes
+
 from src.myllamatui.db_models import (
     BaseModel,
     Context,
@@ -16,15 +20,40 @@ from src.myllamatui.db_models import (
     LLM_MODEL,
     Chat,
     CLI_Settings,
+    ModelMetadata,
+    ChatEmbedding,
+    ChatStats,
+    ClassificationJob,
+    TopicSummary,
 )
 
 # List all models you want to test
-TEST_MODELS = [Context, Topic, Category, LLM_MODEL, Chat, CLI_Settings]
+TEST_MODELS = [
+    Context,
+    Topic,
+    Category,
+    LLM_MODEL,
+    Chat,
+    CLI_Settings,
+    ModelMetadata,
+    ChatEmbedding,
+    ChatStats,
+    ClassificationJob,
+    TopicSummary,
+]
 
 # Create an in-memory SQLite database
 test_db = SqliteDatabase(":memory:")
 
 
+@pytest.fixture(autouse=True)
+def empty_lexical_indexes():
+    """Topic and category indexes are module level, start every test without them"""
+    reset_lexical_indexes()
+    yield
+    reset_lexical_indexes()
+
+
 @pytest.fixture(scope="function")
 def test_database():
     original_databases = {model: model._meta.database for model in TEST_MODELS}
@@ -152,3 +181,28 @@ def mock_delete():
     """Fixture to mock httpx.AsyncClient.post method."""
     with patch("httpx.AsyncClient.request", new_callable=AsyncMock) as mock:
         yield mock
+
+
+@pytest.fixture
+def mock_stream():
+    """Fixture to mock httpx.AsyncClient.stream with a list of NDJSON chunks.
+
+    Set mock.chunks to the dicts the server should stream back, and
+    mock.status_code to reply with an error status.
+    """
+    mock = MagicMock()
+    mock.chunks = []
+    mock.status_code = 200
+
+    @asynccontextmanager
+    async def fake_stream(self, method, url, **kwargs):
+        mock(method, url, **kwargs)
+        content = "\n".join(json.dumps(chunk) for chunk in mock.chunks).encode()
+        yield httpx.Response(
+            status_code=mock.status_code,
+            content=content,
+            request=httpx.Request(method, url),
+        )
+
+    with patch("httpx.AsyncClient.stream", new=fake_stream):
+        yield mock
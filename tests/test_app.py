@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from unittest.mock import AsyncMock, patch
+
+from src.myllamatui.app import MyLlamaTUI
+from src.myllamatui.db_models import LLM_MODEL, Chat
+from src.myllamatui.llm_models import clear_model_name_cache
+from src.myllamatui.setup_utils import CLI_DEFAULTS, initialize_db_defaults
+from src.myllamatui.widgets_and_screens.ui_modal_screens import KeepPartialAnswerScreen
+
+
+@pytest.fixture
+def app(test_database):
+    LLM_MODEL.create(
+        model="llama3:latest",
+        specialization="general",
+        size="1",
+        currently_available=True,
+    )
+    initialize_db_defaults()
+    clear_model_name_cache()
+
+    async def no_setup(self):
+        pass
+
+    # the tables are already in the test database, and Ollama isn't asked for
+    # the model's details
+    with patch.object(MyLlamaTUI, "on_load", no_setup), patch(
+        "src.myllamatui.app.ensure_model_metadata", new=AsyncMock()
+    ) as ensure_model_metadata:
+        yield MyLlamaTUI()
+    ensure_model_metadata.assert_awaited_with(CLI_DEFAULTS["url"], "llama3:latest")
+    clear_model_name_cache()
+
+
+def fake_stream_to_llm(started: asyncio.Event):
+    """Answers each question, the slow one never finishes until cancelled"""
+
+    async def stream_to_llm(api_endpoint, data):
+        question = data["messages"][-1]["content"]
+        yield {"message": {"content": f"{question} part"}, "done": False}
+        if question == "slow":
+            started.set()
+            await asyncio.Event().wait()
+        yield {"message": {"content": " done"}, "done": True}
+
+    return stream_to_llm
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "button, saved, roles",
+    [
+        (
+            "#keep_partial",
+            [("slow", "slow part"), ("fast", "fast part done")],
+            ["system", "user", "assistant", "user", "assistant"],
+        ),
+        (
+            "#discard_partial",
+            [("fast", "fast part done")],
+            ["system", "user", "assistant"],
+        ),
+    ],
+)
+async def test_cancel_answer_then_answer_queued_question(app, button, saved, roles):
+    started = asyncio.Event()
+
+    with patch("src.myllamatui.chats.stream_to_llm", new=fake_stream_to_llm(started)):
+        async with app.run_test() as pilot:
+            question_input = app.query_one("#question_text")
+            for question in ["slow", "fast"]:
+                question_input.value = question
+                await app.on_input_changed(None)
+            await asyncio.wait_for(started.wait(), timeout=5)
+            assert list(app.question_queue) == [("fast", "")]
+
+            app.action_cancel_answer()
+            while not isinstance(app.screen, KeepPartialAnswerScreen):
+                await pilot.pause(0.05)
+            await pilot.click(button)
+            await asyncio.wait_for(app.question_worker.wait(), timeout=5)
+
+    assert [(chat.question, chat.answer) for chat in Chat.select()] == saved
+    assert [message["role"] for message in app.LLM_MESSAGES] == roles
+    assert app.LLM_MESSAGES[-2:] == [
+        {"role": "user", "content": "fast"},
+        {"role": "assistant", "content": "fast part done"},
+    ]
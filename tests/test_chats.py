@@ -1,6 +1,9 @@
 import pytest
 import asyncio
 import httpx
+import json
+
+from datetime import datetime, timedelta
 
 from unittest.mock import MagicMock, Mock, patch
 
@@ -13,6 +16,8 @@ from src.myllamatui.db_models import (
     Context,
     CLI_Settings,
     LLM_MODEL,
+    ChatStats,
+    TopicSummary,
 )
 from src.myllamatui.topics_contexts_categories import (
     check_for_topic_and_category_match,
@@ -20,6 +25,7 @@ from src.myllamatui.topics_contexts_categories import (
     generate_current_topic_summary,
 )
 from src.myllamatui.llm_calls import (
+    OllamaError,
     generate_endpoint,
     generate_data_for_chat,
     generate_input_dict,
@@ -29,11 +35,21 @@ from src.myllamatui.llm_calls import (
 from src.myllamatui.chats import (
     save_chat,
     chat_with_llm_UI,
+    stream_chat_with_llm_UI,
     create_content_summary,
     create_and_apply_chat_topic_ui,
+    conversation_text,
     resume_previous_chats_ui,
     generate_topic_catgory,
     generate_chat_topic,
+    load_chat_page,
+    load_chats_by_id,
+    load_chats_since,
+    chat_page_cursor,
+    apply_system_prompt,
+    evaluation_messages,
+    stats_label,
+    chat_stats_label,
 )
 
 class MockTopic:
@@ -74,6 +90,173 @@ def test_save_chat(test_database):
     assert this_chat.answer == "test_answer"
 
 
+def test_save_chat_counts_model_usage(test_database):
+    LLM_MODEL.create(
+        model="model 1", specialization="general", size="1", currently_available=True
+    )
+
+    save_chat("q1", "a1", "1", "1", "1")
+    save_chat("q2", "a2", "1", "1", "1")
+
+    assert LLM_MODEL.get_by_id(1).usage_count == 2
+
+
+def test_save_chat_with_stats(test_database):
+    stats = {
+        "first_token_seconds": 0.5,
+        "prompt_tokens": 12,
+        "completion_tokens": 40,
+        "tokens_per_second": 20.0,
+        "error": "not a column",
+    }
+
+    with_stats = save_chat("q1", "a1", "1", "1", "1", stats=stats)
+    without_stats = save_chat("q2", "a2", "1", "1", "1")
+
+    saved = ChatStats.get(ChatStats.chat_id == with_stats.id)
+    assert (saved.first_token_seconds, saved.completion_tokens) == (0.5, 40)
+    assert saved.total_seconds is None
+    assert ChatStats.get_or_none(ChatStats.chat_id == without_stats.id) is None
+
+
+@pytest.mark.parametrize(
+    "stats, label",
+    [
+        (None, ""),
+        ({"first_token_seconds": 0.0}, "first token 0.0s"),
+        (
+            {
+                "first_token_seconds": 0.42,
+                "tokens_per_second": 35.26,
+                "prompt_tokens": 12,
+                "completion_tokens": 40,
+                "total_seconds": 1.63,
+            },
+            "first token 0.4s, 35.3 tokens/s, 12 prompt / 40 answer tokens, 1.6s total",
+        ),
+    ],
+)
+def test_stats_label(stats, label):
+    assert stats_label(stats) == label
+
+
+def test_conversation_text():
+    messages = []
+    for turn in range(3):
+        messages += [
+            {"role": "system", "content": "context"},
+            {"role": "user", "content": f"q{turn}"},
+            {"role": "assistant", "content": f"a{turn}"},
+        ]
+
+    assert conversation_text(messages, turns=2) == "q1 a1 q2 a2"
+    assert conversation_text(["Funny Jokes"]) == "Funny Jokes"
+
+    # one system prompt, then a question and answer per turn
+    messages = [{"role": "system", "content": "context"}]
+    for turn in range(4):
+        messages += [
+            {"role": "user", "content": f"q{turn}"},
+            {"role": "assistant", "content": f"a{turn}"},
+        ]
+
+    assert conversation_text(messages, turns=2) == "q2 a2 q3 a3"
+    assert conversation_text(messages, turns=9) == "q0 a0 q1 a1 q2 a2 q3 a3"
+
+
+def test_load_chat_page(test_database):
+    start = datetime(2025, 1, 1)
+    for i in range(7):
+        # two chats share a timestamp so the id breaks the tie
+        Chat.create(
+            question=f"q{i}",
+            answer="a",
+            context_id=1,
+            topic_id=2 if i != 3 else 1,
+            llm_model_id=1,
+            created_at=start + timedelta(minutes=min(i, 5)),
+        )
+
+    pages = []
+    page = load_chat_page(2, limit=2)
+    pages.append([chat.question for chat in page])
+    cursor = chat_page_cursor(page, limit=2)
+    while cursor is not None:
+        page = load_chat_page(2, before=cursor, limit=2)
+        pages.append([chat.question for chat in page])
+        cursor = chat_page_cursor(page, limit=2)
+
+    assert pages == [["q5", "q6"], ["q2", "q4"], ["q0", "q1"], []]
+
+
+def test_load_chats_since(test_database):
+    start = datetime(2025, 1, 1)
+    chats = [
+        Chat.create(
+            question=f"q{i}",
+            answer="a",
+            context_id=1,
+            topic_id=1,
+            llm_model_id=1,
+            created_at=start + timedelta(minutes=i),
+        )
+        for i in range(6)
+    ]
+
+    def questions(page):
+        return [chat.question for chat in page]
+
+    # an old chat brings every later one with it
+    since = (chats[1].created_at, chats[1].id)
+    page = load_chats_since(1, since, limit=2)
+    assert questions(page) == ["q1", "q2", "q3", "q4", "q5"]
+    # a recent one still loads a whole page
+    since = (chats[5].created_at, chats[5].id)
+    assert questions(load_chats_since(1, since, limit=3)) == ["q3", "q4", "q5"]
+
+
+def test_load_chats_by_id(test_database):
+    LLM_MODEL.create(model="model 1", specialization="general", size="1", currently_available=True
+    )
+    Context.create(text="context 1")
+    Category.create(text="category 1")
+    Topic.create(text="topic 1", category_id=1)
+    second = Chat.create(
+        question="q2", answer="a", context_id=1, topic_id=1, llm_model_id=1
+    )
+    first = Chat.create(
+        question="q1",
+        answer="a",
+        context_id=1,
+        topic_id=1,
+        llm_model_id=1,
+        created_at=datetime(2025, 1, 1),
+    )
+
+    chats = load_chats_by_id([second.id, first.id])
+
+    assert [chat.question for chat in chats] == ["q1", "q2"]
+    # related rows come back with the chats rather than one query each
+    for chat in chats:
+        assert chat.__rel__["llm_model_id"].model == "model 1"
+        assert chat.__rel__["context_id"].text == "context 1"
+        assert chat.__rel__["topic_id"].text == "topic 1"
+
+
+def test_load_chats_by_id_with_stats(test_database):
+    LLM_MODEL.create(model="model 1", specialization="general", size="1", currently_available=True
+    )
+    Context.create(text="context 1")
+    Category.create(text="category 1")
+    Topic.create(text="topic 1", category_id=1)
+    with_stats = save_chat("q1", "a", 1, 1, 1, stats={"tokens_per_second": 20.0})
+    without_stats = save_chat("q2", "a", 1, 1, 1)
+
+    chats = load_chats_by_id([with_stats.id, without_stats.id])
+
+    assert [chat_stats_label(chat) for chat in chats] == ["20.0 tokens/s", ""]
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "returned_answer, messages_answer",
@@ -104,6 +287,151 @@ async def test_chat_with_llm_UI(mock_post, returned_answer, messages_answer):
     ]
 
 
+@pytest.mark.asyncio
+async def test_stream_chat_with_llm_UI(mock_stream):
+    url = "http://fakeexmple.nope"
+    MESSAGES = []
+    mock_stream.chunks = [
+        {"message": {"role": "assistant", "content": "4"}, "done": False},
+        {"message": {"role": "assistant", "content": "2"}, "done": False},
+        {"message": {"role": "assistant", "content": ""}, "done": True},
+    ]
+
+    partial_answers = [
+        answer
+        async for answer in stream_chat_with_llm_UI(
+            url, "What is the meaning of life?", "A long context text.", MESSAGES, "fake_model"
+        )
+    ]
+
+    assert partial_answers == ["4", "42", "42"]
+    assert mock_stream.call_args.kwargs["json"]["stream"] == True
+    assert MESSAGES == [
+        {"role": "system", "content": "A long context text."},
+        {"role": "user", "content": "What is the meaning of life?"},
+        {"role": "assistant", "content": "42"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_with_llm_UI_error(mock_stream):
+    MESSAGES = []
+    mock_stream.chunks = [
+        {"message": {"role": "assistant", "content": "4"}, "done": False},
+        {"error": "model 'bad' not found"},
+    ]
+
+    with pytest.raises(OllamaError):
+        async for answer in stream_chat_with_llm_UI(
+            "http://fakeexmple.nope", "question", "context", MESSAGES, "bad"
+        ):
+            pass
+
+    # the error is never added as an answer
+    assert [message["role"] for message in MESSAGES] == ["system", "user"]
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_with_llm_UI_stats(mock_stream):
+    stats = {}
+    mock_stream.chunks = [
+        {"message": {"role": "assistant", "content": "42"}, "done": False},
+        {
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "prompt_eval_count": 12,
+            "eval_count": 40,
+            "eval_duration": 2_000_000_000,
+            "total_duration": 3_000_000_000,
+        },
+    ]
+
+    async for answer in stream_chat_with_llm_UI(
+        "http://fakeexmple.nope", "question", "context", [], "fake_model", stats=stats
+    ):
+        pass
+
+    assert stats["first_token_seconds"] >= 0
+    assert stats["prompt_tokens"] == 12
+    assert stats["completion_tokens"] == 40
+    assert stats["tokens_per_second"] == 20.0
+    assert stats["total_seconds"] == 3.0
+
+
+def test_apply_system_prompt():
+    MESSAGES = [
+        {"role": "system", "content": "old context"},
+        {"role": "user", "content": "q1"},
+        {"role": "assistant", "content": "a1"},
+        {"role": "system", "content": "old context"},
+        {"role": "user", "content": "q2"},
+    ]
+
+    assert apply_system_prompt(MESSAGES, "new context") is MESSAGES
+    assert MESSAGES == [
+        {"role": "system", "content": "new context"},
+        {"role": "user", "content": "q1"},
+        {"role": "assistant", "content": "a1"},
+        {"role": "user", "content": "q2"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_with_llm_UI_keeps_prefix(mock_stream):
+    """Each request starts with the whole of the previous one, byte for byte"""
+
+    sent = []
+    mock_stream.side_effect = lambda method, url, **kwargs: sent.append(
+        json.dumps(kwargs["json"]["messages"])
+    )
+    mock_stream.chunks = [
+        {"message": {"role": "assistant", "content": "42"}, "done": True},
+    ]
+    MESSAGES = []
+
+    for turn in range(3):
+        async for _ in stream_chat_with_llm_UI(
+            "http://fakeexmple.nope", f"Question {turn}", "context", MESSAGES, "fake"
+        ):
+            pass
+        # the evaluation pass works on its own copy
+        evaluation = evaluation_messages(MESSAGES, "evaluate")
+        async for _ in stream_chat_with_llm_UI(
+            "http://fakeexmple.nope", "Evaluate", "evaluate", evaluation, "fake"
+        ):
+            pass
+
+    primary = sent[::2]
+    for previous, current in zip(primary, primary[1:]):
+        # the previous request without its closing bracket
+        assert current.startswith(previous[:-1])
+    assert [message["role"] for message in MESSAGES].count("system") == 1
+    assert len(MESSAGES) == 7
+    assert json.loads(sent[-1])[0] == {"role": "system", "content": "evaluate"}
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_with_llm_UI_token_budget(mock_stream):
+    mock_stream.chunks = [
+        {"message": {"role": "assistant", "content": "42"}, "done": True},
+    ]
+    MESSAGES = [
+        {"role": "user", "content": "old question " * 100},
+        {"role": "assistant", "content": "old answer " * 100},
+    ]
+
+    async for _ in stream_chat_with_llm_UI(
+        "http://fakeexmple.nope", "New question", "context", MESSAGES, "fake", 100
+    ):
+        pass
+
+    assert [message["content"] for message in MESSAGES] == [
+        "context",
+        "New question",
+        "42",
+    ]
+
+
 @pytest.mark.asyncio
 async def test_create_content_summary(mock_post):
     url = "http://fakeexmple.nope"
@@ -175,6 +503,41 @@ def test_resume_previous_chats_ui(
     assert context_text in MESSAGES[0]["content"]
 
 
+def test_resume_previous_chats_ui_with_summary(test_database):
+    Context.create(text="friendly and helpful")
+    Category.create(text="category 1")
+    Topic.create(text="topic 1", category_id=1)
+    chats = [
+        Chat.create(
+            question=f"q{number}",
+            answer=f"a{number}",
+            context_id=1,
+            topic_id=1,
+            llm_model_id=1,
+        )
+        for number in range(1, 4)
+    ]
+    TopicSummary.create(topic_id=1, summary="Asked q1 and q2", last_chat_id=2)
+
+    MESSAGES, topic_id = resume_previous_chats_ui(chats)
+
+    assert topic_id == "1"
+    assert MESSAGES == [
+        {
+            "role": "system",
+            "content": "friendly and helpful\n\n"
+            "Summary of the earlier conversation: Asked q1 and q2",
+        },
+        {"role": "user", "content": "q3"},
+        {"role": "assistant", "content": "a3"},
+    ]
+
+    MESSAGES, _ = resume_previous_chats_ui(chats, with_summary=False)
+
+    assert MESSAGES[0]["content"] == "friendly and helpful"
+    assert len(MESSAGES) == 7
+
+
 @pytest.mark.asyncio
 async def test_generate_chat_topic(mock_post):
     url = "http://fakeexmple.nope"
@@ -217,6 +580,56 @@ async def test_create_and_apply_chat_topic_ui_topic_match(mock_select, mock_post
     assert topic_id == 2
     mock_post.assert_called_once()
     assert mock_select.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("src.myllamatui.db_models.Topic.select")
+async def test_create_and_apply_chat_topic_ui_embedding_match(mock_select, mock_post):
+    url = "http://fakeexmple.nope"
+    mock_select.return_value = [
+        MockTopic(text="default", id=1),
+        MockTopic(text="Dad Jokes", id=2),
+    ]
+    embed_request = httpx.Request("POST", url + "/api/embed")
+    mock_post.side_effect = [
+        httpx.Response(status_code=200, json={"response": "Knock knock"}),
+        httpx.Response(
+            status_code=200,
+            json={"embeddings": [[0.6, 0.8], [1.0, 0.0], [0.0, 1.0]]},
+            request=embed_request,
+        ),
+    ]
+
+    topic_id = await create_and_apply_chat_topic_ui(
+        url, ["Funny Jokes"], "fakegpt", embedding_model="embed-topics"
+    )
+
+    # no words shared with "Dad Jokes", matched by meaning
+    assert topic_id == 2
+    assert mock_post.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("src.myllamatui.db_models.Topic.select")
+async def test_create_and_apply_chat_topic_ui_embedding_fallback(mock_select, mock_post):
+    url = "http://fakeexmple.nope"
+    mock_select.return_value = [
+        MockTopic(text="default", id=1),
+        MockTopic(text="Dad Jokes", id=2),
+    ]
+    mock_post.side_effect = [
+        httpx.Response(status_code=200, json={"response": "Dad Jokes"}),
+        httpx.ConnectError("embedding model unavailable"),
+    ]
+
+    topic_id = await create_and_apply_chat_topic_ui(
+        url, ["Funny Jokes"], "fakegpt", embedding_model="embed-topics"
+    )
+
+    # word overlap still finds the topic
+    assert topic_id == 2
+
+
 #### failing ####
 # new topic and old Category
 @pytest.mark.asyncio
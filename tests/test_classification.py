@@ -0,0 +1,177 @@
+import asyncio
+import json
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from src.myllamatui.classification import (
+    MAX_JOB_ATTEMPTS,
+    enqueue_classification,
+    group_default_topic_chats,
+    next_classification_job,
+    reclassify_default_topic_chats,
+    run_classification_job,
+)
+from src.myllamatui.db_models import (
+    Category,
+    Chat,
+    ClassificationJob,
+    Context,
+    Topic,
+)
+
+URL = "http://fakeexample.nope"
+MESSAGES = [{"role": "user", "content": "Tell me a dad joke"}]
+
+
+@pytest.fixture
+def topics(test_database):
+    Category.create(text="default")
+    Category.create(text="Jokes")
+    Topic.create(text="default", category_id=1)
+    Topic.create(text="Dad Jokes", category_id=2)
+
+
+def add_chat(topic_id=1, context_id=1, created_at=None):
+    return Chat.create(
+        question="q",
+        answer="a",
+        context_id=context_id,
+        topic_id=topic_id,
+        llm_model_id=1,
+        created_at=created_at or datetime.now(),
+    )
+
+
+def test_enqueue_classification(topics):
+    assert enqueue_classification(MESSAGES, "fakegpt") is None
+
+    add_chat()
+    add_chat(topic_id=2)
+    job = enqueue_classification(MESSAGES, "fakegpt")
+    assert json.loads(job.chat_ids) == [1]
+    assert json.loads(job.messages) == MESSAGES
+    assert job.status == "pending"
+
+    # queued chats are not queued twice
+    add_chat()
+    assert json.loads(enqueue_classification(MESSAGES, "fakegpt").chat_ids) == [3]
+    assert enqueue_classification(MESSAGES, "fakegpt") is None
+
+
+def test_next_classification_job_resumes_interrupted(topics):
+    ClassificationJob.create(chat_ids="[]", messages="[]", model="m", status="done")
+    running = ClassificationJob.create(
+        chat_ids="[]", messages="[]", model="m", status="running"
+    )
+    ClassificationJob.create(chat_ids="[]", messages="[]", model="m")
+
+    assert next_classification_job() == running
+
+
+@pytest.mark.asyncio
+async def test_run_classification_job(topics, mock_post):
+    add_chat()
+    add_chat()
+    job = enqueue_classification(MESSAGES, "fakegpt")
+    # moved by hand while the job waited
+    Chat.update(topic_id=2).where(Chat.id == 2).execute()
+    Topic.create(text="Other", category_id=1)
+    mock_post.return_value = httpx.Response(
+        status_code=200, json={"response": "Dad Jokes"}
+    )
+
+    assert await run_classification_job(URL, job) == 2
+
+    assert [chat.topic_id_id for chat in Chat.select()] == [2, 2]
+    job = ClassificationJob.get_by_id(job.id)
+    assert (job.status, job.topic_id_id, job.attempts) == ("done", 2, 1)
+    assert next_classification_job() is None
+
+
+@pytest.mark.asyncio
+async def test_run_classification_job_failures(topics, mock_post):
+    add_chat()
+    job = enqueue_classification(MESSAGES, "fakegpt")
+    mock_post.side_effect = httpx.ConnectError("ollama is not running")
+
+    for attempt in range(1, MAX_JOB_ATTEMPTS + 1):
+        assert await run_classification_job(URL, next_classification_job()) is None
+        job = ClassificationJob.get_by_id(job.id)
+        assert job.attempts == attempt
+
+    assert job.status == "failed"
+    assert "ollama is not running" in job.error
+    assert Chat.get_by_id(1).topic_id_id == 1
+
+
+def test_group_default_topic_chats(topics):
+    start = datetime(2024, 1, 1, 9)
+    for minutes in [0, 10, 20]:
+        add_chat(created_at=start + timedelta(minutes=minutes))
+    # after a gap
+    add_chat(created_at=start + timedelta(hours=2))
+    # a different context
+    add_chat(context_id=2, created_at=start + timedelta(hours=2, minutes=1))
+    # already classified or queued
+    add_chat(topic_id=2, created_at=start + timedelta(hours=2, minutes=2))
+    ClassificationJob.create(chat_ids="[1]", messages="[]", model="m")
+
+    groups = group_default_topic_chats()
+    assert [[chat.id for chat in group] for group in groups] == [[2, 3], [4], [5]]
+
+    groups = group_default_topic_chats(group_size=1)
+    assert [[chat.id for chat in group] for group in groups] == [[2], [3], [4], [5]]
+
+
+@pytest.mark.asyncio
+async def test_reclassify_default_topic_chats(topics, mock_post):
+    Context.create(text="friendly and helpful")
+    start = datetime(2024, 1, 1, 9)
+    for hours in [0, 0, 1, 2, 3]:
+        add_chat(created_at=start + timedelta(hours=hours, minutes=len(Chat)))
+    mock_post.return_value = httpx.Response(
+        status_code=200, json={"message": {"content": "Dad Jokes"}}
+    )
+
+    stats = await reclassify_default_topic_chats(URL, "fakegpt", commit_size=2)
+
+    assert (stats["groups"], stats["chats"], stats["failed_groups"]) == (4, 5, 0)
+    assert stats["chats_per_second"] > 0
+    assert {chat.topic_id_id for chat in Chat.select()} == {2}
+    assert mock_post.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_reclassify_default_topic_chats_concurrency(topics):
+    Context.create(text="friendly and helpful")
+    for hours in range(6):
+        add_chat(created_at=datetime(2024, 1, 1) + timedelta(hours=hours))
+    running = []
+    most_running = 0
+    calls = 0
+
+    async def classify(url, messages, model_name, embedding_model=None):
+        nonlocal most_running, calls
+        calls += 1
+        call = calls
+        running.append(model_name)
+        most_running = max(most_running, len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        if call <= 2:
+            raise httpx.ConnectError("ollama is not running")
+        return 2
+
+    with patch(
+        "src.myllamatui.classification.create_and_apply_chat_topic_ui", classify
+    ):
+        stats = await reclassify_default_topic_chats(URL, "fakegpt", concurrency=2)
+
+    assert most_running == 2
+    assert stats["failed_groups"] == 2
+    # the failed groups stay under the default topic
+    assert len(Chat.select().where(Chat.topic_id == 1)) == 2
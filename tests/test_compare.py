@@ -0,0 +1,91 @@
+import httpx
+import pytest
+
+from src.myllamatui.compare import compare_models, speed_label
+
+URL = "http://fakeexample.nope"
+
+
+@pytest.mark.asyncio
+async def test_compare_models(test_database, mock_stream):
+    def fail_for_qwen(method, url, **kwargs):
+        if kwargs["json"]["model"] == "qwen":
+            raise httpx.ConnectError("model not loaded")
+
+    mock_stream.side_effect = fail_for_qwen
+    mock_stream.chunks = [
+        {"message": {"role": "assistant", "content": "4"}, "done": False},
+        {"message": {"role": "assistant", "content": "2"}, "done": False},
+        {
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "eval_count": 20,
+            "eval_duration": 500_000_000,
+        },
+    ]
+    history = [{"role": "system", "content": "context"}]
+    conversations = {"llama": list(history), "qwen": list(history)}
+    updates = []
+
+    results = await compare_models(
+        URL,
+        "Meaning of life?",
+        "context",
+        conversations,
+        lambda model_name, answer: updates.append((model_name, answer)),
+    )
+
+    answer, stats = results["llama"]
+    assert answer == "42"
+    assert stats["tokens_per_second"] == 40.0
+    assert stats["first_token_seconds"] >= 0
+    assert updates == [("llama", "4"), ("llama", "42"), ("llama", "42")]
+    assert [message["role"] for message in conversations["llama"]] == [
+        "system",
+        "user",
+        "assistant",
+    ]
+
+    # a failed model keeps its conversation as it was
+    assert results["qwen"][1]["error"] == "model not loaded"
+    assert conversations["qwen"] == history
+
+
+@pytest.mark.asyncio
+async def test_compare_models_ollama_error(test_database, mock_stream):
+    def error_for_bad(method, url, **kwargs):
+        if kwargs["json"]["model"] == "bad":
+            mock_stream.chunks = [{"error": "model 'bad' not found"}]
+        else:
+            mock_stream.chunks = [
+                {"message": {"role": "assistant", "content": "42"}, "done": True}
+            ]
+
+    mock_stream.side_effect = error_for_bad
+    history = [{"role": "system", "content": "context"}]
+    conversations = {"llama": list(history), "bad": list(history)}
+
+    results = await compare_models(
+        URL, "Meaning of life?", "context", conversations, lambda *args: None
+    )
+
+    assert results["llama"][0] == "42"
+    assert "error" not in results["llama"][1]
+    # an error reply fails the model rather than becoming its answer
+    assert results["bad"][1]["error"] == "model 'bad' not found"
+    assert conversations["bad"] == history
+
+
+@pytest.mark.parametrize(
+    "stats, label",
+    [
+        (
+            {"first_token_seconds": 0.42, "tokens_per_second": 35.26},
+            "first token 0.4s, 35.3 tokens/s",
+        ),
+        ({"first_token_seconds": 1.0, "tokens_per_second": None}, "first token 1.0s"),
+        ({"error": "timed out"}, "failed: timed out"),
+    ],
+)
+def test_speed_label(stats, label):
+    assert speed_label(stats) == label
@@ -0,0 +1,80 @@
+import pytest
+
+from src.myllamatui.context_window import (
+    DEFAULT_NUM_CTX,
+    context_budget,
+    context_usage_label,
+    estimate_message_tokens,
+    estimate_tokens,
+    model_context_window,
+    trim_to_budget,
+)
+from src.myllamatui.db_models import ModelMetadata
+
+
+def add_metadata(model, num_ctx=None, context_length=None):
+    ModelMetadata.create(
+        digest=f"sha256:{model}",
+        model=model,
+        capabilities="[]",
+        specialization="general",
+        num_ctx=num_ctx,
+        context_length=context_length,
+    )
+
+
+def turn(number, size=40):
+    return [
+        {"role": "user", "content": f"q{number}".ljust(size)},
+        {"role": "assistant", "content": f"a{number}".ljust(size)},
+    ]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_message_tokens([{"role": "user", "content": "abcd"}]) == 5
+
+
+@pytest.mark.parametrize(
+    "num_ctx, context_length, window",
+    [
+        (None, None, DEFAULT_NUM_CTX),
+        (8192, 131072, 8192),
+        (None, 131072, DEFAULT_NUM_CTX),
+        (32768, 8192, 8192),
+    ],
+)
+def test_model_context_window(test_database, num_ctx, context_length, window):
+    add_metadata("llama3:latest", num_ctx, context_length)
+
+    assert model_context_window("llama3:latest") == window
+    assert model_context_window("unknown:latest") == DEFAULT_NUM_CTX
+    assert context_budget("llama3:latest", ratio=0.5) == window // 2
+
+
+def test_trim_to_budget():
+    system = {"role": "system", "content": "context"}
+    MESSAGES = [system] + turn(1) + turn(2) + turn(3) + turn(4)[:1]
+    # 7 turns of 14 tokens and a 6 token system prompt
+    assert estimate_message_tokens(MESSAGES) == 104
+
+    assert trim_to_budget(MESSAGES, budget=104) == 0
+
+    # over budget, trims to 60% of it, a whole turn at a time
+    assert trim_to_budget(MESSAGES, budget=100) == 4
+    assert MESSAGES == [system] + turn(3) + turn(4)[:1]
+
+    # never drops the system prompt or the latest question
+    assert trim_to_budget(MESSAGES, budget=1) == 2
+    assert MESSAGES == [system] + turn(4)[:1]
+
+
+def test_context_usage_label(test_database):
+    add_metadata("llama3:latest", num_ctx=8192)
+    MESSAGES = [{"role": "user", "content": "x" * 4000}]
+
+    assert context_usage_label(MESSAGES, "llama3:latest") == (
+        "Context 1,004 / 8,192 tokens"
+    )
@@ -7,6 +7,7 @@ from src.myllamatui.db_models import (
     LLM_MODEL,
     Chat,
     CLI_Settings,
+    SQLITE_DB,
 )
 
 
@@ -125,3 +126,16 @@ def test_cli_settings_creation(test_database):
     assert str(result.topic_id) == str(test_topic.id)
     assert str(result.context_id) == str(test_context.id)
     assert str(result.llm_model_id) == str(test_model.id)
+
+
+def test_chat_indexes(test_database):
+    indexes = {index.name: index.columns for index in Chat._meta.database.get_indexes("chat")}
+    assert indexes["chat_topic_id_created_at_id"] == ["topic_id", "created_at", "id"]
+    assert indexes["chat_llm_model_id_created_at"] == ["llm_model_id", "created_at"]
+    assert indexes["chat_created_at"] == ["created_at"]
+
+
+def test_sqlite_pragmas():
+    pragmas = dict(SQLITE_DB._pragmas)
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == "normal"
@@ -0,0 +1,162 @@
+import httpx
+import numpy as np
+import pytest
+
+from src.myllamatui.db_models import Category, Chat, ChatEmbedding, LLM_MODEL, Topic
+from src.myllamatui.embeddings import (
+    ChatVectorIndex,
+    LABEL_EMBEDDINGS,
+    chats_to_embed,
+    index_chats,
+    match_label_by_embedding,
+    select_embedding_model,
+    semantic_search_chats,
+)
+
+URL = "http://fakeexample.nope"
+
+
+def embed_response(vectors):
+    return httpx.Response(
+        status_code=200,
+        json={"embeddings": vectors},
+        request=httpx.Request("POST", URL + "/api/embed"),
+    )
+
+
+def add_chat(question):
+    return Chat.create(
+        question=question, answer="a", context_id=1, topic_id=1, llm_model_id=1
+    )
+
+
+def test_select_embedding_model(test_database):
+    LLM_MODEL.create(
+        model="llama3", specialization="general", size=1, currently_available=True
+    )
+    assert select_embedding_model() is None
+
+    LLM_MODEL.create(
+        model="old-embed", specialization="embedding", size=1, currently_available=False
+    )
+    LLM_MODEL.create(
+        model="nomic-embed-text",
+        specialization="embedding",
+        size=1,
+        currently_available=True,
+    )
+    assert select_embedding_model() == "nomic-embed-text"
+
+
+@pytest.mark.asyncio
+async def test_index_chats_batches_and_normalizes(test_database, mock_post):
+    for i in range(3):
+        add_chat(f"q{i}")
+    mock_post.side_effect = [
+        embed_response([[3.0, 4.0], [0.0, 2.0]]),
+        embed_response([[1.0, 0.0]]),
+    ]
+
+    assert await index_chats(URL, "embed-a", batch_size=2) == 3
+
+    assert mock_post.call_count == 2
+    assert mock_post.call_args_list[0].kwargs["json"]["input"] == ["q0\n\na", "q1\n\na"]
+    first = ChatEmbedding.get(ChatEmbedding.chat_id == 1)
+    assert first.dimensions == 2
+    assert np.frombuffer(first.vector, dtype=np.float32).tolist() == pytest.approx(
+        [0.6, 0.8]
+    )
+    # nothing left to do
+    assert chats_to_embed("embed-a") == []
+
+
+@pytest.mark.asyncio
+async def test_index_chats_reembeds_on_model_change(test_database, mock_post):
+    add_chat("q0")
+    mock_post.return_value = embed_response([[1.0, 0.0]])
+    await index_chats(URL, "embed-a")
+
+    assert [chat.id for chat in chats_to_embed("embed-b")] == [1]
+
+    mock_post.return_value = embed_response([[0.0, 1.0, 0.0]])
+    assert await index_chats(URL, "embed-b") == 1
+    embedding = ChatEmbedding.get(ChatEmbedding.chat_id == 1)
+    assert (embedding.model, embedding.dimensions) == ("embed-b", 3)
+    assert ChatEmbedding.select().count() == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_vector_index_is_incremental(test_database, mock_post):
+    for i in range(3):
+        add_chat(f"q{i}")
+    mock_post.return_value = embed_response([[1.0, 0.0], [0.6, 0.8], [0.0, 1.0]])
+    await index_chats(URL, "embed-a")
+
+    index = ChatVectorIndex("embed-a")
+    assert index.nearest(np.array([1.0, 0.0], dtype=np.float32), limit=2) == [
+        (1, pytest.approx(1.0)),
+        (2, pytest.approx(0.6)),
+    ]
+
+    add_chat("q3")
+    mock_post.return_value = embed_response([[0.8, 0.6]])
+    await index_chats(URL, "embed-a")
+
+    # only the new row is read
+    assert [chat_id for chat_id, _ in index.nearest(np.array([1.0, 0.0]))] == [
+        1,
+        4,
+        2,
+        3,
+    ]
+    assert index.matrix.shape == (4, 2)
+
+
+@pytest.mark.asyncio
+async def test_semantic_search_chats(test_database, mock_post):
+    Category.create(text="category 1")
+    Topic.create(text="topic 1", category_id=1)
+    add_chat("q0")
+    add_chat("q1")
+    mock_post.return_value = embed_response([[1.0, 0.0], [0.0, 1.0]])
+    await index_chats(URL, "embed-search")
+
+    mock_post.return_value = embed_response([[0.1, 1.0]])
+    results = await semantic_search_chats(URL, "q1?", "embed-search")
+
+    assert [result["chat_id"] for result in results] == [2, 1]
+    assert results[0]["topic"].startswith("topic 1")
+
+
+@pytest.mark.asyncio
+async def test_match_label_by_embedding(test_database, mock_post):
+    LABEL_EMBEDDINGS.clear()
+    Category.create(text="category 1")
+    Topic.create(text="Python Textual", category_id=1)
+    Topic.create(text="Dad Jokes", category_id=1)
+
+    # text first, then the two labels
+    mock_post.return_value = embed_response([[0.9, 0.1], [1.0, 0.0], [0.0, 1.0]])
+    assert await match_label_by_embedding(URL, "embed-a", "TUI", Topic.select()) == 1
+    assert mock_post.call_args.kwargs["json"]["input"] == [
+        "TUI",
+        "Python Textual",
+        "Dad Jokes",
+    ]
+
+    # labels are cached, only the text is embedded. Below the threshold is no match.
+    mock_post.return_value = embed_response([[0.6, 0.6]])
+    assert (
+        await match_label_by_embedding(
+            URL, "embed-a", "Cooking", Topic.select(), threshold=0.8
+        )
+        is None
+    )
+    assert mock_post.call_args.kwargs["json"]["input"] == ["Cooking"]
+
+    # an edited label is embedded again
+    Topic.update(text="Knock Knock Jokes").where(Topic.id == 2).execute()
+    mock_post.return_value = embed_response([[0.0, 1.0], [0.0, 1.0]])
+    assert await match_label_by_embedding(URL, "embed-a", "Jokes", Topic.select()) == 2
+    assert mock_post.call_args.kwargs["json"]["input"] == ["Jokes", "Knock Knock Jokes"]
+    LABEL_EMBEDDINGS.clear()
@@ -6,11 +6,18 @@ from src.myllamatui.llm_calls import (
     generate_endpoint,
     generate_data_for_chat,
     generate_data_for_model_pull,
+    generate_data_for_embed,
     generate_input_dict,
     parse_response,
+    OllamaError,
+    parse_stream_chunk,
+    parse_stream_stats,
     post_to_llm,
     get_from_llm,
     delete_llm_call,
+    stream_to_llm,
+    get_http_client,
+    close_http_client,
 )
 
 
@@ -78,6 +85,41 @@ async def test_delete_llm_call(mock_delete):
     assert response.json() == {"deleted": True}
 
 
+@pytest.mark.asyncio
+async def test_stream_to_llm(mock_stream):
+    mock_stream.chunks = [
+        {"message": {"content": "Hel"}, "done": False},
+        {"message": {"content": "lo"}, "done": True},
+    ]
+    api_endpoint = "https://example.com/api/chat"
+    data = {"key": "value"}
+
+    chunks = [chunk async for chunk in stream_to_llm(api_endpoint, data)]
+
+    mock_stream.assert_called_once_with("POST", api_endpoint, json=data, timeout=900.0)
+    assert chunks == mock_stream.chunks
+
+
+@pytest.mark.asyncio
+async def test_stream_to_llm_error_status(mock_stream):
+    mock_stream.status_code = 404
+    mock_stream.chunks = [{"error": "model 'bad' not found"}]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        [chunk async for chunk in stream_to_llm("https://example.com/api/chat", {})]
+
+
+@pytest.mark.asyncio
+async def test_get_http_client_is_shared():
+    client = get_http_client()
+    assert get_http_client() is client
+
+    await close_http_client()
+    assert client.is_closed
+    assert get_http_client() is not client
+    await close_http_client()
+
+
 def test_generate_endpoint():
     url = "http://example.com"
     action = "show_list"
@@ -96,12 +138,26 @@ def test_generate_data_for_chat():
     }
 
 
+def test_generate_data_for_chat_stream():
+    MESSAGES = [{"role": "user", "content": "Hello"}]
+    data = generate_data_for_chat(MESSAGES, "gpt-3.5-turbo", stream=True)
+    assert data["stream"] == True
+
+
 def test_generate_data_for_model_pull():
     model = "gpt-3.5-turbo"
     data = generate_data_for_model_pull(model)
     assert data == {"model": "gpt-3.5-turbo"}
 
 
+def test_generate_data_for_embed():
+    assert generate_endpoint("http://example.com", "embed") == (
+        "http://example.com/api/embed"
+    )
+    data = generate_data_for_embed(["one", "two"], "nomic-embed-text")
+    assert data == {"model": "nomic-embed-text", "input": ["one", "two"]}
+
+
 def test_generate_input_dict():
     input_text = "Hello, world!"
     data = generate_input_dict(input_text)
@@ -120,3 +176,44 @@ def test_parse_response_response():
     key, answer = parse_response(response_json)
     assert key == "response"
     assert answer == "This is a response"
+
+
+@pytest.mark.parametrize(
+    "chunk, content, done",
+    [
+        ({"message": {"role": "assistant", "content": "Hi"}, "done": False}, "Hi", False),
+        ({"message": {"role": "assistant", "content": ""}, "done": True}, "", True),
+        ({"response": "Hi", "done": False}, "Hi", False),
+    ],
+)
+def test_parse_stream_chunk(chunk, content, done):
+    assert parse_stream_chunk(chunk) == (content, done)
+
+
+def test_parse_stream_chunk_error():
+    with pytest.raises(OllamaError, match="model not found"):
+        parse_stream_chunk({"error": "model not found"})
+
+
+def test_parse_stream_stats():
+    chunk = {
+        "done": True,
+        "total_duration": 2_500_000_000,
+        "load_duration": 500_000_000,
+        "prompt_eval_count": 26,
+        "prompt_eval_duration": 200_000_000,
+        "eval_count": 90,
+        "eval_duration": 1_800_000_000,
+    }
+
+    assert parse_stream_stats(chunk) == {
+        "prompt_tokens": 26,
+        "completion_tokens": 90,
+        "tokens_per_second": 50.0,
+        "load_seconds": 0.5,
+        "prompt_seconds": 0.2,
+        "eval_seconds": 1.8,
+        "total_seconds": 2.5,
+    }
+    # an error chunk has no counts
+    assert parse_stream_stats({"error": "model not found"})["tokens_per_second"] is None
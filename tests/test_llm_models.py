@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 import pytest
@@ -6,6 +7,7 @@ import httpx
 from unittest.mock import patch, AsyncMock
 
 # Import your functions from the module you want to test
+from src.myllamatui.llm_calls import OllamaError
 from src.myllamatui.llm_models import (
     parse_model_list,
     get_raw_model_list,
@@ -14,9 +16,17 @@ from src.myllamatui.llm_models import (
     pull_and_parse_model_capabilities,
     parse_model_name_for_skill,
     get_model_capabilities,
+    get_capabilities_for_models,
+    get_model_metadata,
+    cached_model_metadata,
+    ensure_model_metadata,
+    parse_model_info,
     add_model_if_not_present,
     align_db_and_ollama,
     model_choice_setup,
+    model_names_by_id,
+    model_name_for_id,
+    clear_model_name_cache,
 )
 
 # Mock the functions from your dependencies
@@ -26,7 +36,27 @@ from src.myllamatui.llm_calls import (
 )
 
 # Mock the database models
-from src.myllamatui.db_models import LLM_MODEL
+from src.myllamatui.db_models import LLM_MODEL, ModelMetadata
+
+SHOW_REPLY = {
+    "capabilities": ["completion", "vision"],
+    "details": {
+        "family": "gemma3",
+        "parameter_size": "4.3B",
+        "quantization_level": "Q4_K_M",
+    },
+    "model_info": {"gemma3.context_length": 131072, "gemma3.block_count": 34},
+    "parameters": "stop \"<end_of_turn>\"\nnum_ctx 8192\ntemperature 1",
+}
+
+
+def show_response(reply, status_code=200):
+    """An /api/show reply, with the request raise_for_status needs"""
+    return httpx.Response(
+        status_code=status_code,
+        json=reply,
+        request=httpx.Request("POST", "http://example.com/api/show"),
+    )
 
 
 def confirm_test_database():
@@ -83,6 +113,133 @@ async def test_get_model_capabilities_not_in_name(mock_post, mock_skill, mock_re
     assert result == mock_result
 
 
+@pytest.mark.asyncio
+async def test_get_capabilities_for_models(mock_post):
+    url = "http://example.com"
+    in_flight = 0
+    most_in_flight = 0
+
+    async def slow_show(*args, **kwargs):
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if kwargs["json"]["model"] == "broken":
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(status_code=200, json={"capabilities": ["vision"]})
+
+    mock_post.side_effect = slow_show
+    model_names = ["model1", "model2", "broken", "model4", "codemodel"]
+
+    result = await get_capabilities_for_models(url, model_names, limit=2)
+
+    assert result == {
+        "model1": "vision",
+        "model2": "vision",
+        "broken": "general",
+        "model4": "vision",
+        "codemodel": "coding",
+    }
+    assert most_in_flight == 2
+    assert mock_post.call_count == 4
+
+
+def test_parse_model_info():
+    assert parse_model_info(SHOW_REPLY) == {
+        "capabilities": ["completion", "vision"],
+        "specialization": "vision",
+        "context_length": 131072,
+        "num_ctx": 8192,
+        "family": "gemma3",
+        "parameter_size": "4.3B",
+        "quantization_level": "Q4_K_M",
+    }
+    assert parse_model_info({})["specialization"] == "general"
+
+
+@pytest.mark.asyncio
+async def test_get_model_metadata_cached_by_digest(test_database, mock_post):
+    url = "http://example.com"
+    mock_post.return_value = show_response(SHOW_REPLY)
+
+    first = await get_model_metadata(url, "gemma3:4b", "sha256:aaa")
+    second = await get_model_metadata(url, "gemma3:4b", "sha256:aaa")
+
+    assert mock_post.call_count == 1
+    assert first.id == second.id
+    assert second.context_length == 131072
+    assert json.loads(second.capabilities) == ["completion", "vision"]
+    assert cached_model_metadata("gemma3:4b").digest == "sha256:aaa"
+
+    # re-pulled model, new digest
+    await get_model_metadata(url, "gemma3:4b", "sha256:bbb")
+    assert mock_post.call_count == 2
+    assert [row.digest for row in ModelMetadata.select()] == ["sha256:bbb"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "reply, status_code, error",
+    [
+        ({"error": "model 'gemma3:4b' not found"}, 404, httpx.HTTPStatusError),
+        ({"error": "model is loading"}, 200, OllamaError),
+    ],
+)
+async def test_get_model_metadata_error_not_cached(
+    test_database, mock_post, reply, status_code, error
+):
+    url = "http://example.com"
+    mock_post.return_value = show_response(reply, status_code)
+
+    with pytest.raises(error):
+        await get_model_metadata(url, "gemma3:4b", "sha256:aaa")
+    assert ModelMetadata.select().count() == 0
+
+    # fetched again once the server answers
+    mock_post.return_value = show_response(SHOW_REPLY)
+    metadata = await get_model_metadata(url, "gemma3:4b", "sha256:aaa")
+    assert metadata.num_ctx == 8192
+
+
+@pytest.mark.asyncio
+async def test_get_model_capabilities_with_digest(test_database, mock_post):
+    url = "http://example.com"
+    mock_post.return_value = show_response(SHOW_REPLY)
+
+    assert await get_model_capabilities(url, "model1", "sha256:aaa") == "vision"
+    assert await get_model_capabilities(url, "model1", "sha256:aaa") == "vision"
+    mock_post.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_model_capabilities_in_name_with_digest(test_database, mock_post):
+    url = "http://example.com"
+    mock_post.return_value = show_response(SHOW_REPLY)
+
+    # the name still decides, but the details are cached for the context window
+    assert await get_model_capabilities(url, "codemodel", "sha256:aaa") == "coding"
+    assert cached_model_metadata("codemodel").num_ctx == 8192
+
+
+@pytest.mark.asyncio
+async def test_ensure_model_metadata(test_database, mock_get, mock_post):
+    url = "http://example.com"
+    mock_get.return_value = httpx.Response(
+        status_code=200,
+        json={"models": [{"name": "llama3", "model": "llama3", "digest": "sha256:aaa"}]},
+    )
+    mock_post.return_value = show_response(SHOW_REPLY)
+
+    assert (await ensure_model_metadata(url, "llama3")).num_ctx == 8192
+    assert (await ensure_model_metadata(url, "llama3")).digest == "sha256:aaa"
+    assert await ensure_model_metadata(url, "missing") is None
+
+    # once cached, only the unknown model is looked up again
+    assert mock_get.call_count == 2
+    mock_post.assert_called_once()
+
+
 # Test get_raw_model_list
 @pytest.mark.asyncio
 async def test_get_raw_model_list(mock_get):
@@ -208,6 +365,14 @@ def test_add_model_if_not_present_new_model(test_database):
     assert ollama_names == stored_names
 
 
+def test_add_model_if_not_present_with_capabilities(test_database):
+    ollama_list = {"models": [{"model": "model1", "size": 1}]}
+
+    add_model_if_not_present(ollama_list, LLM_MODEL.select(), {"model1": "vision"})
+
+    assert LLM_MODEL.get(LLM_MODEL.model == "model1").specialization == "vision"
+
+
 # Test add_model_if_not_present
 def test_add_model_no_change_no_new_model(test_database):
     ollama_list = {
@@ -339,3 +504,20 @@ def test_model_choice_setup(test_database):
     assert len(result) == 2
     assert ("model 1", "1") in result
     assert ("model 3", "3") in result
+
+
+def test_model_name_cache(test_database):
+    clear_model_name_cache()
+    LLM_MODEL.create(id=1, model="model 1", specialization="general", size="1", currently_available=True
+    )
+
+    assert model_name_for_id("1") == "model 1"
+
+    # new models are not seen until the cache is cleared
+    LLM_MODEL.create(id=2, model="model 2", specialization="general", size="2", currently_available=True
+    )
+    assert model_names_by_id() == {1: "model 1"}
+
+    clear_model_name_cache()
+    assert model_name_for_id(2) == "model 2"
+    clear_model_name_cache()
@@ -0,0 +1,69 @@
+import pytest
+
+from src.myllamatui.db_models import Chat, Topic, Category
+from src.myllamatui.search import (
+    HIGHLIGHT_END,
+    HIGHLIGHT_START,
+    build_match_query,
+    create_chat_search,
+    search_chats,
+)
+
+
+def add_chat(question, answer):
+    return Chat.create(
+        question=question, answer=answer, context_id=1, topic_id=1, llm_model_id=1
+    )
+
+
+@pytest.mark.parametrize(
+    "search_text, match_query",
+    [
+        ("python", '"python"'),
+        ("pyth*", '"pyth"*'),
+        ("python textual ", '"python" "textual"'),
+        ('what is "AND" OR NOT?', '"what" "is" "AND" "OR" "NOT"'),
+        ("  ", ""),
+    ],
+)
+def test_build_match_query(search_text, match_query):
+    assert build_match_query(search_text) == match_query
+
+
+def test_create_chat_search_backfills(test_database):
+    add_chat("What is python?", "A programming language")
+    create_chat_search(Chat._meta.database)
+    # safe to run on every launch
+    create_chat_search(Chat._meta.database)
+
+    results = search_chats("programming")
+    assert [result["chat_id"] for result in results] == [1]
+
+
+def test_search_chats_follows_chat_changes(test_database):
+    Category.create(text="category 1")
+    Topic.create(text="topic 1", category_id=1)
+    create_chat_search(Chat._meta.database)
+
+    chat = add_chat("How do I sort a list?", "Use sorted()")
+    assert search_chats("sort")[0]["topic"] == "topic 1"
+
+    chat.answer = "Use list.sort() or heapq"
+    chat.save()
+    assert [result["chat_id"] for result in search_chats("heapq")] == [chat.id]
+
+    chat.delete_instance()
+    assert search_chats("sort") == []
+
+
+def test_search_chats_ranks_and_highlights(test_database):
+    create_chat_search(Chat._meta.database)
+    add_chat("Tell me a joke", "Why did the sqlite index cross the road")
+    add_chat("How does a sqlite index work?", "It is a b-tree")
+
+    results = search_chats("sqlite index")
+
+    # question matches rank above answer matches
+    assert [result["chat_id"] for result in results] == [2, 1]
+    assert f"{HIGHLIGHT_START}sqlite{HIGHLIGHT_END}" in results[0]["question"]
+    assert f"{HIGHLIGHT_START}index{HIGHLIGHT_END}" in results[1]["answer"]
@@ -3,9 +3,12 @@ import pytest
 
 from unittest.mock import patch, MagicMock, AsyncMock
 
+from playhouse.migrate import SqliteMigrator, migrate
+
 from src.myllamatui.setup_utils import (
     initialize_db_defaults,
     create_db,
+    migrate_db,
     create_temp_fake_model,
     populate_llm_models,
     CLI_DEFAULTS,
@@ -17,6 +20,11 @@ from src.myllamatui.db_models import (
     Topic,
     LLM_MODEL,
     CLI_Settings,
+    ModelMetadata,
+    ChatEmbedding,
+    ChatStats,
+    ClassificationJob,
+    TopicSummary,
 )
 
 
@@ -34,19 +42,53 @@ def test_create_temp_fake_model(test_database, mock_llm_model):
 
 
 @pytest.mark.asyncio
-async def test_populate_llm_models_with_models(test_database, mock_get):
-    raw_model_list = {"models": [{"name": "visionmodel1"}, {"name": "genericmodel2"}]}
+async def test_populate_llm_models_with_models(test_database, mock_get, mock_post):
+    raw_model_list = {
+        "models": [
+            {"name": "visionmodel1", "model": "visionmodel1", "size": 1024},
+            {"name": "genericmodel2", "model": "genericmodel2", "size": 2048},
+        ]
+    }
     mock_get.return_value = httpx.Response(status_code=200, json=raw_model_list)
-    await populate_llm_models()
-    assert (
-        LLM_MODEL.create(
-            model="visionmodel1",
-            specialization="vision",
-            size=1024,
-            currently_available=True,
-        )
-        is not None
+    mock_post.return_value = httpx.Response(
+        status_code=200, json={"capabilities": ["completion", "reasoning"]}
     )
+    await populate_llm_models()
+
+    models = {model.model: model for model in LLM_MODEL.select()}
+    assert list(models.keys()) == ["visionmodel1", "genericmodel2"]
+    assert models["visionmodel1"].specialization == "vision"
+    assert models["visionmodel1"].size == 1024
+    assert models["genericmodel2"].specialization == "reasoning"
+    # only the model without a hint in its name is probed
+    mock_post.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_populate_llm_models_probe_failure(test_database, mock_get, mock_post):
+    raw_model_list = {
+        "models": [
+            {"name": "model1", "model": "model1", "size": 1},
+            {"name": "model2", "model": "model2", "size": 2},
+        ]
+    }
+    mock_get.return_value = httpx.Response(status_code=200, json=raw_model_list)
+    mock_post.side_effect = [
+        httpx.ConnectError("connection refused"),
+        httpx.Response(status_code=200, json={"capabilities": ["vision"]}),
+    ]
+    await populate_llm_models()
+
+    # a failed probe only affects its own model
+    specializations = sorted(model.specialization for model in LLM_MODEL.select())
+    assert specializations == ["general", "vision"]
+
+
+@pytest.mark.asyncio
+async def test_populate_llm_models_unreachable(test_database, mock_get):
+    mock_get.side_effect = httpx.ConnectError("connection refused")
+    await populate_llm_models()
+    assert [model.model for model in LLM_MODEL.select()] == ["Temp_fake"]
 
 
 @pytest.mark.asyncio
@@ -68,10 +110,43 @@ def test_create_db(mock_create_tables, mock_connect):
     # Assertions to verify behavior
     mock_connect.assert_called_once()  # Verify connect is called once
     mock_create_tables.assert_called_once_with(
-        [Context, Category, Topic, Chat, LLM_MODEL, CLI_Settings], safe=True
+        [
+            Context,
+            Category,
+            Topic,
+            Chat,
+            LLM_MODEL,
+            CLI_Settings,
+            ModelMetadata,
+            ChatEmbedding,
+            ChatStats,
+            ClassificationJob,
+            TopicSummary,
+        ],
+        safe=True,
     )  # Verify correct table list
 
 
+def test_migrate_db_adds_usage_count(test_database):
+    test_db = LLM_MODEL._meta.database
+    migrate(SqliteMigrator(test_db).drop_column("llm_model", "usage_count"))
+    test_db.execute_sql(
+        "INSERT INTO llm_model (model, size, specialization, modified_at, currently_available) "
+        "VALUES ('model 1', 1, 'general', '2025-01-01', 1)"
+    )
+    for i in range(3):
+        Chat.create(
+            question=f"q{i}", answer="a", context_id=1, topic_id=1, llm_model_id=1
+        )
+
+    migrate_db(test_db)
+
+    assert LLM_MODEL.get_by_id(1).usage_count == 3
+    # already migrated, nothing to do
+    migrate_db(test_db)
+    assert LLM_MODEL.get_by_id(1).usage_count == 3
+
+
 @pytest.mark.asyncio
 async def test_initialize_db_defaults(test_database, mock_get):
     raw_model_list = {"models": []}
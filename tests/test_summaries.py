@@ -0,0 +1,80 @@
+import httpx
+import pytest
+
+from src.myllamatui.db_models import Category, Chat, Topic, TopicSummary
+from src.myllamatui.prompts import CONVERSATION_SUMMARY
+from src.myllamatui.summaries import (
+    drop_messages,
+    needs_summary,
+    older_turns,
+    save_topic_summary,
+    summarize_turns,
+)
+
+SYSTEM = {"role": "system", "content": "context"}
+
+
+def turns(count):
+    messages = []
+    for number in range(1, count + 1):
+        messages.append({"role": "user", "content": f"q{number}"})
+        messages.append({"role": "assistant", "content": f"a{number}"})
+    return messages
+
+
+def test_needs_summary():
+    MESSAGES = [SYSTEM] + turns(4)
+    # 9 messages of 5 or 6 tokens
+    assert needs_summary(MESSAGES, budget=200) is False
+    assert needs_summary(MESSAGES, budget=90) is True
+
+
+def test_older_turns():
+    MESSAGES = [SYSTEM] + turns(5)
+
+    assert older_turns(MESSAGES, keep_turns=2) == turns(3)
+    assert older_turns(MESSAGES, keep_turns=5) == []
+
+
+def test_drop_messages_by_identity():
+    MESSAGES = [SYSTEM] + turns(3)
+    summarized = older_turns(MESSAGES, keep_turns=1)
+    # a turn added while the summary was written, equal to a summarized one
+    MESSAGES.append({"role": "user", "content": "q1"})
+
+    drop_messages(MESSAGES, summarized)
+
+    assert MESSAGES == [SYSTEM] + turns(3)[4:] + [{"role": "user", "content": "q1"}]
+
+
+@pytest.mark.asyncio
+async def test_summarize_turns(mock_post):
+    mock_post.return_value = httpx.Response(
+        status_code=200, json={"message": {"content": " Talked about q1. "}}
+    )
+
+    summary = await summarize_turns("http://fake.nope", turns(1), "fake", "Earlier")
+
+    assert summary == "Talked about q1."
+    prompt = mock_post.call_args.kwargs["json"]["messages"][-1]["content"]
+    assert prompt.startswith(f"{CONVERSATION_SUMMARY}Earlier\n\nuser: q1\nassistant: a1")
+
+
+def test_save_topic_summary(test_database):
+    Category.create(text="category")
+    Topic.create(text="topic", category_id=1)
+    for number in range(3):
+        Chat.create(
+            question=f"q{number}",
+            answer="a",
+            context_id=1,
+            topic_id=1,
+            llm_model_id=1,
+        )
+
+    assert save_topic_summary(1, "summary", keep_turns=3) is None
+
+    assert save_topic_summary(1, "summary", keep_turns=1).last_chat_id == 2
+    # replaced, one summary per topic
+    assert save_topic_summary(1, "newer", keep_turns=0).last_chat_id == 3
+    assert [row.summary for row in TopicSummary.select()] == ["newer"]
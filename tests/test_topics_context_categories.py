@@ -1,4 +1,6 @@
+import ast
 import pytest
+import random
 
 from unittest.mock import patch, MagicMock
 from src.myllamatui.topics_contexts_categories import (
@@ -9,8 +11,15 @@ from src.myllamatui.topics_contexts_categories import (
     category_choice_setup,
     context_choice_setup,
     topics_choice_setup,
+    load_categories,
+    load_category_topics,
+    LexicalIndex,
+    lexical_index,
+    update_lexical_index,
+    shortlist_items,
+    PROMPT_SHORTLIST_SIZE,
 )
-from src.myllamatui.db_models import Topic, Category, Context
+from src.myllamatui.db_models import Topic, Category, Context, Chat, LLM_MODEL
 
 from src.myllamatui.prompts import (
     ADD_OR_APPLY_TOPIC_TO_CHAT,
@@ -59,6 +68,35 @@ def test_generate_current_topic_summary(mock_select):
     }
 
 
+@patch("src.myllamatui.db_models.Topic.select")
+def test_generate_current_topic_summary_shortlists(mock_select):
+    topics = [MockTopic(f"Topic {i}") for i in range(PROMPT_SHORTLIST_SIZE + 10)]
+    topics[3] = MockTopic("Python Textual Widgets")
+    mock_select.return_value = topics
+
+    summary_messages = generate_current_topic_summary("How do textual widgets mount?")
+
+    topic_list = ast.literal_eval(
+        summary_messages["content"]
+        .removeprefix(ADD_OR_APPLY_TOPIC_TO_CHAT + ASSESS_SUMMARY_2)
+        .removesuffix(ASSESS_SUMMARY_3)
+    )
+    assert len(topic_list) == PROMPT_SHORTLIST_SIZE
+    assert topic_list[0] == "Python Textual Widgets"
+
+
+def test_shortlist_items():
+    items = [MockTopic(text) for text in ["Dad Jokes", "AWS Lambda", "Python Jokes"]]
+    assert shortlist_items(items, "anything", limit=3) == items
+
+    shortlist = shortlist_items(items, "python jokes please", limit=2)
+    assert [item.text for item in shortlist] == ["Python Jokes", "Dad Jokes"]
+
+    # nothing in common, the newest items are kept
+    shortlist = shortlist_items(items, "elephants", limit=2)
+    assert [item.text for item in shortlist] == ["Python Jokes", "AWS Lambda"]
+
+
 @patch("src.myllamatui.db_models.Category.select")
 def test_generate_category_summary(mock_category):
     category_list = ["Category 1", "Category 2"]
@@ -128,6 +166,71 @@ def test_check_for_topic_and_category_match(summary, matchid):
     assert match == matchid
 
 
+def original_scan_match(summary, items):
+    """The word overlap scan LexicalIndex replaced, kept to check they agree"""
+    selected_match = None
+    summarywords = [
+        word
+        for word in summary.split(" ")
+        if word.lower()
+        not in ["no", "yes", "a", "the", "then", "to", "if", "or", "this", "that", "is"]
+    ]
+    match_dict = {}
+    for word in summarywords:
+        for item in items:
+            if word.lower() in item.text.lower():
+                match_dict[item.id] = match_dict.get(item.id, 0) + 1
+    highest = 0
+    for id in match_dict.keys():
+        if match_dict[id] > highest:
+            highest = match_dict[id]
+            if highest / len(summarywords) > 0.4:
+                selected_match = id
+    return selected_match
+
+
+def test_lexical_index_matches_original_scan():
+    random.seed(3)
+    vocabulary = ["py", "python", "Textual", "jokes", "dad", "Ruby", "a", "the", "aws"]
+    items = []
+    for item_id in range(1, 40):
+        item = Topic(text=" ".join(random.choices(vocabulary, k=random.randint(1, 4))))
+        item.id = item_id
+        items.append(item)
+    index = LexicalIndex(items)
+
+    for _ in range(300):
+        summary = " ".join(random.choices(vocabulary + ["", "nomatch"], k=4))
+        assert index.match(summary) == original_scan_match(summary, items), summary
+
+
+def test_lexical_index_updates():
+    index = LexicalIndex()
+    index.add(1, "Python Textual")
+    index.add(2, "Dad Jokes")
+    assert index.match("Textual widgets") == 1
+
+    index.add(1, "Ruby on Rails")
+    assert index.match("Textual widgets") is None
+    assert index.match("Rails apps") == 1
+    assert "python" not in index.postings
+
+    index.remove(2)
+    assert index.match("Dad Jokes") is None
+
+
+def test_lexical_index_built_once_and_updated(test_database):
+    Category.create(text="default")
+    Topic.create(text="Python Textual", category_id=1)
+
+    index = lexical_index(Topic)
+    assert lexical_index(Topic) is index
+
+    new_topic = Topic.create(text="Dad Jokes", category_id=1)
+    update_lexical_index(new_topic)
+    assert check_for_topic_and_category_match("Dad Jokes", index) == new_topic.id
+
+
 def test_category_choice_setup():
     mock_category = [
         MagicMock(text="default", id=1),
@@ -168,3 +271,23 @@ def test_context_choice_setup():
 
     expected = [("context 1", "1"), ("context 2", "2"), ("context 3", "3")]
     assert result == expected
+
+
+def test_load_categories_and_topics(test_database):
+    for category_text in ["default", "Jokes", "Python", "Empty"]:
+        Category.create(text=category_text)
+    Topic.create(text="default", category_id=1)
+    Topic.create(text="Dad Jokes", category_id=2)
+    Topic.create(text="Textual", category_id=3)
+    Topic.create(text="Peewee", category_id=3)
+    Context.create(text="context")
+    LLM_MODEL.create(model="model", size=1, specialization="general", currently_available=True)
+    for topic_id in [1, 2, 3, 3, 3]:
+        Chat.create(question="q", answer="a", context_id=1, topic_id=topic_id, llm_model_id=1)
+
+    assert load_categories() == {2: "Jokes", 3: "Python", 4: "Empty"}
+    assert load_category_topics(2) == {2: ("Dad Jokes", 1)}
+    assert load_category_topics(3) == {3: ("Textual", 3), 4: ("Peewee", 0)}
+    assert load_category_topics(4) == {}
+    # the default topic is never shown
+    assert load_category_topics(1) == {}